@@ -45,10 +45,8 @@ def _calc_correlation(conn: Any, left: str, right: str) -> float:
             SUM(CAST({left} AS REAL) * CAST({left} AS REAL)) AS sum_x2,
             SUM(CAST({right} AS REAL) * CAST({right} AS REAL)) AS sum_y2,
             SUM(CAST({left} AS REAL) * CAST({right} AS REAL)) AS sum_xy
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.status = 'active'
-          AND COALESCE(s.{left}, 0) > 0
+        FROM active_player_stats s
+        WHERE COALESCE(s.{left}, 0) > 0
           AND COALESCE(s.{right}, 0) > 0
         """,
     )
@@ -75,10 +73,8 @@ def _select_percentile(conn: Any, column: str, pct: int) -> Optional[int]:
         conn,
         f"""
         SELECT COUNT(*) AS c
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.status = 'active'
-          AND COALESCE(s.{column}, 0) > 0
+        FROM active_player_stats s
+        WHERE COALESCE(s.{column}, 0) > 0
         """,
     )
     count = int(count_row["c"] or 0) if count_row else 0
@@ -89,10 +85,8 @@ def _select_percentile(conn: Any, column: str, pct: int) -> Optional[int]:
         conn,
         f"""
         SELECT s.{column} AS value
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.status = 'active'
-          AND COALESCE(s.{column}, 0) > 0
+        FROM active_player_stats s
+        WHERE COALESCE(s.{column}, 0) > 0
         ORDER BY s.{column}
         LIMIT 1 OFFSET ?
         """,
@@ -140,14 +134,13 @@ def build_cohort_retention_payload(conn: Any, months: int = 24) -> Dict[str, Lis
         conn,
         """
         SELECT
-            SUBSTR(joined_at, 1, 7) AS cohort,
+            join_month AS cohort,
             COUNT(*) AS total_players,
             SUM(CASE WHEN COALESCE(last_online, '') >= ? THEN 1 ELSE 0 END) AS retained_90d
         FROM users
         WHERE status = 'active'
-          AND joined_at IS NOT NULL
-          AND SUBSTR(joined_at, 1, 7) < ?
-        GROUP BY SUBSTR(joined_at, 1, 7)
+          AND join_month < ?
+        GROUP BY join_month
         ORDER BY cohort DESC
         LIMIT ?
         """,
@@ -169,7 +162,7 @@ def build_cohort_retention_payload(conn: Any, months: int = 24) -> Dict[str, Lis
 
 
 def _count(conn: Any, where_sql: str = "1=1", params: Iterable[object] = ()) -> int:
-    row = query_one(conn, f"SELECT COUNT(*) AS c FROM users u JOIN user_stats_latest s ON s.username = u.username WHERE u.status = 'active' AND {where_sql}", tuple(params))
+    row = query_one(conn, f"SELECT COUNT(*) AS c FROM active_player_stats s WHERE {where_sql}", tuple(params))
     return int(row["c"] or 0) if row else 0
 
 
@@ -178,10 +171,8 @@ def _median_ratio(conn: Any, wins_col: str, draws_col: str, total_col: str) -> D
         conn,
         f"""
         SELECT COUNT(*) AS c
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.status = 'active'
-          AND COALESCE(s.{total_col}, 0) >= 20
+        FROM active_player_stats s
+        WHERE COALESCE(s.{total_col}, 0) >= 20
         """,
     )
     count = int(count_row["c"] or 0) if count_row else 0
@@ -192,10 +183,8 @@ def _median_ratio(conn: Any, wins_col: str, draws_col: str, total_col: str) -> D
         conn,
         f"""
         SELECT CAST(s.{wins_col} AS REAL) / NULLIF(s.{total_col}, 0) AS value
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.status = 'active'
-          AND COALESCE(s.{total_col}, 0) >= 20
+        FROM active_player_stats s
+        WHERE COALESCE(s.{total_col}, 0) >= 20
         ORDER BY value
         LIMIT 1 OFFSET ?
         """,
@@ -205,10 +194,8 @@ def _median_ratio(conn: Any, wins_col: str, draws_col: str, total_col: str) -> D
         conn,
         f"""
         SELECT CAST(s.{draws_col} AS REAL) / NULLIF(s.{total_col}, 0) AS value
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.status = 'active'
-          AND COALESCE(s.{total_col}, 0) >= 20
+        FROM active_player_stats s
+        WHERE COALESCE(s.{total_col}, 0) >= 20
         ORDER BY value
         LIMIT 1 OFFSET ?
         """,
@@ -235,13 +222,11 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
             COUNT(*) AS tracked_players,
             SUM(COALESCE(s.total_games, 0)) AS total_games,
             AVG(COALESCE(s.total_games, 0)) AS mean_games,
-            SUM(CASE WHEN COALESCE(u.last_online, '') >= ? THEN 1 ELSE 0 END) AS active_7d,
-            SUM(CASE WHEN COALESCE(u.last_online, '') >= ? THEN 1 ELSE 0 END) AS active_30d,
-            SUM(CASE WHEN COALESCE(u.last_online, '') >= ? THEN 1 ELSE 0 END) AS active_90d,
-            SUM(CASE WHEN COALESCE(u.last_online, '') < ? OR u.last_online IS NULL THEN 1 ELSE 0 END) AS dormant_365d
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.status = 'active'
+            SUM(CASE WHEN COALESCE(s.last_online, '') >= ? THEN 1 ELSE 0 END) AS active_7d,
+            SUM(CASE WHEN COALESCE(s.last_online, '') >= ? THEN 1 ELSE 0 END) AS active_30d,
+            SUM(CASE WHEN COALESCE(s.last_online, '') >= ? THEN 1 ELSE 0 END) AS active_90d,
+            SUM(CASE WHEN COALESCE(s.last_online, '') < ? OR s.last_online IS NULL THEN 1 ELSE 0 END) AS dormant_365d
+        FROM active_player_stats s
         """,
         (active_7d, active_30d, active_90d, dormant_365d),
     )
@@ -284,9 +269,7 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
                     ORDER BY COALESCE(s.total_games, 0)
                     ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
                 ) AS cumulative_games
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status = 'active'
+            FROM active_player_stats s
         )
         SELECT player_percentile, cumulative_games
         FROM (
@@ -327,9 +310,7 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
             SELECT SUM(total_games) AS total_games
             FROM (
                 SELECT COALESCE(s.total_games, 0) AS total_games
-                FROM users u
-                JOIN user_stats_latest s ON s.username = u.username
-                WHERE u.status = 'active'
+                FROM active_player_stats s
                 ORDER BY COALESCE(s.total_games, 0) DESC
                 LIMIT ?
             )
@@ -353,9 +334,7 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
                 ELSE '5k+'
             END AS tier,
             COUNT(*) AS players
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.status = 'active'
+        FROM active_player_stats s
         GROUP BY tier
         """,
     )
@@ -373,9 +352,7 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
             SELECT
                 SUM(CASE WHEN COALESCE(s.{total_col}, 0) > 0 THEN 1 ELSE 0 END) AS players,
                 COUNT(*) AS total_players
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status = 'active'
+            FROM active_player_stats s
             """,
         )
         players = int(row["players"] or 0) if row else 0
@@ -398,9 +375,7 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
                 total_blitz,
                 total_bullet,
                 (COALESCE(total_daily, 0) + COALESCE(total_rapid, 0) + COALESCE(total_blitz, 0) + COALESCE(total_bullet, 0)) AS format_total
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status = 'active'
+            FROM active_player_stats s
         )
         SELECT dominant_format, COUNT(*) AS players
         FROM (
@@ -432,9 +407,7 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
                 (CASE WHEN COALESCE(total_rapid, 0) > 0 THEN 1 ELSE 0 END) +
                 (CASE WHEN COALESCE(total_blitz, 0) > 0 THEN 1 ELSE 0 END) +
                 (CASE WHEN COALESCE(total_bullet, 0) > 0 THEN 1 ELSE 0 END) AS formats_played
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status = 'active'
+            FROM active_player_stats s
         )
         GROUP BY formats_played
         ORDER BY formats_played
@@ -448,10 +421,8 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
             conn,
             """
             SELECT COUNT(*) AS c
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status = 'active'
-              AND COALESCE(s.rapid_rating, 0) > 0
+            FROM active_player_stats s
+            WHERE COALESCE(s.rapid_rating, 0) > 0
               AND COALESCE(s.blitz_rating, 0) > 0
               AND COALESCE(s.total_rapid, 0) >= 20
               AND COALESCE(s.total_blitz, 0) >= 20
@@ -466,10 +437,8 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
             conn,
             """
             SELECT (s.blitz_rating - s.rapid_rating) AS gap
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status = 'active'
-              AND COALESCE(s.rapid_rating, 0) > 0
+            FROM active_player_stats s
+            WHERE COALESCE(s.rapid_rating, 0) > 0
               AND COALESCE(s.blitz_rating, 0) > 0
               AND COALESCE(s.total_rapid, 0) >= 20
               AND COALESCE(s.total_blitz, 0) >= 20
@@ -491,18 +460,17 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
         conn,
         """
         SELECT
-            SUBSTR(joined_at, 1, 4) AS cohort,
+            SUBSTR(join_month, 1, 4) AS cohort,
             COUNT(*) AS players,
             SUM(CASE WHEN COALESCE(last_online, '') >= ? THEN 1 ELSE 0 END) AS active_90d
         FROM users
         WHERE status = 'active'
-          AND joined_at IS NOT NULL
-          AND SUBSTR(joined_at, 1, 4) < ?
-        GROUP BY SUBSTR(joined_at, 1, 4)
+          AND join_month < ?
+        GROUP BY SUBSTR(join_month, 1, 4)
         ORDER BY cohort DESC
         LIMIT 8
         """,
-        (active_90d, current_year),
+        (active_90d, f"{current_year}-01"),
     )
     cohorts = []
     for row in reversed(cohort_rows):
@@ -511,12 +479,10 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
             conn,
             """
             SELECT COUNT(*) AS c
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status = 'active'
-              AND SUBSTR(u.joined_at, 1, 4) = ?
+            FROM active_player_stats s
+            WHERE s.join_month BETWEEN ? AND ?
             """,
-            (year,),
+            (f"{year}-01", f"{year}-12"),
         )
         cohort_count = int(cohort_count_row["c"] or 0) if cohort_count_row else 0
         offset = max(0, math.ceil(cohort_count * 0.5) - 1)
@@ -524,14 +490,12 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
             conn,
             """
             SELECT COALESCE(s.total_games, 0) AS total_games
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status = 'active'
-              AND SUBSTR(u.joined_at, 1, 4) = ?
+            FROM active_player_stats s
+            WHERE s.join_month BETWEEN ? AND ?
             ORDER BY COALESCE(s.total_games, 0)
             LIMIT 1 OFFSET ?
             """,
-            (year, offset),
+            (f"{year}-01", f"{year}-12", offset),
         )
         players = int(row["players"] or 0)
         active_players = int(row["active_90d"] or 0)
@@ -552,9 +516,7 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
             SUM(CASE WHEN COALESCE(s.highest_puzzle_rating, 0) > 0 THEN 1 ELSE 0 END) AS puzzle_rated,
             SUM(CASE WHEN COALESCE(s.highest_puzzle_rating, 0) > 0 AND COALESCE(s.total_games, 0) < 10 THEN 1 ELSE 0 END) AS puzzle_under_10_games,
             SUM(CASE WHEN COALESCE(s.highest_puzzle_rating, 0) > 0 AND COALESCE(s.total_games, 0) >= 200 THEN 1 ELSE 0 END) AS puzzle_200_plus_games
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.status = 'active'
+        FROM active_player_stats s
         """,
     )
     top_puzzle_cutoff = _select_percentile(conn, "highest_puzzle_rating", 90) or 0
@@ -574,22 +536,22 @@ def build_story_report_payload(conn: Any) -> Dict[str, object]:
     archetypes = [
         {
             "name": "New, low volume",
-            "count": _count(conn, "COALESCE(u.joined_at, '') >= ? AND COALESCE(s.total_games, 0) < 50", (recent_join_cutoff,)),
+            "count": _count(conn, "COALESCE(s.joined_at, '') >= ? AND COALESCE(s.total_games, 0) < 50", (recent_join_cutoff,)),
             "description": "Joined within the last year, but still light-touch participants.",
         },
         {
             "name": "New, high volume",
-            "count": _count(conn, "COALESCE(u.joined_at, '') >= ? AND COALESCE(s.total_games, 0) >= 500", (recent_join_cutoff,)),
+            "count": _count(conn, "COALESCE(s.joined_at, '') >= ? AND COALESCE(s.total_games, 0) >= 500", (recent_join_cutoff,)),
             "description": "Recent arrivals who converted quickly into committed play.",
         },
         {
             "name": "Veteran, still active",
-            "count": _count(conn, "COALESCE(u.joined_at, '') < ? AND COALESCE(u.last_online, '') >= ?", (veteran_cutoff, active_90d)),
+            "count": _count(conn, "COALESCE(s.joined_at, '') < ? AND COALESCE(s.last_online, '') >= ?", (veteran_cutoff, active_90d)),
             "description": "Longer-tenured players who still appear in the recent activity window.",
         },
         {
             "name": "Veteran, dormant",
-            "count": _count(conn, "COALESCE(u.joined_at, '') < ? AND (u.last_online IS NULL OR COALESCE(u.last_online, '') < ?)", (veteran_cutoff, dormant_365d)),
+            "count": _count(conn, "COALESCE(s.joined_at, '') < ? AND (s.last_online IS NULL OR COALESCE(s.last_online, '') < ?)", (veteran_cutoff, dormant_365d)),
             "description": "Older accounts that still expand the talent base but have gone quiet.",
         },
         {
@@ -655,9 +617,8 @@ def build_player_benchmark_payload(conn: Any, username: str) -> Optional[Dict[st
             s.total_bullet,
             s.total_daily,
             s.total_games
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.username = ? AND u.status = 'active'
+        FROM active_player_stats s
+        WHERE s.username = ?
         """,
         (username,),
     )
@@ -680,20 +641,16 @@ def build_player_benchmark_payload(conn: Any, username: str) -> Optional[Dict[st
             conn,
             f"""
             SELECT COUNT(*) AS c
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status = 'active'
-              AND s.{key} IS NOT NULL
+            FROM active_player_stats s
+            WHERE s.{key} IS NOT NULL
             """,
         )
         le_row = query_one(
             conn,
             f"""
             SELECT COUNT(*) AS c
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status = 'active'
-              AND COALESCE(s.{key}, 0) <= ?
+            FROM active_player_stats s
+            WHERE COALESCE(s.{key}, 0) <= ?
             """,
             (value,),
         )
@@ -718,9 +675,7 @@ def build_player_benchmark_payload(conn: Any, username: str) -> Optional[Dict[st
                         THEN 1 ELSE 0
                     END
                 ) AS total_ranked
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status = 'active'
+            FROM active_player_stats s
             """,
             (value, float(target[games_col.replace("s.", "")] or 0), min_games, value, min_games),
         )
@@ -744,9 +699,8 @@ def build_analytics_pack_payload(conn: Any) -> Dict[str, object]:
         SELECT
             (CAST(s.rapid_rating / 100 AS INT) * 100) AS bucket,
             COUNT(*) AS players
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.status='active' AND s.rapid_rating > 0
+        FROM active_player_stats s
+        WHERE s.rapid_rating > 0
         GROUP BY bucket
         ORDER BY bucket
         """,
@@ -764,9 +718,7 @@ def build_analytics_pack_payload(conn: Any) -> Dict[str, object]:
             AVG(CASE WHEN s.bullet_rating > 0 THEN s.bullet_rating END) AS bullet_avg,
             AVG(CASE WHEN s.daily_rating > 0 THEN s.daily_rating END) AS daily_avg,
             AVG(CASE WHEN s.highest_puzzle_rating > 0 THEN s.highest_puzzle_rating END) AS puzzle_avg
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.status='active'
+        FROM active_player_stats s
         """,
     )
     activity_bucket_rows = query_all(
@@ -784,9 +736,7 @@ def build_analytics_pack_payload(conn: Any) -> Dict[str, object]:
                     WHEN COALESCE(s.total_games, 0) < 20000 THEN '5k-19.9k'
                     ELSE '20k+'
                 END AS bucket
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status='active'
+            FROM active_player_stats s
         )
         GROUP BY bucket
         ORDER BY
@@ -805,16 +755,14 @@ def build_analytics_pack_payload(conn: Any) -> Dict[str, object]:
         conn,
         """
         SELECT
-            u.username,
+            s.username,
             s.rapid_rating,
             s.blitz_rating,
             s.bullet_rating,
             s.daily_rating,
             s.total_games
-        FROM users u
-        JOIN user_stats_latest s ON s.username = u.username
-        WHERE u.status='active'
-          AND s.rapid_rating > 0
+        FROM active_player_stats s
+        WHERE s.rapid_rating > 0
           AND s.blitz_rating > 0
         ORDER BY s.total_games DESC
         LIMIT 1200
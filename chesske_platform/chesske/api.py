@@ -19,12 +19,22 @@ from .analytics import (
     get_or_build_cached_payload,
 )
 from .cache import cached_json, delete_by_pattern
-from .client import ChessComClient
+from .client import OK_STATUSES, ChessComClient
 from .config import Settings
-from .db import get_conn, init_db
-from .pipeline import _build_user_record
+from .countries import country_counts_report
+from .db import get_conn, get_pool_stats, init_db
+from .metrics import summarize_run_metrics
+from .pipeline import SWEEP_NAME, SWEEP_REQUESTS_PER_USER, _build_user_record
 from .quality import compute_quality_report
-from .repository import query_all, query_one, upsert_user_and_stats
+from .repository import (
+    get_leaderboard,
+    get_player_history,
+    get_run_metrics,
+    get_sweep_progress,
+    query_all,
+    query_one,
+    upsert_user_and_stats,
+)
 
 
 HISTORICAL_LEDGER_POINTS = [
@@ -116,7 +126,7 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
             return
         min_users_raw = os.getenv("CHESSKE_BOOTSTRAP_MIN_USERS", "1").strip()
         min_users = int(min_users_raw) if min_users_raw.isdigit() else 1
-        with get_conn(settings) as conn:
+        with get_conn(settings, read_only=True) as conn:
             row = query_one(conn, "SELECT COUNT(*) AS n FROM users")
         current_users = int(row["n"] or 0) if row else 0
         if current_users > min_users:
@@ -154,11 +164,12 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
 
     @app.get("/meta/runs")
     def runs(limit: int = Query(default=20, ge=1, le=200)) -> Dict[str, List[Dict[str, object]]]:
-        with get_conn(settings) as conn:
+        with get_conn(settings, read_only=True) as conn:
             rows = query_all(
                 conn,
                 """
-                SELECT id, started_at, ended_at, status, active_count, updated_count, deleted_count, refresh_count, error_count
+                SELECT id, started_at, ended_at, status, active_count, updated_count, deleted_count, refresh_count, sweep_count,
+                       error_count, unchanged_count, stats_skipped_count, stop_reason
                 FROM pipeline_runs
                 ORDER BY id DESC
                 LIMIT ?
@@ -167,9 +178,30 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
             )
         return {"items": [dict(r) for r in rows]}
 
+    @app.get("/meta/runs/{run_id}/metrics")
+    def run_metrics(run_id: int) -> Dict[str, object]:
+        with get_conn(settings, read_only=True) as conn:
+            run = query_one(conn, "SELECT id, status FROM pipeline_runs WHERE id = ?", (run_id,))
+            if not run:
+                raise HTTPException(status_code=404, detail="Run not found")
+            rows = get_run_metrics(conn, run_id)
+        return {"run_id": run_id, "status": run["status"], "phases": summarize_run_metrics(rows)}
+
+    @app.get("/meta/sweep")
+    def sweep_progress() -> Dict[str, object]:
+        with get_conn(settings, read_only=True) as conn:
+            progress = get_sweep_progress(conn, SWEEP_NAME, settings.sweep_daily_requests, SWEEP_REQUESTS_PER_USER)
+        if progress is None:
+            raise HTTPException(status_code=404, detail="No full sweep has run yet")
+        return progress
+
+    @app.get("/meta/db-pool")
+    def db_pool() -> Dict[str, object]:
+        return get_pool_stats(settings)
+
     @app.get("/meta/errors")
     def errors(limit: int = Query(default=50, ge=1, le=500)) -> Dict[str, List[Dict[str, object]]]:
-        with get_conn(settings) as conn:
+        with get_conn(settings, read_only=True) as conn:
             rows = query_all(
                 conn,
                 """
@@ -185,7 +217,7 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
     @app.get("/overview")
     def overview() -> Dict[str, object]:
         def build() -> Dict[str, object]:
-            with get_conn(settings) as conn:
+            with get_conn(settings, read_only=True) as conn:
                 row = query_one(
                     conn,
                     """
@@ -231,35 +263,9 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
         limit: int = Query(default=20, ge=1, le=200),
         min_games: int = Query(default=50, ge=0),
     ) -> Dict[str, object]:
-        mapping = {
-            "rapid": ("s.rapid_rating", "s.total_rapid"),
-            "blitz": ("s.blitz_rating", "s.total_blitz"),
-            "bullet": ("s.bullet_rating", "s.total_bullet"),
-            "daily": ("s.daily_rating", "s.total_daily"),
-            "puzzle": ("s.highest_puzzle_rating", "s.total_games"),
-            "games": ("s.total_games", "s.total_games"),
-        }
-        rating_col, games_col = mapping[board]
-
-        sql = f"""
-            SELECT
-                u.username,
-                {rating_col} AS score,
-                {games_col} AS games,
-                s.rapid_rating, s.blitz_rating, s.bullet_rating, s.daily_rating,
-                s.highest_puzzle_rating, s.total_games
-            FROM users u
-            JOIN user_stats_latest s ON s.username = u.username
-            WHERE u.status = 'active'
-              AND COALESCE({rating_col}, 0) > 0
-              AND COALESCE({games_col}, 0) >= ?
-            ORDER BY score DESC
-            LIMIT ?
-        """
-
         def build() -> Dict[str, object]:
-            with get_conn(settings) as conn:
-                rows = query_all(conn, sql, (min_games, limit))
+            with get_conn(settings, read_only=True) as conn:
+                rows = get_leaderboard(conn, board, min_games, limit)
             return {"board": board, "items": [dict(r) for r in rows]}
 
         return cached_json(settings, f"api:leaderboards:{board}:{limit}:{min_games}", 300, build)
@@ -267,12 +273,27 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
     @app.get("/players/{username}")
     def player_detail(username: str) -> Dict[str, object]:
         normalized = username.strip().lower()
-        with get_conn(settings) as conn:
+        with get_conn(settings, read_only=True) as conn:
             payload = _player_payload(conn, normalized)
         if not payload:
             raise HTTPException(status_code=404, detail="Player not found")
         return payload
 
+    @app.get("/players/{username}/history")
+    def player_history(username: str, days: int = Query(default=365, ge=1, le=3650)) -> Dict[str, object]:
+        normalized = username.strip().lower()
+        since = int((pd.Timestamp.utcnow() - pd.Timedelta(days=days)).timestamp())
+        with get_conn(settings, read_only=True) as conn:
+            rows = get_player_history(conn, normalized, since)
+            if not rows and not query_one(conn, "SELECT 1 FROM users WHERE username = ?", (normalized,)):
+                raise HTTPException(status_code=404, detail="Player not found")
+        items = []
+        for row in rows:
+            item = dict(row)
+            item["observed_on"] = pd.Timestamp(int(item["observed_at"]), unit="s", tz="UTC").isoformat()
+            items.append(item)
+        return {"username": normalized, "days": days, "items": items}
+
     @app.get("/players/{username}/lookup")
     def player_live_lookup(username: str) -> Dict[str, object]:
         normalized = username.strip().lower()
@@ -289,7 +310,7 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
 
             if profile_status == "not_found":
                 raise HTTPException(status_code=404, detail="Chess.com player not found")
-            if profile_status != "ok" or not profile:
+            if profile_status not in OK_STATUSES or not profile:
                 raise HTTPException(status_code=502, detail=f"Chess.com profile fetch failed: {profile_status}")
 
             country_code = _profile_country_code(profile)
@@ -302,7 +323,7 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
             canonical_username = str(profile.get("username") or normalized).strip().lower()
             if canonical_username != normalized:
                 stats_status, stats = client.fetch_stats(canonical_username)
-            if stats_status not in {"ok", "not_found"}:
+            if stats_status not in {*OK_STATUSES, "not_found"}:
                 raise HTTPException(status_code=502, detail=f"Chess.com stats fetch failed: {stats_status}")
 
             record = _build_user_record(profile, stats or {})
@@ -334,15 +355,15 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
     @app.get("/trends/joins")
     def joins_trend(months: int = Query(default=48, ge=1, le=240)) -> Dict[str, List[Dict[str, object]]]:
         def build() -> Dict[str, List[Dict[str, object]]]:
-            with get_conn(settings) as conn:
+            with get_conn(settings, read_only=True) as conn:
                 rows = query_all(
                     conn,
                     """
-                    SELECT SUBSTR(joined_at, 1, 7) AS month, COUNT(*) AS players
+                    SELECT join_month AS month, COUNT(*) AS players
                     FROM users
-                    WHERE status='active' AND joined_at IS NOT NULL
-                    GROUP BY month
-                    ORDER BY month DESC
+                    WHERE status='active' AND join_month IS NOT NULL
+                    GROUP BY join_month
+                    ORDER BY join_month DESC
                     LIMIT ?
                     """,
                     (months,),
@@ -356,24 +377,24 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
     def discovery_trend(days: int = Query(default=60, ge=1, le=365)) -> Dict[str, List[Dict[str, object]]]:
         def build() -> Dict[str, List[Dict[str, object]]]:
             cutoff_date = (pd.Timestamp.utcnow() - pd.Timedelta(days=days)).date().isoformat()
-            with get_conn(settings) as conn:
+            with get_conn(settings, read_only=True) as conn:
                 signup_rows = query_all(
                     conn,
                     """
-                    SELECT SUBSTR(joined_at, 1, 10) AS day, COUNT(*) AS new_signups
+                    SELECT join_day AS day, COUNT(*) AS new_signups
                     FROM users
-                    WHERE status='active' AND joined_at IS NOT NULL AND SUBSTR(joined_at, 1, 10) >= ?
-                    GROUP BY day
+                    WHERE status='active' AND join_day >= ?
+                    GROUP BY join_day
                     """,
                     (cutoff_date,),
                 )
                 login_rows = query_all(
                     conn,
                     """
-                    SELECT SUBSTR(last_online, 1, 10) AS day, COUNT(*) AS new_logins
+                    SELECT last_online_day AS day, COUNT(*) AS new_logins
                     FROM users
-                    WHERE status='active' AND last_online IS NOT NULL AND SUBSTR(last_online, 1, 10) >= ?
-                    GROUP BY day
+                    WHERE status='active' AND last_online_day >= ?
+                    GROUP BY last_online_day
                     """,
                     (cutoff_date,),
                 )
@@ -398,6 +419,14 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
 
         return cached_json(settings, f"api:trends:discovery:{days}", 300, build)
 
+    @app.get("/africa/country-counts")
+    def africa_country_counts(days: int = Query(default=90, ge=1, le=730)) -> Dict[str, object]:
+        def build() -> Dict[str, object]:
+            with get_conn(settings, read_only=True) as conn:
+                return country_counts_report(conn, days)
+
+        return cached_json(settings, f"api:africa:country-counts:{days}", 900, build)
+
     @app.get("/trends/ledger-adds")
     def ledger_adds_trend(
         start: str = Query(default="2026-05-18", pattern=r"^\d{4}-\d{2}-\d{2}$"),
@@ -409,16 +438,15 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
                 raise HTTPException(status_code=400, detail="start must be YYYY-MM-DD")
             cutoff_date = start_date.date().isoformat()
 
-            with get_conn(settings) as conn:
+            with get_conn(settings, read_only=True) as conn:
                 rows = query_all(
                     conn,
                     """
-                    SELECT SUBSTR(first_seen_at, 1, 10) AS day, COUNT(*) AS new_tracked_players
+                    SELECT first_seen_day AS day, COUNT(*) AS new_tracked_players
                     FROM users
                     WHERE status='active'
-                      AND first_seen_at IS NOT NULL
-                      AND SUBSTR(first_seen_at, 1, 10) >= ?
-                    GROUP BY day
+                      AND first_seen_day >= ?
+                    GROUP BY first_seen_day
                     """,
                     (cutoff_date,),
                 )
@@ -428,8 +456,7 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
                     SELECT COUNT(*) AS players
                     FROM users
                     WHERE status='active'
-                      AND first_seen_at IS NOT NULL
-                      AND SUBSTR(first_seen_at, 1, 10) < ?
+                      AND first_seen_day < ?
                     """,
                     (cutoff_date,),
                 )
@@ -460,7 +487,7 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
     @app.get("/trends/ledger-growth")
     def ledger_growth_trend() -> Dict[str, List[Dict[str, object]]]:
         def build() -> Dict[str, List[Dict[str, object]]]:
-            with get_conn(settings) as conn:
+            with get_conn(settings, read_only=True) as conn:
                 row = query_one(conn, "SELECT COUNT(*) AS players FROM users WHERE status='active'")
 
             current_players = int(row["players"] or 0) if row else 0
@@ -533,16 +560,15 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
 
     @app.get("/stats/distribution")
     def rating_distribution(bucket_size: int = Query(default=100, ge=25, le=400)) -> Dict[str, List[Dict[str, object]]]:
-        with get_conn(settings) as conn:
+        with get_conn(settings, read_only=True) as conn:
             rows = query_all(
                 conn,
                 f"""
                 SELECT
                     (CAST(s.rapid_rating / {bucket_size} AS INT) * {bucket_size}) AS bucket,
                     COUNT(*) AS players
-                FROM users u
-                JOIN user_stats_latest s ON s.username = u.username
-                WHERE u.status='active' AND s.rapid_rating > 0
+                FROM active_player_stats s
+                WHERE s.rapid_rating > 0
                 GROUP BY bucket
                 ORDER BY bucket
                 """
@@ -551,7 +577,7 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
 
     @app.get("/stats/format-summary")
     def format_summary() -> Dict[str, List[Dict[str, object]]]:
-        with get_conn(settings) as conn:
+        with get_conn(settings, read_only=True) as conn:
             row = query_one(
                 conn,
                 """
@@ -565,9 +591,7 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
                     AVG(CASE WHEN s.bullet_rating > 0 THEN s.bullet_rating END) AS bullet_avg,
                     AVG(CASE WHEN s.daily_rating > 0 THEN s.daily_rating END) AS daily_avg,
                     AVG(CASE WHEN s.highest_puzzle_rating > 0 THEN s.highest_puzzle_rating END) AS puzzle_avg
-                FROM users u
-                JOIN user_stats_latest s ON s.username = u.username
-                WHERE u.status='active'
+                FROM active_player_stats s
                 """
             )
         return {
@@ -582,7 +606,7 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
 
     @app.get("/stats/activity-buckets")
     def activity_buckets() -> Dict[str, List[Dict[str, object]]]:
-        with get_conn(settings) as conn:
+        with get_conn(settings, read_only=True) as conn:
             rows = query_all(
                 conn,
                 """
@@ -598,9 +622,7 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
                             WHEN COALESCE(s.total_games, 0) < 20000 THEN '5k-19.9k'
                             ELSE '20k+'
                         END AS bucket
-                    FROM users u
-                    JOIN user_stats_latest s ON s.username = u.username
-                    WHERE u.status='active'
+                    FROM active_player_stats s
                 )
                 GROUP BY bucket
                 ORDER BY
@@ -619,21 +641,19 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
 
     @app.get("/stats/rating-scatter")
     def rating_scatter(limit: int = Query(default=1200, ge=10, le=5000)) -> Dict[str, List[Dict[str, object]]]:
-        with get_conn(settings) as conn:
+        with get_conn(settings, read_only=True) as conn:
             rows = query_all(
                 conn,
                 """
                 SELECT
-                    u.username,
+                    s.username,
                     s.rapid_rating,
                     s.blitz_rating,
                     s.bullet_rating,
                     s.daily_rating,
                     s.total_games
-                FROM users u
-                JOIN user_stats_latest s ON s.username = u.username
-                WHERE u.status='active'
-                  AND s.rapid_rating > 0
+                FROM active_player_stats s
+                WHERE s.rapid_rating > 0
                   AND s.blitz_rating > 0
                 ORDER BY s.total_games DESC
                 LIMIT ?
@@ -678,7 +698,7 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
                 builder=lambda conn: build_cohort_retention_payload(conn, months=24),
                 source="api:cohort-retention",
             )
-        with get_conn(settings) as conn:
+        with get_conn(settings, read_only=True) as conn:
             return build_cohort_retention_payload(conn, months=months)
 
     @app.get("/stats/story-report")
@@ -693,7 +713,7 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
     @app.get("/players/{username}/benchmark")
     def player_benchmark(username: str) -> Dict[str, object]:
         normalized = username.strip().lower()
-        with get_conn(settings) as conn:
+        with get_conn(settings, read_only=True) as conn:
             payload = build_player_benchmark_payload(conn, normalized)
         if not payload:
             raise HTTPException(status_code=404, detail="Player not found")
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import Settings
+
+
+logger = logging.getLogger(__name__)
+
+# Lines are compressed as independent zstd frames of this many records, so a
+# crash loses at most one unflushed frame and segments stay readable.
+ARCHIVE_FRAME_LINES = 1000
+ARCHIVE_SUFFIX = ".jsonl.zst"
+ARCHIVED_KINDS = ("profile", "stats")
+
+
+def _zstandard() -> Optional[Any]:
+    try:
+        import zstandard
+
+        return zstandard
+    except ImportError:
+        return None
+
+
+def _username_from_url(url: str) -> str:
+    return url.rsplit("/player/", 1)[-1].split("/", 1)[0].lower()
+
+
+class RawArchive:
+    # Appends raw Chess.com payloads to <root>/<YYYY-MM-DD>/<host>-<pid>-<start>.jsonl.zst,
+    # one segment per process per day.
+    def __init__(self, root: Path, zstd: Any, level: int = 3):
+        self.root = Path(root)
+        self._compressor = zstd.ZstdCompressor(level=level)
+        self._segment_name = f"{socket.gethostname()}-{os.getpid()}-{int(time.time())}{ARCHIVE_SUFFIX}"
+        self._lines: List[bytes] = []
+        self._day: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def append(self, kind: str, url: str, payload: Dict) -> None:
+        if kind not in ARCHIVED_KINDS:
+            return
+        fetched_at = int(time.time())
+        day = datetime.fromtimestamp(fetched_at, tz=timezone.utc).date().isoformat()
+        line = json.dumps(
+            {"kind": kind, "username": _username_from_url(url), "fetched_at": fetched_at, "payload": payload},
+            separators=(",", ":"),
+        ).encode("utf-8")
+        with self._lock:
+            if self._day is not None and day != self._day:
+                self._flush_locked()
+            self._day = day
+            self._lines.append(line)
+            if len(self._lines) >= ARCHIVE_FRAME_LINES:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        self.flush()
+
+    def _flush_locked(self) -> None:
+        if not self._lines or self._day is None:
+            return
+        segment = self.root / self._day / self._segment_name
+        segment.parent.mkdir(parents=True, exist_ok=True)
+        frame = self._compressor.compress(b"\n".join(self._lines) + b"\n")
+        with open(segment, "ab") as f:
+            f.write(frame)
+        self._lines = []
+
+
+def open_raw_archive(settings: Settings) -> Optional[RawArchive]:
+    if not settings.raw_archive_enabled:
+        return None
+    zstd = _zstandard()
+    if zstd is None:
+        logger.warning("Raw payload archive disabled: the zstandard package is not installed")
+        return None
+    return RawArchive(settings.resolved_raw_archive_dir, zstd, level=settings.raw_archive_level)
+
+
+def list_segments(root: Path, since: Optional[str] = None, until: Optional[str] = None) -> List[Path]:
+    root = Path(root)
+    if not root.exists():
+        return []
+    segments: List[Path] = []
+    for day_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        if (since and day_dir.name < since) or (until and day_dir.name > until):
+            continue
+        segments.extend(sorted(day_dir.glob(f"*{ARCHIVE_SUFFIX}")))
+    return segments
+
+
+def iter_segment(path: Path) -> Iterator[Dict]:
+    zstd = _zstandard()
+    if zstd is None:
+        raise RuntimeError("Reading the raw payload archive requires the zstandard package")
+    with open(path, "rb") as raw:
+        reader = zstd.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        buffered = b""
+        while True:
+            chunk = reader.read(1 << 20)
+            if not chunk:
+                break
+            buffered += chunk
+            *lines, buffered = buffered.split(b"\n")
+            for line in lines:
+                if line:
+                    yield json.loads(line)
+        if buffered.strip():
+            yield json.loads(buffered)
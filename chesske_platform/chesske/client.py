@@ -1,53 +1,257 @@
+import asyncio
 import time
 from typing import Dict, List, Optional, Tuple
 
+import httpx
 import requests
 from requests.exceptions import RequestException
 
+from .archive import RawArchive
 from .config import Settings
+from .http_cache import CachedResponse, get_shared_response_cache
+from .metrics import RunMetrics
+from .ratelimit import backoff_seconds, get_shared_rate_limiter, parse_retry_after
+
+
+CHESSCOM_API_BASE = "https://api.chess.com/pub"
+# "not_modified" means a 304 revalidated the locally cached body, which is returned as the payload.
+OK_STATUSES = ("ok", "not_modified")
+
+
+def _is_throttled(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+def _conditional_headers(cached: Optional[CachedResponse]) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+    if cached is None:
+        return headers
+    if cached.etag:
+        headers["If-None-Match"] = cached.etag
+    if cached.last_modified:
+        headers["If-Modified-Since"] = cached.last_modified
+    return headers
+
+
+def _record_request(metrics: Optional[RunMetrics], kind: str, started: float, status: str) -> None:
+    if metrics is not None:
+        metrics.record_request(kind, time.monotonic() - started, status)
+
+
+def _record_retry(metrics: Optional[RunMetrics], kind: str) -> None:
+    if metrics is not None:
+        metrics.record_retry(kind)
+
+
+def _record_sleep(metrics: Optional[RunMetrics], seconds: float) -> None:
+    if metrics is not None:
+        metrics.record_sleep(seconds)
+
+
+def _normalize_country_players(payload: Optional[Dict]) -> List[str]:
+    if not payload:
+        return []
+    players = payload.get("players", [])
+    normalized = [str(p).strip().lower() for p in players if str(p).strip()]
+    return sorted(set(normalized))
+
+
+def _cap_active_players(settings: Settings, usernames: List[str]) -> List[str]:
+    if settings.max_active_players > 0:
+        return usernames[: settings.max_active_players]
+    return usernames
 
 
 class ChessComClient:
-    def __init__(self, settings: Settings):
+    def __init__(
+        self,
+        settings: Settings,
+        metrics: Optional[RunMetrics] = None,
+        archive: Optional[RawArchive] = None,
+    ):
         self.settings = settings
-        self.base_url = "https://api.chess.com/pub"
+        self.metrics = metrics
+        self.archive = archive
+        self.base_url = settings.chesscom_api_base or CHESSCOM_API_BASE
         self.session = requests.Session()
         self.session.headers.update({"User-Agent": settings.user_agent})
+        self.limiter = get_shared_rate_limiter(settings)
+        self.cache = get_shared_response_cache(settings)
 
-    def _request_json(self, url: str) -> Tuple[str, Optional[Dict]]:
-        last_error: Optional[Exception] = None
+    def _request_json(self, url: str, kind: str) -> Tuple[str, Optional[Dict]]:
+        cached = self.cache.get(url) if self.cache else None
+        last_error: Optional[object] = None
         for attempt in range(self.settings.max_retries):
+            if attempt:
+                _record_retry(self.metrics, kind)
+            _record_sleep(self.metrics, self.limiter.acquire())
+            started = time.monotonic()
             try:
                 response = self.session.get(
                     url,
+                    headers=_conditional_headers(cached),
                     timeout=(
                         self.settings.request_connect_timeout,
                         self.settings.request_read_timeout,
                     ),
                 )
+                _record_request(self.metrics, kind, started, str(response.status_code))
+                if response.status_code == 304 and cached is not None:
+                    self.limiter.on_success()
+                    self.cache.touch(url)
+                    return "not_modified", cached.json()
                 if response.status_code == 404:
+                    self.limiter.on_success()
                     return "not_found", None
+                if _is_throttled(response.status_code):
+                    last_error = f"HTTP {response.status_code}"
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    self.limiter.on_throttle(retry_after or backoff_seconds(attempt))
+                    continue
                 response.raise_for_status()
-                return "ok", response.json()
+                payload = response.json()
             except RequestException as exc:
-                last_error = exc
-                time.sleep((2**attempt) * 0.25)
+                _record_request(self.metrics, kind, started, type(exc).__name__)
+                last_error = f"{type(exc).__name__}: {exc}"
+                time.sleep(backoff_seconds(attempt))
+                _record_sleep(self.metrics, backoff_seconds(attempt))
+                continue
+            self.limiter.on_success()
+            if self.cache:
+                self.cache.store(
+                    url,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    response.content,
+                )
+            if self.archive:
+                self.archive.append(kind, url, payload)
+            return "ok", payload
         return f"error:{last_error}", None
 
+    def fetch_country_players(self, country_code: str) -> Tuple[str, List[str]]:
+        status, payload = self._request_json(f"{self.base_url}/country/{country_code}/players", "country")
+        if status not in OK_STATUSES:
+            return status, []
+        return status, _normalize_country_players(payload)
+
     def fetch_active_country_players(self, country_code: str) -> List[str]:
-        status, payload = self._request_json(f"{self.base_url}/country/{country_code}/players")
-        if status != "ok" or not payload:
-            return []
-        players = payload.get("players", [])
-        normalized = [str(p).strip().lower() for p in players if str(p).strip()]
-        unique = sorted(set(normalized))
-        if self.settings.max_active_players > 0:
-            return unique[: self.settings.max_active_players]
-        return unique
+        _, usernames = self.fetch_country_players(country_code)
+        return _cap_active_players(self.settings, usernames)
 
     def fetch_profile(self, username: str) -> Tuple[str, Optional[Dict]]:
-        return self._request_json(f"{self.base_url}/player/{username}")
+        return self._request_json(f"{self.base_url}/player/{username}", "profile")
 
     def fetch_stats(self, username: str) -> Tuple[str, Optional[Dict]]:
-        return self._request_json(f"{self.base_url}/player/{username}/stats")
+        return self._request_json(f"{self.base_url}/player/{username}/stats", "stats")
+
+
+class AsyncChessComClient:
+    def __init__(
+        self,
+        settings: Settings,
+        metrics: Optional[RunMetrics] = None,
+        archive: Optional[RawArchive] = None,
+    ):
+        self.settings = settings
+        self.metrics = metrics
+        self.archive = archive
+        self.base_url = settings.chesscom_api_base or CHESSCOM_API_BASE
+        concurrency = max(1, settings.max_concurrency)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.limiter = get_shared_rate_limiter(settings)
+        self.cache = get_shared_response_cache(settings)
+        self._client = httpx.AsyncClient(
+            headers={"User-Agent": settings.user_agent},
+            timeout=httpx.Timeout(
+                settings.request_read_timeout,
+                connect=settings.request_connect_timeout,
+            ),
+            limits=httpx.Limits(
+                max_connections=concurrency,
+                max_keepalive_connections=concurrency,
+            ),
+        )
+
+    async def __aenter__(self) -> "AsyncChessComClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def _request_json(self, url: str, kind: str) -> Tuple[str, Optional[Dict]]:
+        cached = self.cache.get(url) if self.cache else None
+        last_error: Optional[object] = None
+        for attempt in range(self.settings.max_retries):
+            if attempt:
+                _record_retry(self.metrics, kind)
+            _record_sleep(self.metrics, await self.limiter.acquire_async())
+            started = time.monotonic()
+            try:
+                async with self._semaphore:
+                    started = time.monotonic()
+                    response = await self._client.get(url, headers=_conditional_headers(cached))
+                _record_request(self.metrics, kind, started, str(response.status_code))
+                if response.status_code == 304 and cached is not None:
+                    self.limiter.on_success()
+                    self.cache.touch(url)
+                    return "not_modified", cached.json()
+                if response.status_code == 404:
+                    self.limiter.on_success()
+                    return "not_found", None
+                if _is_throttled(response.status_code):
+                    last_error = f"HTTP {response.status_code}"
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    self.limiter.on_throttle(retry_after or backoff_seconds(attempt))
+                    continue
+                response.raise_for_status()
+                payload = response.json()
+            except (httpx.HTTPError, ValueError) as exc:
+                _record_request(self.metrics, kind, started, type(exc).__name__)
+                last_error = f"{type(exc).__name__}: {exc}"
+                await asyncio.sleep(backoff_seconds(attempt))
+                _record_sleep(self.metrics, backoff_seconds(attempt))
+                continue
+            self.limiter.on_success()
+            if self.cache:
+                self.cache.store(
+                    url,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    response.content,
+                )
+            if self.archive:
+                self.archive.append(kind, url, payload)
+            return "ok", payload
+        return f"error:{last_error}", None
+
+    async def fetch_country_players(self, country_code: str) -> Tuple[str, List[str]]:
+        status, payload = await self._request_json(f"{self.base_url}/country/{country_code}/players", "country")
+        if status not in OK_STATUSES:
+            return status, []
+        return status, _normalize_country_players(payload)
+
+    async def fetch_active_country_players(self, country_code: str) -> List[str]:
+        _, usernames = await self.fetch_country_players(country_code)
+        return _cap_active_players(self.settings, usernames)
+
+    async def fetch_profile(self, username: str) -> Tuple[str, Optional[Dict]]:
+        return await self._request_json(f"{self.base_url}/player/{username}", "profile")
+
+    async def fetch_stats(self, username: str) -> Tuple[str, Optional[Dict]]:
+        return await self._request_json(f"{self.base_url}/player/{username}/stats", "stats")
 
+    async def fetch_player(
+        self,
+        username: str,
+    ) -> Tuple[Tuple[str, Optional[Dict]], Tuple[str, Optional[Dict]]]:
+        # Stats are only requested once the profile is usable, as in the sync
+        # path, so a 404 or failed profile does not spend a second request and
+        # rate-limiter token.
+        profile = await self.fetch_profile(username)
+        if profile[0] not in OK_STATUSES:
+            return profile, ("skipped", None)
+        return profile, await self.fetch_stats(username)
@@ -9,13 +9,70 @@ class Settings:
     database_url: str = field(default_factory=lambda: os.getenv("DATABASE_URL", "").strip())
     redis_url: str = field(default_factory=lambda: os.getenv("REDIS_URL", "").strip())
     db_path: Path = field(default_factory=lambda: Path(os.getenv("CHESSKE_DB_PATH", "data/chesske.db")))
+    db_pool_min_size: int = field(default_factory=lambda: int(os.getenv("CHESSKE_DB_POOL_MIN_SIZE", "1")))
+    db_pool_max_size: int = field(default_factory=lambda: int(os.getenv("CHESSKE_DB_POOL_MAX_SIZE", "10")))
+    db_pool_timeout_seconds: float = field(default_factory=lambda: float(os.getenv("CHESSKE_DB_POOL_TIMEOUT", "30")))
+    db_pool_max_idle_seconds: float = field(default_factory=lambda: float(os.getenv("CHESSKE_DB_POOL_MAX_IDLE", "600")))
+    sqlite_mmap_mb: int = field(default_factory=lambda: int(os.getenv("CHESSKE_SQLITE_MMAP_MB", "256")))
+    sqlite_cache_mb: int = field(default_factory=lambda: int(os.getenv("CHESSKE_SQLITE_CACHE_MB", "64")))
+    sqlite_busy_timeout_ms: int = field(default_factory=lambda: int(os.getenv("CHESSKE_SQLITE_BUSY_TIMEOUT_MS", "30000")))
     country_code: str = field(default_factory=lambda: os.getenv("CHESSKE_COUNTRY_CODE", "KE"))
     refresh_limit: int = field(default_factory=lambda: int(os.getenv("CHESSKE_REFRESH_LIMIT", "500")))
     max_active_players: int = field(default_factory=lambda: int(os.getenv("CHESSKE_MAX_ACTIVE_PLAYERS", "0")))
     request_connect_timeout: int = field(default_factory=lambda: int(os.getenv("CHESSKE_CONNECT_TIMEOUT", "8")))
     request_read_timeout: int = field(default_factory=lambda: int(os.getenv("CHESSKE_READ_TIMEOUT", "20")))
-    request_delay_seconds: float = field(default_factory=lambda: float(os.getenv("CHESSKE_REQUEST_DELAY_SECONDS", "0.25")))
+    rate_limit_per_second: float = field(default_factory=lambda: float(os.getenv("CHESSKE_RATE_LIMIT_PER_SECOND", "4")))
+    rate_limit_min_per_second: float = field(default_factory=lambda: float(os.getenv("CHESSKE_RATE_LIMIT_MIN_PER_SECOND", "0.5")))
+    rate_limit_max_per_second: float = field(default_factory=lambda: float(os.getenv("CHESSKE_RATE_LIMIT_MAX_PER_SECOND", "20")))
+    rate_limit_burst: int = field(default_factory=lambda: int(os.getenv("CHESSKE_RATE_LIMIT_BURST", "4")))
     max_retries: int = field(default_factory=lambda: int(os.getenv("CHESSKE_MAX_RETRIES", "4")))
+    pipeline_mode: str = field(default_factory=lambda: os.getenv("CHESSKE_PIPELINE_MODE", "sequential").strip().lower())
+    max_concurrency: int = field(default_factory=lambda: int(os.getenv("CHESSKE_MAX_CONCURRENCY", "8")))
+    write_batch_size: int = field(default_factory=lambda: int(os.getenv("CHESSKE_WRITE_BATCH_SIZE", "200")))
+    write_queue_size: int = field(default_factory=lambda: int(os.getenv("CHESSKE_WRITE_QUEUE_SIZE", "1000")))
+    active_sweep: str = field(default_factory=lambda: os.getenv("CHESSKE_ACTIVE_SWEEP", "diff").strip().lower())
+    pipeline_resume: bool = field(
+        default_factory=lambda: os.getenv("CHESSKE_PIPELINE_RESUME", "1").strip().lower() not in {"0", "false", "no", "off"}
+    )
+    # Runs older than this are not resumed, so a stale partial run cannot hold
+    # back the next day's active snapshot and refresh queue.
+    resume_max_age_hours: float = field(
+        default_factory=lambda: float(os.getenv("CHESSKE_RESUME_MAX_AGE_HOURS", "20"))
+    )
+    max_item_attempts: int = field(default_factory=lambda: int(os.getenv("CHESSKE_MAX_ITEM_ATTEMPTS", "3")))
+    claim_size: int = field(default_factory=lambda: int(os.getenv("CHESSKE_CLAIM_SIZE", "500")))
+    lease_seconds: int = field(default_factory=lambda: int(os.getenv("CHESSKE_LEASE_SECONDS", "300")))
+    run_lock_seconds: int = field(default_factory=lambda: int(os.getenv("CHESSKE_RUN_LOCK_SECONDS", "900")))
+    max_run_seconds: int = field(default_factory=lambda: int(os.getenv("CHESSKE_MAX_RUN_SECONDS", "0")))
+    max_run_requests: int = field(default_factory=lambda: int(os.getenv("CHESSKE_MAX_RUN_REQUESTS", "0")))
+    daemon_rate_per_second: float = field(default_factory=lambda: float(os.getenv("CHESSKE_DAEMON_RATE_PER_SECOND", "1")))
+    daemon_batch_size: int = field(default_factory=lambda: int(os.getenv("CHESSKE_DAEMON_BATCH_SIZE", "50")))
+    daemon_idle_seconds: int = field(default_factory=lambda: int(os.getenv("CHESSKE_DAEMON_IDLE_SECONDS", "60")))
+    daemon_snapshot_seconds: int = field(default_factory=lambda: int(os.getenv("CHESSKE_DAEMON_SNAPSHOT_SECONDS", "3600")))
+    daemon_analytics_min_changes: int = field(
+        default_factory=lambda: int(os.getenv("CHESSKE_DAEMON_ANALYTICS_MIN_CHANGES", "500"))
+    )
+    daemon_analytics_max_seconds: int = field(
+        default_factory=lambda: int(os.getenv("CHESSKE_DAEMON_ANALYTICS_MAX_SECONDS", "1800"))
+    )
+    full_sweep: bool = field(
+        default_factory=lambda: os.getenv("CHESSKE_FULL_SWEEP", "0").strip().lower() not in {"0", "false", "no", "off"}
+    )
+    sweep_daily_requests: int = field(default_factory=lambda: int(os.getenv("CHESSKE_SWEEP_DAILY_REQUESTS", "20000")))
+    sweep_chunk_size: int = field(default_factory=lambda: int(os.getenv("CHESSKE_SWEEP_CHUNK_SIZE", "1000")))
+    http_cache_enabled: bool = field(
+        default_factory=lambda: os.getenv("CHESSKE_HTTP_CACHE", "1").strip().lower() not in {"0", "false", "no", "off"}
+    )
+    http_cache_path: Path = field(default_factory=lambda: Path(os.getenv("CHESSKE_HTTP_CACHE_PATH", "data/http_cache.db")))
+    http_cache_max_mb: int = field(default_factory=lambda: int(os.getenv("CHESSKE_HTTP_CACHE_MAX_MB", "512")))
+    raw_archive_enabled: bool = field(
+        default_factory=lambda: os.getenv("CHESSKE_RAW_ARCHIVE", "0").strip().lower() not in {"0", "false", "no", "off"}
+    )
+    raw_archive_dir: Path = field(default_factory=lambda: Path(os.getenv("CHESSKE_RAW_ARCHIVE_DIR", "data/raw_archive")))
+    raw_archive_level: int = field(default_factory=lambda: int(os.getenv("CHESSKE_RAW_ARCHIVE_LEVEL", "3")))
+    chesscom_api_base: str = field(
+        default_factory=lambda: os.getenv("CHESSKE_CHESSCOM_API_BASE", "https://api.chess.com/pub").strip().rstrip("/")
+    )
     user_agent: str = field(
         default_factory=lambda: os.getenv(
             "CHESSKE_USER_AGENT",
@@ -28,3 +85,15 @@ class Settings:
         if self.db_path.is_absolute():
             return self.db_path
         return self.base_dir / self.db_path
+
+    @property
+    def resolved_http_cache_path(self) -> Path:
+        if self.http_cache_path.is_absolute():
+            return self.http_cache_path
+        return self.base_dir / self.http_cache_path
+
+    @property
+    def resolved_raw_archive_dir(self) -> Path:
+        if self.raw_archive_dir.is_absolute():
+            return self.raw_archive_dir
+        return self.base_dir / self.raw_archive_dir
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from .cache import delete_by_pattern
+from .client import OK_STATUSES, AsyncChessComClient
+from .config import Settings
+from .db import get_conn, init_db, utc_now_iso
+from .repository import get_country_count_history, replace_country_members, upsert_country_counts
+
+
+logger = logging.getLogger(__name__)
+
+AFRICAN_COUNTRIES = [
+    {"alpha2": "DZ", "alpha3": "DZA", "name": "Algeria"},
+    {"alpha2": "AO", "alpha3": "AGO", "name": "Angola"},
+    {"alpha2": "BJ", "alpha3": "BEN", "name": "Benin"},
+    {"alpha2": "BW", "alpha3": "BWA", "name": "Botswana"},
+    {"alpha2": "BF", "alpha3": "BFA", "name": "Burkina Faso"},
+    {"alpha2": "BI", "alpha3": "BDI", "name": "Burundi"},
+    {"alpha2": "CM", "alpha3": "CMR", "name": "Cameroon"},
+    {"alpha2": "CV", "alpha3": "CPV", "name": "Cabo Verde"},
+    {"alpha2": "CF", "alpha3": "CAF", "name": "Central African Republic"},
+    {"alpha2": "TD", "alpha3": "TCD", "name": "Chad"},
+    {"alpha2": "KM", "alpha3": "COM", "name": "Comoros"},
+    {"alpha2": "CG", "alpha3": "COG", "name": "Congo"},
+    {"alpha2": "CD", "alpha3": "COD", "name": "Congo (DRC)"},
+    {"alpha2": "CI", "alpha3": "CIV", "name": "Côte d'Ivoire"},
+    {"alpha2": "DJ", "alpha3": "DJI", "name": "Djibouti"},
+    {"alpha2": "EG", "alpha3": "EGY", "name": "Egypt"},
+    {"alpha2": "GQ", "alpha3": "GNQ", "name": "Equatorial Guinea"},
+    {"alpha2": "ER", "alpha3": "ERI", "name": "Eritrea"},
+    {"alpha2": "SZ", "alpha3": "SWZ", "name": "Eswatini"},
+    {"alpha2": "ET", "alpha3": "ETH", "name": "Ethiopia"},
+    {"alpha2": "GA", "alpha3": "GAB", "name": "Gabon"},
+    {"alpha2": "GM", "alpha3": "GMB", "name": "Gambia"},
+    {"alpha2": "GH", "alpha3": "GHA", "name": "Ghana"},
+    {"alpha2": "GN", "alpha3": "GIN", "name": "Guinea"},
+    {"alpha2": "GW", "alpha3": "GNB", "name": "Guinea-Bissau"},
+    {"alpha2": "KE", "alpha3": "KEN", "name": "Kenya"},
+    {"alpha2": "LS", "alpha3": "LSO", "name": "Lesotho"},
+    {"alpha2": "LR", "alpha3": "LBR", "name": "Liberia"},
+    {"alpha2": "LY", "alpha3": "LBY", "name": "Libya"},
+    {"alpha2": "MG", "alpha3": "MDG", "name": "Madagascar"},
+    {"alpha2": "MW", "alpha3": "MWI", "name": "Malawi"},
+    {"alpha2": "ML", "alpha3": "MLI", "name": "Mali"},
+    {"alpha2": "MR", "alpha3": "MRT", "name": "Mauritania"},
+    {"alpha2": "MU", "alpha3": "MUS", "name": "Mauritius"},
+    {"alpha2": "MA", "alpha3": "MAR", "name": "Morocco"},
+    {"alpha2": "MZ", "alpha3": "MOZ", "name": "Mozambique"},
+    {"alpha2": "NA", "alpha3": "NAM", "name": "Namibia"},
+    {"alpha2": "NE", "alpha3": "NER", "name": "Niger"},
+    {"alpha2": "NG", "alpha3": "NGA", "name": "Nigeria"},
+    {"alpha2": "RW", "alpha3": "RWA", "name": "Rwanda"},
+    {"alpha2": "ST", "alpha3": "STP", "name": "Sao Tome and Principe"},
+    {"alpha2": "SN", "alpha3": "SEN", "name": "Senegal"},
+    {"alpha2": "SC", "alpha3": "SYC", "name": "Seychelles"},
+    {"alpha2": "SL", "alpha3": "SLE", "name": "Sierra Leone"},
+    {"alpha2": "SO", "alpha3": "SOM", "name": "Somalia"},
+    {"alpha2": "ZA", "alpha3": "ZAF", "name": "South Africa"},
+    {"alpha2": "SS", "alpha3": "SSD", "name": "South Sudan"},
+    {"alpha2": "SD", "alpha3": "SDN", "name": "Sudan"},
+    {"alpha2": "TZ", "alpha3": "TZA", "name": "Tanzania"},
+    {"alpha2": "TG", "alpha3": "TGO", "name": "Togo"},
+    {"alpha2": "TN", "alpha3": "TUN", "name": "Tunisia"},
+    {"alpha2": "UG", "alpha3": "UGA", "name": "Uganda"},
+    {"alpha2": "ZM", "alpha3": "ZMB", "name": "Zambia"},
+    {"alpha2": "ZW", "alpha3": "ZWE", "name": "Zimbabwe"},
+]
+
+
+async def _fetch_country_lists(settings: Settings, countries: Sequence[Dict[str, str]]) -> List[Dict[str, Any]]:
+    # All lists are requested at once; the shared limiter and the client's
+    # connection cap keep the burst polite.
+    async with AsyncChessComClient(settings) as client:
+        responses = await asyncio.gather(
+            *(client.fetch_country_players(country["alpha2"]) for country in countries)
+        )
+    results = []
+    for country, (status, players) in zip(countries, responses):
+        ok = status in OK_STATUSES
+        if not ok:
+            logger.error("Error fetching players for %s (%s): %s", country["name"], country["alpha2"], status)
+        results.append(
+            {
+                "country_code": country["alpha2"],
+                "iso3": country["alpha3"],
+                "country_name": country["name"],
+                "player_count": len(players) if ok else None,
+                "status": status,
+                "players": players if ok else None,
+            }
+        )
+    return results
+
+
+def collect_country_counts(
+    settings: Settings,
+    countries: Sequence[Dict[str, str]] = AFRICAN_COUNTRIES,
+    store_members: bool = False,
+    persist: bool = True,
+) -> List[Dict[str, Any]]:
+    # persist=False only fetches; callers such as the CSV script must opt in
+    # before anything touches the configured database.
+    results = asyncio.run(_fetch_country_lists(settings, countries))
+    snapshot_date = datetime.now(timezone.utc).date().isoformat()
+    if persist:
+        init_db(settings)
+        fetched_at = utc_now_iso()
+        with get_conn(settings) as conn:
+            # A failed fetch keeps whatever an earlier run stored for the day.
+            upsert_country_counts(
+                conn, snapshot_date, [r for r in results if r["player_count"] is not None], fetched_at
+            )
+            if store_members:
+                for result in results:
+                    if result["players"] is not None:
+                        replace_country_members(conn, snapshot_date, result["country_code"], result["players"])
+        delete_by_pattern(settings, "api:africa:*")
+    for result in results:
+        result["snapshot_date"] = snapshot_date
+        result.pop("players")
+    return results
+
+
+def country_counts_report(conn: Any, days: int) -> Dict[str, Any]:
+    since = (datetime.now(timezone.utc).date() - timedelta(days=days)).isoformat()
+    rows = get_country_count_history(conn, since)
+    by_country: Dict[str, Dict[str, Any]] = {}
+    totals: Dict[str, int] = {}
+    for row in rows:
+        day = str(row["snapshot_date"])
+        count = int(row["player_count"] or 0)
+        entry = by_country.setdefault(
+            str(row["country_code"]),
+            {
+                "country_code": row["country_code"],
+                "iso3": row["iso3"],
+                "country_name": row["country_name"],
+                "history": [],
+            },
+        )
+        entry["history"].append({"snapshot_date": day, "player_count": count})
+        totals[day] = totals.get(day, 0) + count
+
+    items = []
+    for entry in by_country.values():
+        first, latest = entry["history"][0], entry["history"][-1]
+        change = latest["player_count"] - first["player_count"]
+        items.append(
+            {
+                **entry,
+                "snapshot_date": latest["snapshot_date"],
+                "player_count": latest["player_count"],
+                "change": change,
+                "change_pct": round(100.0 * change / first["player_count"], 2) if first["player_count"] else None,
+            }
+        )
+    items.sort(key=lambda item: item["player_count"], reverse=True)
+    latest_date: Optional[str] = max(totals) if totals else None
+    return {
+        "days": days,
+        "snapshot_date": latest_date,
+        "total_players": totals.get(latest_date, 0) if latest_date else 0,
+        "totals": [{"snapshot_date": day, "player_count": totals[day]} for day in sorted(totals)],
+        "items": items,
+    }
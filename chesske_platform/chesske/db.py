@@ -1,8 +1,13 @@
+import atexit
+import logging
+import os
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Iterator, Optional, Sequence
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Set, Tuple
 
 import psycopg
 from psycopg.rows import dict_row
@@ -10,6 +15,8 @@ from psycopg.rows import dict_row
 from .config import Settings
 
 
+logger = logging.getLogger(__name__)
+
 SQLITE_SCHEMA_SQL = """
 PRAGMA foreign_keys = ON;
 
@@ -22,7 +29,11 @@ CREATE TABLE IF NOT EXISTS pipeline_runs (
     updated_count INTEGER NOT NULL DEFAULT 0,
     deleted_count INTEGER NOT NULL DEFAULT 0,
     refresh_count INTEGER NOT NULL DEFAULT 0,
+    sweep_count INTEGER NOT NULL DEFAULT 0,
     error_count INTEGER NOT NULL DEFAULT 0,
+    unchanged_count INTEGER NOT NULL DEFAULT 0,
+    stats_skipped_count INTEGER NOT NULL DEFAULT 0,
+    stop_reason TEXT,
     notes TEXT
 );
 
@@ -36,6 +47,51 @@ CREATE TABLE IF NOT EXISTS run_errors (
     FOREIGN KEY (run_id) REFERENCES pipeline_runs(id) ON DELETE CASCADE
 );
 
+CREATE TABLE IF NOT EXISTS pipeline_work_items (
+    run_id INTEGER NOT NULL,
+    phase TEXT NOT NULL,
+    username TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    lease_owner TEXT,
+    lease_expires_at TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, phase, username),
+    FOREIGN KEY (run_id) REFERENCES pipeline_runs(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_locks (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    run_id INTEGER,
+    acquired_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_run_metrics (
+    run_id INTEGER NOT NULL,
+    phase TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    label TEXT NOT NULL DEFAULT '',
+    value REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, phase, metric, label),
+    FOREIGN KEY (run_id) REFERENCES pipeline_runs(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_sweeps (
+    name TEXT PRIMARY KEY,
+    pass_number INTEGER NOT NULL DEFAULT 1,
+    pass_started_at TEXT,
+    cursor_username TEXT,
+    budget_date TEXT,
+    budget_used INTEGER NOT NULL DEFAULT 0,
+    last_run_id INTEGER,
+    last_completed_at TEXT,
+    updated_at TEXT NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS users (
     username TEXT PRIMARY KEY,
     joined_at TEXT,
@@ -44,6 +100,9 @@ CREATE TABLE IF NOT EXISTS users (
     first_seen_at TEXT NOT NULL,
     last_seen_active_at TEXT,
     next_refresh_at TEXT,
+    refresh_interval_days REAL,
+    change_rate REAL,
+    last_fetched_at TEXT,
     updated_at TEXT NOT NULL
 );
 
@@ -72,10 +131,59 @@ CREATE TABLE IF NOT EXISTS user_stats_latest (
     blitz_wins INTEGER NOT NULL DEFAULT 0,
     blitz_losses INTEGER NOT NULL DEFAULT 0,
     blitz_draws INTEGER NOT NULL DEFAULT 0,
+    record_hash TEXT,
     updated_at TEXT NOT NULL,
     FOREIGN KEY (username) REFERENCES users(username) ON DELETE CASCADE
 );
 
+-- Active players with stats, one narrow row each: the users/user_stats_latest
+-- join the analytics and leaderboards read, kept in step by the upsert path and
+-- mark_user_deleted.
+CREATE TABLE IF NOT EXISTS active_player_stats (
+    username TEXT PRIMARY KEY,
+    joined_at TEXT,
+    last_online TEXT,
+    join_month TEXT,
+    last_online_day TEXT,
+    total_games INTEGER NOT NULL DEFAULT 0,
+    total_daily INTEGER NOT NULL DEFAULT 0,
+    total_rapid INTEGER NOT NULL DEFAULT 0,
+    total_bullet INTEGER NOT NULL DEFAULT 0,
+    total_blitz INTEGER NOT NULL DEFAULT 0,
+    daily_rating INTEGER NOT NULL DEFAULT 0,
+    rapid_rating INTEGER NOT NULL DEFAULT 0,
+    bullet_rating INTEGER NOT NULL DEFAULT 0,
+    blitz_rating INTEGER NOT NULL DEFAULT 0,
+    highest_puzzle_rating INTEGER,
+    highest_puzzle_date TEXT,
+    daily_wins INTEGER NOT NULL DEFAULT 0,
+    daily_losses INTEGER NOT NULL DEFAULT 0,
+    daily_draws INTEGER NOT NULL DEFAULT 0,
+    rapid_wins INTEGER NOT NULL DEFAULT 0,
+    rapid_losses INTEGER NOT NULL DEFAULT 0,
+    rapid_draws INTEGER NOT NULL DEFAULT 0,
+    bullet_wins INTEGER NOT NULL DEFAULT 0,
+    bullet_losses INTEGER NOT NULL DEFAULT 0,
+    bullet_draws INTEGER NOT NULL DEFAULT 0,
+    blitz_wins INTEGER NOT NULL DEFAULT 0,
+    blitz_losses INTEGER NOT NULL DEFAULT 0,
+    blitz_draws INTEGER NOT NULL DEFAULT 0
+);
+
+-- One row per observed change. WITHOUT ROWID clusters rows by (username, observed_at)
+-- so a player's series is a single primary-key range scan.
+CREATE TABLE IF NOT EXISTS user_stats_history (
+    username TEXT NOT NULL,
+    observed_at INTEGER NOT NULL,
+    total_games INTEGER NOT NULL DEFAULT 0,
+    rapid_rating INTEGER NOT NULL DEFAULT 0,
+    blitz_rating INTEGER NOT NULL DEFAULT 0,
+    bullet_rating INTEGER NOT NULL DEFAULT 0,
+    daily_rating INTEGER NOT NULL DEFAULT 0,
+    highest_puzzle_rating INTEGER,
+    PRIMARY KEY (username, observed_at)
+) WITHOUT ROWID;
+
 CREATE TABLE IF NOT EXISTS country_active_snapshots (
     snapshot_date TEXT NOT NULL,
     username TEXT NOT NULL,
@@ -83,6 +191,23 @@ CREATE TABLE IF NOT EXISTS country_active_snapshots (
     PRIMARY KEY (snapshot_date, username)
 );
 
+CREATE TABLE IF NOT EXISTS country_player_counts (
+    snapshot_date TEXT NOT NULL,
+    country_code TEXT NOT NULL,
+    iso3 TEXT,
+    country_name TEXT,
+    player_count INTEGER NOT NULL,
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (snapshot_date, country_code)
+);
+
+CREATE TABLE IF NOT EXISTS country_player_members (
+    snapshot_date TEXT NOT NULL,
+    country_code TEXT NOT NULL,
+    username TEXT NOT NULL,
+    PRIMARY KEY (snapshot_date, country_code, username)
+);
+
 CREATE TABLE IF NOT EXISTS analytics_cache (
     cache_key TEXT PRIMARY KEY,
     payload_json TEXT NOT NULL,
@@ -95,15 +220,41 @@ CREATE INDEX IF NOT EXISTS idx_users_next_refresh ON users(next_refresh_at);
 CREATE INDEX IF NOT EXISTS idx_users_last_online ON users(last_online);
 CREATE INDEX IF NOT EXISTS idx_active_snapshot_date ON country_active_snapshots(snapshot_date);
 CREATE INDEX IF NOT EXISTS idx_stats_total_games ON user_stats_latest(total_games);
-CREATE INDEX IF NOT EXISTS idx_stats_rapid_board ON user_stats_latest(rapid_rating DESC, total_rapid DESC);
-CREATE INDEX IF NOT EXISTS idx_stats_blitz_board ON user_stats_latest(blitz_rating DESC, total_blitz DESC);
-CREATE INDEX IF NOT EXISTS idx_stats_bullet_board ON user_stats_latest(bullet_rating DESC, total_bullet DESC);
-CREATE INDEX IF NOT EXISTS idx_stats_daily_board ON user_stats_latest(daily_rating DESC, total_daily DESC);
-CREATE INDEX IF NOT EXISTS idx_stats_puzzle_board ON user_stats_latest(highest_puzzle_rating DESC, total_games DESC);
+CREATE INDEX IF NOT EXISTS idx_active_stats_total_games ON active_player_stats(total_games);
+CREATE INDEX IF NOT EXISTS idx_work_items_state ON pipeline_work_items(run_id, phase, state, position);
 """
 
 
 POSTGRES_SCHEMA_SQL = """
+-- Generated columns need an IMMUTABLE expression, and text::timestamptz is only
+-- STABLE (it reads the session TimeZone and DateStyle). This parses the fixed
+-- ISO layout the app writes, YYYY-MM-DDTHH:MM:SS[.ffffff][+HH:MM], with
+-- substr, make_timestamp, interval arithmetic on timestamp and AT TIME ZONE
+-- 'UTC', which are all immutable. A missing offset (or Z) means UTC, and text
+-- in any other layout gives NULL rather than aborting the column rewrite.
+CREATE OR REPLACE FUNCTION chesske_iso_ts(value TEXT) RETURNS TIMESTAMPTZ
+LANGUAGE sql IMMUTABLE AS $$
+SELECT CASE
+    WHEN value ~ '^[0-9]{4}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])[T ]([01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9]' THEN
+        (
+            make_timestamp(
+                left(value, 4)::int,
+                substr(value, 6, 2)::int,
+                substr(value, 9, 2)::int,
+                substr(value, 12, 2)::int,
+                substr(value, 15, 2)::int,
+                substring(value from '^.{17}([0-9]{2}([.][0-9]+)?)')::float8
+            )
+            - CASE
+                WHEN value ~ '[+-][0-9]{2}:[0-9]{2}$' THEN
+                    make_interval(hours => substr(right(value, 6), 2, 2)::int, mins => right(value, 2)::int)
+                    * CASE WHEN substr(right(value, 6), 1, 1) = '-' THEN -1 ELSE 1 END
+                ELSE make_interval()
+            END
+        ) AT TIME ZONE 'UTC'
+END
+$$;
+
 CREATE TABLE IF NOT EXISTS pipeline_runs (
     id BIGSERIAL PRIMARY KEY,
     started_at TEXT NOT NULL,
@@ -113,7 +264,11 @@ CREATE TABLE IF NOT EXISTS pipeline_runs (
     updated_count INTEGER NOT NULL DEFAULT 0,
     deleted_count INTEGER NOT NULL DEFAULT 0,
     refresh_count INTEGER NOT NULL DEFAULT 0,
+    sweep_count INTEGER NOT NULL DEFAULT 0,
     error_count INTEGER NOT NULL DEFAULT 0,
+    unchanged_count INTEGER NOT NULL DEFAULT 0,
+    stats_skipped_count INTEGER NOT NULL DEFAULT 0,
+    stop_reason TEXT,
     notes TEXT
 );
 
@@ -126,6 +281,50 @@ CREATE TABLE IF NOT EXISTS run_errors (
     created_at TEXT NOT NULL
 );
 
+CREATE TABLE IF NOT EXISTS pipeline_work_items (
+    run_id BIGINT NOT NULL REFERENCES pipeline_runs(id) ON DELETE CASCADE,
+    phase TEXT NOT NULL,
+    username TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    lease_owner TEXT,
+    lease_expires_at TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, phase, username)
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_locks (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    run_id BIGINT,
+    acquired_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_run_metrics (
+    run_id BIGINT NOT NULL,
+    phase TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    label TEXT NOT NULL DEFAULT '',
+    value DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, phase, metric, label),
+    FOREIGN KEY (run_id) REFERENCES pipeline_runs(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_sweeps (
+    name TEXT PRIMARY KEY,
+    pass_number INTEGER NOT NULL DEFAULT 1,
+    pass_started_at TEXT,
+    cursor_username TEXT,
+    budget_date TEXT,
+    budget_used INTEGER NOT NULL DEFAULT 0,
+    last_run_id BIGINT,
+    last_completed_at TEXT,
+    updated_at TEXT NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS users (
     username TEXT PRIMARY KEY,
     joined_at TEXT,
@@ -134,6 +333,9 @@ CREATE TABLE IF NOT EXISTS users (
     first_seen_at TEXT NOT NULL,
     last_seen_active_at TEXT,
     next_refresh_at TEXT,
+    refresh_interval_days DOUBLE PRECISION,
+    change_rate DOUBLE PRECISION,
+    last_fetched_at TEXT,
     updated_at TEXT NOT NULL
 );
 
@@ -162,9 +364,62 @@ CREATE TABLE IF NOT EXISTS user_stats_latest (
     blitz_wins INTEGER NOT NULL DEFAULT 0,
     blitz_losses INTEGER NOT NULL DEFAULT 0,
     blitz_draws INTEGER NOT NULL DEFAULT 0,
+    record_hash TEXT,
     updated_at TEXT NOT NULL
 );
 
+-- Active players with stats, one narrow row each: the users/user_stats_latest
+-- join the analytics and leaderboards read, kept in step by the upsert path and
+-- mark_user_deleted.
+CREATE TABLE IF NOT EXISTS active_player_stats (
+    username TEXT PRIMARY KEY,
+    joined_at TEXT,
+    last_online TEXT,
+    join_month TEXT,
+    last_online_day TEXT,
+    total_games INTEGER NOT NULL DEFAULT 0,
+    total_daily INTEGER NOT NULL DEFAULT 0,
+    total_rapid INTEGER NOT NULL DEFAULT 0,
+    total_bullet INTEGER NOT NULL DEFAULT 0,
+    total_blitz INTEGER NOT NULL DEFAULT 0,
+    daily_rating INTEGER NOT NULL DEFAULT 0,
+    rapid_rating INTEGER NOT NULL DEFAULT 0,
+    bullet_rating INTEGER NOT NULL DEFAULT 0,
+    blitz_rating INTEGER NOT NULL DEFAULT 0,
+    highest_puzzle_rating INTEGER,
+    highest_puzzle_date TEXT,
+    daily_wins INTEGER NOT NULL DEFAULT 0,
+    daily_losses INTEGER NOT NULL DEFAULT 0,
+    daily_draws INTEGER NOT NULL DEFAULT 0,
+    rapid_wins INTEGER NOT NULL DEFAULT 0,
+    rapid_losses INTEGER NOT NULL DEFAULT 0,
+    rapid_draws INTEGER NOT NULL DEFAULT 0,
+    bullet_wins INTEGER NOT NULL DEFAULT 0,
+    bullet_losses INTEGER NOT NULL DEFAULT 0,
+    bullet_draws INTEGER NOT NULL DEFAULT 0,
+    blitz_wins INTEGER NOT NULL DEFAULT 0,
+    blitz_losses INTEGER NOT NULL DEFAULT 0,
+    blitz_draws INTEGER NOT NULL DEFAULT 0
+);
+
+-- Range-partitioned by observed_at (epoch seconds, one partition per year, created by
+-- ensure_history_partitions). INCLUDE makes the primary key cover the series
+-- columns, so /players/{username}/history is an index-only range scan.
+CREATE TABLE IF NOT EXISTS user_stats_history (
+    username TEXT NOT NULL,
+    observed_at BIGINT NOT NULL,
+    total_games INTEGER NOT NULL DEFAULT 0,
+    rapid_rating INTEGER NOT NULL DEFAULT 0,
+    blitz_rating INTEGER NOT NULL DEFAULT 0,
+    bullet_rating INTEGER NOT NULL DEFAULT 0,
+    daily_rating INTEGER NOT NULL DEFAULT 0,
+    highest_puzzle_rating INTEGER,
+    PRIMARY KEY (username, observed_at)
+        INCLUDE (total_games, rapid_rating, blitz_rating, bullet_rating, daily_rating, highest_puzzle_rating)
+) PARTITION BY RANGE (observed_at);
+
+CREATE TABLE IF NOT EXISTS user_stats_history_default PARTITION OF user_stats_history DEFAULT;
+
 CREATE TABLE IF NOT EXISTS country_active_snapshots (
     snapshot_date TEXT NOT NULL,
     username TEXT NOT NULL,
@@ -172,6 +427,23 @@ CREATE TABLE IF NOT EXISTS country_active_snapshots (
     PRIMARY KEY (snapshot_date, username)
 );
 
+CREATE TABLE IF NOT EXISTS country_player_counts (
+    snapshot_date TEXT NOT NULL,
+    country_code TEXT NOT NULL,
+    iso3 TEXT,
+    country_name TEXT,
+    player_count INTEGER NOT NULL,
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (snapshot_date, country_code)
+);
+
+CREATE TABLE IF NOT EXISTS country_player_members (
+    snapshot_date TEXT NOT NULL,
+    country_code TEXT NOT NULL,
+    username TEXT NOT NULL,
+    PRIMARY KEY (snapshot_date, country_code, username)
+);
+
 CREATE TABLE IF NOT EXISTS analytics_cache (
     cache_key TEXT PRIMARY KEY,
     payload_json TEXT NOT NULL,
@@ -184,11 +456,166 @@ CREATE INDEX IF NOT EXISTS idx_users_next_refresh ON users(next_refresh_at);
 CREATE INDEX IF NOT EXISTS idx_users_last_online ON users(last_online);
 CREATE INDEX IF NOT EXISTS idx_active_snapshot_date ON country_active_snapshots(snapshot_date);
 CREATE INDEX IF NOT EXISTS idx_stats_total_games ON user_stats_latest(total_games);
-CREATE INDEX IF NOT EXISTS idx_stats_rapid_board ON user_stats_latest(rapid_rating DESC, total_rapid DESC);
-CREATE INDEX IF NOT EXISTS idx_stats_blitz_board ON user_stats_latest(blitz_rating DESC, total_blitz DESC);
-CREATE INDEX IF NOT EXISTS idx_stats_bullet_board ON user_stats_latest(bullet_rating DESC, total_bullet DESC);
-CREATE INDEX IF NOT EXISTS idx_stats_daily_board ON user_stats_latest(daily_rating DESC, total_daily DESC);
-CREATE INDEX IF NOT EXISTS idx_stats_puzzle_board ON user_stats_latest(highest_puzzle_rating DESC, total_games DESC);
+CREATE INDEX IF NOT EXISTS idx_active_stats_total_games ON active_player_stats(total_games);
+CREATE INDEX IF NOT EXISTS idx_work_items_state ON pipeline_work_items(run_id, phase, state, position);
+"""
+
+
+# Columns added after the first production deploy. CREATE TABLE IF NOT EXISTS
+# does not touch existing tables, so init_db adds any that are missing.
+COLUMN_MIGRATIONS = [
+    ("pipeline_runs", "unchanged_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("pipeline_runs", "stats_skipped_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("pipeline_runs", "stop_reason", "TEXT"),
+    ("pipeline_runs", "sweep_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("user_stats_latest", "record_hash", "TEXT"),
+    ("users", "refresh_interval_days", "DOUBLE PRECISION"),
+    ("users", "change_rate", "DOUBLE PRECISION"),
+    ("users", "last_fetched_at", "TEXT"),
+    ("pipeline_work_items", "lease_owner", "TEXT"),
+    ("pipeline_work_items", "lease_expires_at", "TEXT"),
+]
+
+# Typed timestamps and day/month keys derived from the ISO TEXT columns, as
+# (table, column, sqlite ddl, postgres ddl). SQLite can only ADD COLUMN a
+# VIRTUAL generated column, so they are VIRTUAL there (the indexes below still
+# hold the computed keys) and STORED on Postgres.
+GENERATED_COLUMNS = [
+    (
+        "users",
+        "joined_ts",
+        "INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', joined_at) AS INTEGER)) VIRTUAL",
+        "TIMESTAMPTZ GENERATED ALWAYS AS (chesske_iso_ts(joined_at)) STORED",
+    ),
+    (
+        "users",
+        "last_online_ts",
+        "INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', last_online) AS INTEGER)) VIRTUAL",
+        "TIMESTAMPTZ GENERATED ALWAYS AS (chesske_iso_ts(last_online)) STORED",
+    ),
+    (
+        "users",
+        "first_seen_ts",
+        "INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', first_seen_at) AS INTEGER)) VIRTUAL",
+        "TIMESTAMPTZ GENERATED ALWAYS AS (chesske_iso_ts(first_seen_at)) STORED",
+    ),
+    (
+        "users",
+        "join_month",
+        "TEXT GENERATED ALWAYS AS (SUBSTR(joined_at, 1, 7)) VIRTUAL",
+        "TEXT GENERATED ALWAYS AS (SUBSTR(joined_at, 1, 7)) STORED",
+    ),
+    (
+        "users",
+        "join_day",
+        "TEXT GENERATED ALWAYS AS (SUBSTR(joined_at, 1, 10)) VIRTUAL",
+        "TEXT GENERATED ALWAYS AS (SUBSTR(joined_at, 1, 10)) STORED",
+    ),
+    (
+        "users",
+        "last_online_day",
+        "TEXT GENERATED ALWAYS AS (SUBSTR(last_online, 1, 10)) VIRTUAL",
+        "TEXT GENERATED ALWAYS AS (SUBSTR(last_online, 1, 10)) STORED",
+    ),
+    (
+        "users",
+        "first_seen_day",
+        "TEXT GENERATED ALWAYS AS (SUBSTR(first_seen_at, 1, 10)) VIRTUAL",
+        "TEXT GENERATED ALWAYS AS (SUBSTR(first_seen_at, 1, 10)) STORED",
+    ),
+]
+
+# Created after the generated columns exist. The trend endpoints filter on
+# status and group by one key, so each is a range scan of one index.
+TIME_KEY_INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS idx_users_join_month ON users(status, join_month);
+CREATE INDEX IF NOT EXISTS idx_users_join_day ON users(status, join_day);
+CREATE INDEX IF NOT EXISTS idx_users_last_online_day ON users(status, last_online_day);
+CREATE INDEX IF NOT EXISTS idx_users_first_seen_day ON users(status, first_seen_day);
+"""
+
+
+# One partial index per leaderboard over rated players (active_player_stats
+# only holds active ones). Keys are the board's ORDER BY column, its min_games
+# column, then every other column the leaderboard query returns, so the query
+# is an index-only walk in score order that stops at LIMIT. Plain key columns
+# rather than INCLUDE keep the DDL identical on SQLite and Postgres.
+# scripts/check_leaderboard_plans.py verifies the planner uses them.
+LEADERBOARD_INDEXES_SQL = """
+DROP INDEX IF EXISTS idx_stats_rapid_board;
+DROP INDEX IF EXISTS idx_stats_blitz_board;
+DROP INDEX IF EXISTS idx_stats_bullet_board;
+DROP INDEX IF EXISTS idx_stats_daily_board;
+DROP INDEX IF EXISTS idx_stats_puzzle_board;
+DROP INDEX IF EXISTS idx_active_stats_rapid_board;
+DROP INDEX IF EXISTS idx_active_stats_blitz_board;
+DROP INDEX IF EXISTS idx_active_stats_bullet_board;
+DROP INDEX IF EXISTS idx_active_stats_daily_board;
+DROP INDEX IF EXISTS idx_active_stats_puzzle_board;
+CREATE INDEX IF NOT EXISTS idx_board_rapid ON active_player_stats(
+    rapid_rating DESC, total_rapid, username,
+    blitz_rating, bullet_rating, daily_rating, highest_puzzle_rating, total_games
+) WHERE rapid_rating > 0;
+CREATE INDEX IF NOT EXISTS idx_board_blitz ON active_player_stats(
+    blitz_rating DESC, total_blitz, username,
+    rapid_rating, bullet_rating, daily_rating, highest_puzzle_rating, total_games
+) WHERE blitz_rating > 0;
+CREATE INDEX IF NOT EXISTS idx_board_bullet ON active_player_stats(
+    bullet_rating DESC, total_bullet, username,
+    rapid_rating, blitz_rating, daily_rating, highest_puzzle_rating, total_games
+) WHERE bullet_rating > 0;
+CREATE INDEX IF NOT EXISTS idx_board_daily ON active_player_stats(
+    daily_rating DESC, total_daily, username,
+    rapid_rating, blitz_rating, bullet_rating, highest_puzzle_rating, total_games
+) WHERE daily_rating > 0;
+CREATE INDEX IF NOT EXISTS idx_board_puzzle ON active_player_stats(
+    highest_puzzle_rating DESC, total_games, username,
+    rapid_rating, blitz_rating, bullet_rating, daily_rating
+) WHERE highest_puzzle_rating > 0;
+CREATE INDEX IF NOT EXISTS idx_board_games ON active_player_stats(
+    total_games DESC, username,
+    rapid_rating, blitz_rating, bullet_rating, daily_rating, highest_puzzle_rating
+) WHERE total_games > 0;
+"""
+
+# active_player_stats columns after username. Apart from the users keys they
+# share their names with user_stats_latest, so one list serves both sides of
+# the INSERT ... SELECT.
+ACTIVE_PLAYER_STATS_COLUMNS = (
+    "joined_at",
+    "last_online",
+    "join_month",
+    "last_online_day",
+    "total_games",
+    "total_daily",
+    "total_rapid",
+    "total_bullet",
+    "total_blitz",
+    "daily_rating",
+    "rapid_rating",
+    "bullet_rating",
+    "blitz_rating",
+    "highest_puzzle_rating",
+    "highest_puzzle_date",
+    "daily_wins",
+    "daily_losses",
+    "daily_draws",
+    "rapid_wins",
+    "rapid_losses",
+    "rapid_draws",
+    "bullet_wins",
+    "bullet_losses",
+    "bullet_draws",
+    "blitz_wins",
+    "blitz_losses",
+    "blitz_draws",
+)
+
+ACTIVE_PLAYER_STATS_SELECT_SQL = f"""
+SELECT u.username, {", ".join(ACTIVE_PLAYER_STATS_COLUMNS)}
+FROM users u
+JOIN user_stats_latest s ON s.username = u.username
+WHERE u.status = 'active'
 """
 
 
@@ -216,6 +643,14 @@ class DBConn:
                 return cur.executemany(_to_postgres_placeholders(sql), params_seq)
         return self._raw.executemany(sql, params_seq)
 
+    def copy_rows(self, copy_sql: str, rows: Iterable[Sequence[Any]]) -> None:
+        if self.backend != "postgres":
+            raise RuntimeError("COPY is only available on the Postgres backend")
+        with self._raw.cursor() as cur:
+            with cur.copy(copy_sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+
     def executescript(self, sql: str) -> None:
         if self.backend == "postgres":
             statements = [stmt.strip() for stmt in sql.split(";") if stmt.strip()]
@@ -234,30 +669,269 @@ class DBConn:
         self._raw.close()
 
 
+def _table_columns(db: DBConn, table: str) -> Set[str]:
+    if db.backend == "postgres":
+        rows = db.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = ?",
+            (table,),
+        ).fetchall()
+        return {str(row["column_name"]) for row in rows}
+    # table_xinfo also lists generated columns, which table_info hides.
+    rows = db.execute(f"PRAGMA table_xinfo({table})").fetchall()
+    return {str(row[1]) for row in rows}
+
+
+def _apply_column_migrations(db: DBConn) -> None:
+    for table, column, ddl in COLUMN_MIGRATIONS:
+        if column not in _table_columns(db, table):
+            db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    for table, column, sqlite_ddl, postgres_ddl in GENERATED_COLUMNS:
+        if column not in _table_columns(db, table):
+            ddl = postgres_ddl if db.backend == "postgres" else sqlite_ddl
+            db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    db.executescript(TIME_KEY_INDEXES_SQL)
+
+
+def ensure_history_partitions(db: DBConn, years_ahead: int = 1) -> None:
+    # Yearly partitions from last year to years_ahead; anything outside lands
+    # in user_stats_history_default.
+    this_year = datetime.now(timezone.utc).year
+    for year in range(this_year - 1, this_year + years_ahead + 1):
+        start = int(datetime(year, 1, 1, tzinfo=timezone.utc).timestamp())
+        end = int(datetime(year + 1, 1, 1, tzinfo=timezone.utc).timestamp())
+        db.execute(
+            f"CREATE TABLE IF NOT EXISTS user_stats_history_y{year} PARTITION OF user_stats_history "
+            f"FOR VALUES FROM ({start}) TO ({end})"
+        )
+
+
+def _connect_sqlite(settings: Settings, read_only: bool = False) -> sqlite3.Connection:
+    # Every SQLite connection gets the same profile. WAL lets readers keep
+    # their snapshot while the pipeline commits, and mmap serves table scans
+    # straight from the page cache. journal_mode is stored in the file, so
+    # only writers set it; read-only connections cannot change it.
+    path = Path(settings.resolved_db_path).resolve()
+    if read_only:
+        conn = sqlite3.connect(f"{path.as_uri()}?mode=ro", uri=True)
+    else:
+        conn = sqlite3.connect(str(path))
+        conn.execute("PRAGMA journal_mode = WAL")
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {max(0, int(settings.sqlite_busy_timeout_ms))}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA mmap_size = {max(0, int(settings.sqlite_mmap_mb)) * 1024 * 1024}")
+    # A negative cache_size is in KiB rather than pages.
+    conn.execute(f"PRAGMA cache_size = -{max(0, int(settings.sqlite_cache_mb)) * 1024}")
+    return conn
+
+
+def rebuild_active_player_stats(db: DBConn) -> None:
+    # Repopulates the table from users/user_stats_latest. Needed once when the
+    # table is created and after loads that write the base tables directly.
+    db.execute("DELETE FROM active_player_stats")
+    db.execute(
+        f"INSERT INTO active_player_stats (username, {', '.join(ACTIVE_PLAYER_STATS_COLUMNS)}) "
+        f"{ACTIVE_PLAYER_STATS_SELECT_SQL}"
+    )
+
+
 def init_db(settings: Settings) -> None:
     if settings.database_url:
         with psycopg.connect(settings.database_url, autocommit=False, row_factory=dict_row) as conn:
             db = DBConn(conn, "postgres")
+            backfill = not _table_columns(db, "active_player_stats")
             db.executescript(POSTGRES_SCHEMA_SQL)
+            _apply_column_migrations(db)
+            ensure_history_partitions(db)
+            db.executescript(LEADERBOARD_INDEXES_SQL)
+            if backfill:
+                rebuild_active_player_stats(db)
             db.commit()
         return
 
     db_path = settings.resolved_db_path
     Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-    with sqlite3.connect(db_path) as conn:
+    with _connect_sqlite(settings) as conn:
         db = DBConn(conn, "sqlite")
+        backfill = not _table_columns(db, "active_player_stats")
         db.executescript(SQLITE_SCHEMA_SQL)
+        _apply_column_migrations(db)
+        db.executescript(LEADERBOARD_INDEXES_SQL)
+        if backfill:
+            rebuild_active_player_stats(db)
         db.commit()
 
 
+# Upper bounds (seconds) of the connection checkout wait histogram.
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolMetrics:
+    # Process-wide counters for get_conn checkouts: how long callers waited
+    # for a connection and whether it was reused or newly opened.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.checkouts = 0
+        self.opened = 0
+        self.discarded = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.wait_buckets: Dict[str, int] = {}
+
+    def record_checkout(self, wait_seconds: float, opened: bool = False) -> None:
+        label = next((f"le_{bound:g}" for bound in POOL_WAIT_BUCKETS if wait_seconds <= bound), "le_inf")
+        with self._lock:
+            self.checkouts += 1
+            self.opened += int(opened)
+            self.wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            self.wait_buckets[label] = self.wait_buckets.get(label, 0) + 1
+
+    def record_discard(self) -> None:
+        with self._lock:
+            self.discarded += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "opened": self.opened,
+                "discarded": self.discarded,
+                "wait_seconds_total": round(self.wait_seconds, 6),
+                "wait_ms_mean": round(1000 * self.wait_seconds / self.checkouts, 3) if self.checkouts else None,
+                "wait_ms_max": round(1000 * self.max_wait_seconds, 3),
+                "wait_histogram": dict(self.wait_buckets),
+            }
+
+
+POOL_METRICS = PoolMetrics()
+_pg_pools: Dict[str, Any] = {}
+_pg_pools_lock = threading.Lock()
+# Per-thread SQLite read connections: path -> (DBConn, inode at open).
+_sqlite_local = threading.local()
+
+
+def _psycopg_pool() -> Optional[Any]:
+    try:
+        import psycopg_pool
+
+        return psycopg_pool
+    except ImportError:
+        return None
+
+
+def _get_pg_pool(settings: Settings) -> Optional[Any]:
+    with _pg_pools_lock:
+        pool = _pg_pools.get(settings.database_url)
+        if pool is not None:
+            return pool
+        pool_module = _psycopg_pool()
+        if pool_module is None:
+            logger.warning("Postgres connection pooling disabled: the psycopg_pool package is not installed")
+            return None
+        pool = pool_module.ConnectionPool(
+            settings.database_url,
+            min_size=max(0, settings.db_pool_min_size),
+            max_size=max(1, settings.db_pool_min_size, settings.db_pool_max_size),
+            kwargs={"autocommit": False, "row_factory": dict_row},
+            # Checked on checkout, so a connection dropped by a Postgres
+            # restart or idle timeout is replaced instead of handed out.
+            check=pool_module.ConnectionPool.check_connection,
+            timeout=settings.db_pool_timeout_seconds,
+            max_idle=settings.db_pool_max_idle_seconds,
+            name="chesske",
+            open=True,
+        )
+        _pg_pools[settings.database_url] = pool
+        return pool
+
+
+def close_pools() -> None:
+    with _pg_pools_lock:
+        for pool in _pg_pools.values():
+            pool.close()
+        _pg_pools.clear()
+
+
+atexit.register(close_pools)
+
+
+def _file_inode(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+
+def _sqlite_read_conn(settings: Settings) -> Tuple[DBConn, bool]:
+    # A cached connection is dropped when the database file was replaced
+    # (e.g. restored from a backup) since it still reads the old inode.
+    path = str(settings.resolved_db_path)
+    cached: Dict[str, Tuple[DBConn, Optional[int]]] = getattr(_sqlite_local, "conns", None) or {}
+    _sqlite_local.conns = cached
+    inode = _file_inode(path)
+    entry = cached.get(path)
+    if entry is not None:
+        if entry[1] == inode and inode is not None:
+            return entry[0], False
+        entry[0].close()
+        POOL_METRICS.record_discard()
+    db = DBConn(_connect_sqlite(settings, read_only=True), "sqlite")
+    cached[path] = (db, _file_inode(path))
+    return db, True
+
+
+def get_pool_stats(settings: Settings) -> Dict[str, Any]:
+    stats: Dict[str, Any] = {"backend": "postgres" if settings.database_url else "sqlite", **POOL_METRICS.snapshot()}
+    with _pg_pools_lock:
+        pool = _pg_pools.get(settings.database_url) if settings.database_url else None
+    if pool is not None:
+        stats["pool"] = {"min_size": pool.min_size, "max_size": pool.max_size, **pool.get_stats()}
+    return stats
+
+
 @contextmanager
-def get_conn(settings: Settings) -> Iterator[DBConn]:
+def get_conn(settings: Settings, read_only: bool = False) -> Iterator[DBConn]:
+    # Postgres connections come from a process-wide pool. On SQLite,
+    # read_only callers (API reads) reuse a mode=ro connection kept per thread;
+    # writers still open their own.
+    started = time.monotonic()
     if settings.database_url:
+        pool = _get_pg_pool(settings)
+        if pool is not None:
+            # getconn/putconn rather than pool.connection(), which commits
+            # whatever the caller left open on a clean exit. Uncommitted work is
+            # rolled back, as it is when a direct connection is closed.
+            conn = pool.getconn()
+            POOL_METRICS.record_checkout(time.monotonic() - started)
+            try:
+                yield DBConn(conn, "postgres")
+            finally:
+                try:
+                    conn.rollback()
+                finally:
+                    pool.putconn(conn)
+            return
         conn = psycopg.connect(settings.database_url, autocommit=False, row_factory=dict_row)
+        POOL_METRICS.record_checkout(time.monotonic() - started, opened=True)
         db = DBConn(conn, "postgres")
+    elif read_only:
+        db, opened = _sqlite_read_conn(settings)
+        POOL_METRICS.record_checkout(time.monotonic() - started, opened=opened)
+        try:
+            yield db
+        finally:
+            # End any read transaction so the connection holds no snapshot
+            # between requests.
+            db.rollback()
+        return
     else:
-        conn = sqlite3.connect(settings.resolved_db_path)
-        conn.row_factory = sqlite3.Row
+        # Pipeline workers share the file and wait out a busy writer via busy_timeout.
+        conn = _connect_sqlite(settings)
+        POOL_METRICS.record_checkout(time.monotonic() - started, opened=True)
         db = DBConn(conn, "sqlite")
 
     try:
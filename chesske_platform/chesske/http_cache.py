@@ -0,0 +1,137 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from .config import Settings
+
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS http_responses (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_http_responses_accessed ON http_responses(accessed_at);
+"""
+
+# Other processes write to the same file, so the in-memory size estimate is
+# re-synced from disk every so often instead of trusted forever.
+SIZE_RESYNC_EVERY_WRITES = 500
+EVICT_TO_RATIO = 0.9
+
+
+class CachedResponse(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    body: bytes
+
+    def json(self) -> Dict:
+        return json.loads(self.body)
+
+
+class ResponseCache:
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(HTTP_CACHE_SCHEMA_SQL)
+        self._lock = threading.Lock()
+        self._writes_since_sync = 0
+        self._total_bytes = self._disk_size()
+
+    def _disk_size(self) -> int:
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_responses").fetchone()
+        return int(row[0] or 0)
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body FROM http_responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(row[0], row[1], bytes(row[2]))
+
+    def touch(self, url: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE http_responses SET accessed_at = ? WHERE url = ?",
+                (time.time(), url),
+            )
+
+    def store(self, url: str, etag: Optional[str], last_modified: Optional[str], body: bytes) -> None:
+        if not etag and not last_modified:
+            return
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM http_responses WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                """
+                INSERT INTO http_responses (url, etag, last_modified, body, size, fetched_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    body = excluded.body,
+                    size = excluded.size,
+                    fetched_at = excluded.fetched_at,
+                    accessed_at = excluded.accessed_at
+                """,
+                (url, etag, last_modified, body, len(body), now, now),
+            )
+            self._total_bytes += len(body) - (int(previous[0]) if previous else 0)
+            self._writes_since_sync += 1
+            if self._writes_since_sync >= SIZE_RESYNC_EVERY_WRITES:
+                self._total_bytes = self._disk_size()
+                self._writes_since_sync = 0
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        target = int(self.max_bytes * EVICT_TO_RATIO)
+        rows = self._conn.execute("SELECT url, size FROM http_responses ORDER BY accessed_at").fetchall()
+        victims = []
+        total = self._disk_size()
+        for url, size in rows:
+            if total <= target:
+                break
+            victims.append((url,))
+            total -= int(size)
+        self._conn.executemany("DELETE FROM http_responses WHERE url = ?", victims)
+        self._total_bytes = total
+        logger.info("HTTP cache evicted %s responses (now %s bytes)", len(victims), total)
+
+
+_shared_caches: Dict[str, ResponseCache] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_response_cache(settings: Settings) -> Optional[ResponseCache]:
+    if not settings.http_cache_enabled:
+        return None
+    path = settings.resolved_http_cache_path
+    with _shared_lock:
+        cache = _shared_caches.get(str(path))
+        if cache is None:
+            try:
+                cache = ResponseCache(path, max_bytes=settings.http_cache_max_mb * 1024 * 1024)
+            except sqlite3.Error as exc:
+                logger.warning("HTTP response cache unavailable at %s: %s", path, exc)
+                return None
+            _shared_caches[str(path)] = cache
+        return cache
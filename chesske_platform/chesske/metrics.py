@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+# Upper bounds (seconds) of the request latency histogram; anything slower lands in "inf".
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TIME_CATEGORIES = ("sleep", "network", "db")
+
+MetricRow = Tuple[str, str, str, float]
+
+
+def _bucket_label(seconds: float) -> str:
+    for bound in LATENCY_BUCKETS:
+        if seconds <= bound:
+            return f"le_{bound:g}"
+    return "le_inf"
+
+
+class RunMetrics:
+    # Accumulates additive counters per phase from the fetch threads and the
+    # writer; drain() hands over what was gathered since the previous call so
+    # it can be added to pipeline_run_metrics with a batch.
+    def __init__(self, phase: str = "setup"):
+        self.phase = phase
+        self._values: Dict[Tuple[str, str, str], float] = defaultdict(float)
+        self._lock = threading.Lock()
+        # Running total that drain() leaves alone, for per-run request budgets.
+        self.requests_made = 0
+
+    def set_phase(self, phase: str) -> None:
+        self.phase = phase
+
+    def add(self, metric: str, label: str = "", value: float = 1.0) -> None:
+        with self._lock:
+            self._values[(self.phase, metric, label)] += value
+
+    def record_request(self, kind: str, seconds: float, status: str) -> None:
+        with self._lock:
+            self.requests_made += 1
+            values = self._values
+            values[(self.phase, "requests", kind)] += 1
+            values[(self.phase, "request_seconds", kind)] += seconds
+            values[(self.phase, "latency", f"{kind}:{_bucket_label(seconds)}")] += 1
+            values[(self.phase, "status", f"{kind}:{status}")] += 1
+            values[(self.phase, "time_seconds", "network")] += seconds
+
+    def record_retry(self, kind: str) -> None:
+        self.add("retries", kind)
+
+    def record_sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.add("time_seconds", "sleep", seconds)
+
+    @contextmanager
+    def timer(self, category: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add("time_seconds", category, time.monotonic() - started)
+
+    def drain(self) -> List[MetricRow]:
+        with self._lock:
+            rows = [(phase, metric, label, value) for (phase, metric, label), value in self._values.items()]
+            self._values.clear()
+        return rows
+
+
+def summarize_run_metrics(rows: Iterable[Dict]) -> Dict[str, Dict]:
+    phases: Dict[str, Dict] = {}
+    for row in rows:
+        phase = phases.setdefault(
+            str(row["phase"]),
+            {
+                "users": 0,
+                "wall_seconds": 0.0,
+                "users_per_second": None,
+                "time_seconds": {category: 0.0 for category in TIME_CATEGORIES},
+                "requests": {},
+                "errors": {},
+            },
+        )
+        metric, label, value = str(row["metric"]), str(row["label"]), float(row["value"] or 0)
+        if metric == "users":
+            phase["users"] = int(value)
+        elif metric == "wall_seconds":
+            phase["wall_seconds"] = round(value, 3)
+        elif metric == "time_seconds":
+            phase["time_seconds"][label] = round(value, 3)
+        elif metric == "errors":
+            phase["errors"][label] = int(value)
+        else:
+            kind, _, detail = label.partition(":")
+            request = phase["requests"].setdefault(
+                kind,
+                {"count": 0, "total_seconds": 0.0, "mean_seconds": None, "retries": 0, "status_codes": {}, "latency": {}},
+            )
+            if metric == "requests":
+                request["count"] = int(value)
+            elif metric == "request_seconds":
+                request["total_seconds"] = round(value, 3)
+            elif metric == "retries":
+                request["retries"] = int(value)
+            elif metric == "status":
+                request["status_codes"][detail] = int(value)
+            elif metric == "latency":
+                request["latency"][detail] = int(value)
+
+    for phase in phases.values():
+        if phase["wall_seconds"] > 0:
+            phase["users_per_second"] = round(phase["users"] / phase["wall_seconds"], 3)
+        for request in phase["requests"].values():
+            if request["count"]:
+                request["mean_seconds"] = round(request["total_seconds"] / request["count"], 4)
+            request["latency"] = _ordered_histogram(request["latency"])
+    return phases
+
+
+def _ordered_histogram(counts: Dict[str, int]) -> Dict[str, int]:
+    labels = [f"le_{bound:g}" for bound in LATENCY_BUCKETS] + ["le_inf"]
+    return {label: counts.get(label, 0) for label in labels}
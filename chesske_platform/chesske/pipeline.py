@@ -1,25 +1,93 @@
+import asyncio
 import logging
+import os
+import queue
+import socket
+import threading
 import time
-from datetime import datetime, timezone
+import uuid
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Tuple
 
 from .analytics import refresh_cached_analytics
-from .client import ChessComClient
+from .archive import RawArchive, open_raw_archive
+from .client import OK_STATUSES, AsyncChessComClient, ChessComClient
 from .config import Settings
-from .db import get_conn, init_db
+from .db import get_conn, init_db, utc_now_iso
+from .metrics import RunMetrics
 from .repository import (
+    acquire_lock,
+    add_run_metrics,
+    claim_work_items,
+    clear_done_work_items,
+    complete_work_items,
+    count_pending_work_items,
+    enqueue_work_items,
+    fail_work_items,
+    find_resumable_run,
     finish_run,
+    get_known_last_online,
+    get_lock_holder,
+    get_new_active_usernames,
     get_refresh_candidates,
+    get_run_counts,
+    get_run_started_at,
+    get_sweep_page,
+    get_sweep_progress,
+    get_sweep_state,
+    has_leased_work_items,
+    has_work_items,
+    increment_run_counts,
     log_run_error,
+    log_run_errors,
+    mark_snapshot_users_seen,
     mark_user_deleted,
+    release_lock,
+    release_work_item_leases,
+    renew_lock,
+    renew_work_item_leases,
+    reopen_run,
+    reschedule_unchanged_users,
+    save_sweep_state,
+    set_run_active_count,
     start_run,
     upsert_active_snapshot,
-    upsert_user_and_stats,
+    upsert_users_and_stats_many,
 )
 
 
 logger = logging.getLogger(__name__)
 
+PIPELINE_MODES = ("sequential", "concurrent")
+# "diff" fetches only usernames new since the previous snapshot day and leaves
+# the rest of the active list to the refresh scheduler; "full" fetches them all.
+ACTIVE_SWEEP_MODES = ("diff", "full")
+RUN_COUNT_FIELDS = (
+    "active_count",
+    "updated_count",
+    "deleted_count",
+    "refresh_count",
+    "sweep_count",
+    "error_count",
+    "unchanged_count",
+    "stats_skipped_count",
+)
+PHASES = (("active", True), ("refresh", False), ("sweep", False))
+# Run counter bumped for every user a phase processed; active users are
+# already counted in active_count.
+PHASE_COUNT_FIELDS = {"refresh": "refresh_count", "sweep": "sweep_count"}
+RUN_LOCK_NAME = "ingestion"
+SWEEP_NAME = "full"
+# Budget charged per swept user: profile plus stats. Users whose stats request
+# is skipped cost one, so a day's budget is never overspent.
+SWEEP_REQUESTS_PER_USER = 2
+QUEUE_POLL_SECONDS = 0.05
+# How often idle workers look for claimable items or the end of the run.
+WORKER_POLL_SECONDS = 2.0
+# A partial batch is committed when no result has arrived for this long.
+WRITE_FLUSH_SECONDS = 5.0
+
 
 def _to_datetime_utc(timestamp: Optional[int]) -> Optional[str]:
     if not timestamp:
@@ -85,138 +153,793 @@ def _build_user_record(profile: Dict, stats: Dict) -> Dict:
     }
 
 
+def _interpret_fetch(
+    profile_status: str,
+    profile: Optional[Dict],
+    stats_status: str,
+    stats: Optional[Dict],
+    stored: bool,
+) -> Tuple[str, Optional[Dict], Optional[str]]:
+    if profile_status == "not_found":
+        return "deleted", None, None
+    if profile_status not in OK_STATUSES or profile is None:
+        return "error", None, profile_status
+
+    if stats_status == "not_found":
+        # Some accounts have a profile but no stats endpoint; keep them with empty stats.
+        stats = {}
+    elif stats_status not in OK_STATUSES:
+        # Writing a zero-stats record here would also store the fresh last_online,
+        # and later refreshes would then skip stats and keep the zeros. Leave the
+        # stored row alone and let the work item be retried.
+        return "error", None, stats_status
+    if stored and profile_status == "not_modified" and stats_status == "not_modified":
+        # Both bodies are what was stored last time; nothing to rebuild or compare.
+        # Without a stored row (e.g. the HTTP cache outlived the database) the
+        # cached bodies are still written.
+        return "unchanged", None, None
+    return "ok", _build_user_record(profile, stats or {}), None
+
+
+def _offline_since_last_refresh(profile: Dict, known_last_online: Optional[str]) -> bool:
+    # Stats only move when the player plays, which bumps last_online.
+    last_online = _to_datetime_utc(profile.get("last_online"))
+    return known_last_online is not None and last_online == known_last_online
+
+
 def _process_username(
     client: ChessComClient,
     username: str,
+    known_last_online: Optional[str] = None,
 ) -> Tuple[str, Optional[Dict], Optional[str]]:
     profile_status, profile = client.fetch_profile(username)
     if profile_status == "not_found":
         return "deleted", None, None
-    if profile_status != "ok" or profile is None:
+    if profile_status not in OK_STATUSES or profile is None:
         return "error", None, profile_status
+    if _offline_since_last_refresh(profile, known_last_online):
+        return "stats_skipped", None, None
 
     stats_status, stats = client.fetch_stats(username)
-    if stats_status != "ok":
-        # If stats fail but profile is valid, keep partial record with zero stats.
-        stats = {}
-    built = _build_user_record(profile, stats or {})
-    return "ok", built, None
+    return _interpret_fetch(profile_status, profile, stats_status, stats, known_last_online is not None)
+
+
+async def _process_username_async(
+    client: AsyncChessComClient,
+    username: str,
+    known_last_online: Optional[str] = None,
+) -> Tuple[str, Optional[Dict], Optional[str]]:
+    if known_last_online is None:
+        # Nothing to compare against, so stats follow any usable profile.
+        (profile_status, profile), (stats_status, stats) = await client.fetch_player(username)
+        return _interpret_fetch(profile_status, profile, stats_status, stats, False)
+
+    profile_status, profile = await client.fetch_profile(username)
+    if profile_status == "not_found":
+        return "deleted", None, None
+    if profile_status not in OK_STATUSES or profile is None:
+        return "error", None, profile_status
+    if _offline_since_last_refresh(profile, known_last_online):
+        return "stats_skipped", None, None
+    stats_status, stats = await client.fetch_stats(username)
+    return _interpret_fetch(profile_status, profile, stats_status, stats, True)
+
+
+def _apply_result(
+    conn,
+    run_id: int,
+    username: str,
+    result: Tuple[str, Optional[Dict], Optional[str]],
+    phase: str,
+    seen_in_active: bool,
+    counts: Dict[str, int],
+    upserts: List[Tuple[str, Dict, bool]],
+    skipped: List[Tuple[str, bool]],
+    errors: "_RunErrorBuffer",
+) -> bool:
+    state, record, error_detail = result
+    phase_count = PHASE_COUNT_FIELDS.get(phase)
+    if state == "deleted":
+        mark_user_deleted(conn, username, commit=False)
+        counts["deleted_count"] += 1
+        if phase_count:
+            counts[phase_count] += 1
+    elif state in ("stats_skipped", "unchanged"):
+        skipped.append((username, seen_in_active))
+        if state == "stats_skipped":
+            counts["stats_skipped_count"] += 1
+        counts["unchanged_count"] += 1
+        if phase_count:
+            counts[phase_count] += 1
+    elif state == "ok" and record:
+        # A single 304 still carries the cached body, so the record goes through
+        # the fingerprint check; updated_count/unchanged_count are settled at
+        # write time, which also reschedules the user.
+        upserts.append((username, record, seen_in_active))
+        if phase_count:
+            counts[phase_count] += 1
+    else:
+        errors.add(f"{phase}_fetch", str(error_detail), username)
+        counts["error_count"] += 1
+        return False
+    return True
+
+
+def _error_class(error: str) -> str:
+    # "error:HTTP 429" -> "HTTP 429", "error:ReadTimeout: ..." -> "ReadTimeout"
+    detail = error[len("error:") :] if error.startswith("error:") else error
+    return detail.split(":", 1)[0].strip() or "unknown"
+
+
+class _RunErrorBuffer:
+    # Per-user fetch errors are collected here and written with the batch
+    # instead of one INSERT + commit each, which would also commit the
+    # half-built batch transaction.
+    def __init__(self, run_id: int):
+        self.run_id = run_id
+        self.rows: List[Tuple[int, Optional[str], str, str, str]] = []
+        self.counts: Dict[Tuple[str, str], int] = {}
+
+    def add(self, stage: str, error: str, username: Optional[str] = None) -> None:
+        self.rows.append((self.run_id, username, stage, error, utc_now_iso()))
+        key = (stage, _error_class(error))
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def flush(self, conn, metrics: RunMetrics) -> None:
+        log_run_errors(conn, self.rows, commit=False)
+        for (stage, error_class), count in self.counts.items():
+            metrics.add("errors", f"{stage}:{error_class}", count)
+        self.rows = []
+        self.counts = {}
+
+
+class _RunBudget:
+    # Wall-clock and request limits for one process, plus an optional stop
+    # event (daemon shutdown). Once spent, the producers stop taking new users;
+    # fetches already in flight still finish and are written, and the rest of
+    # the work items stay pending.
+    def __init__(self, settings: Settings, metrics: RunMetrics, stop: Optional[threading.Event] = None):
+        self.deadline = time.monotonic() + settings.max_run_seconds if settings.max_run_seconds > 0 else None
+        self.max_requests = settings.max_run_requests
+        self.metrics = metrics
+        self.stop = stop
+        self.reason: Optional[str] = None
+
+    def exhausted(self) -> bool:
+        if self.reason is None:
+            if self.stop is not None and self.stop.is_set():
+                self.reason = "stopped"
+            elif self.deadline is not None and time.monotonic() >= self.deadline:
+                self.reason = "max_duration"
+            elif self.max_requests > 0 and self.metrics.requests_made >= self.max_requests:
+                self.reason = "max_requests"
+        return self.reason is not None
+
+
+class _ProducerDone:
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+def _produce_sequential(
+    client: ChessComClient,
+    usernames: List[str],
+    known_last_online: Dict[str, str],
+    results: "queue.Queue",
+    stop: threading.Event,
+    budget: _RunBudget,
+) -> None:
+    for username in usernames:
+        if stop.is_set() or budget.exhausted():
+            return
+        result = _process_username(client, username, known_last_online.get(username))
+        _put_until_stopped(results, (username, result), stop)
+
+
+def _put_until_stopped(results: "queue.Queue", item, stop: threading.Event) -> None:
+    while not stop.is_set():
+        try:
+            results.put(item, timeout=QUEUE_POLL_SECONDS)
+            return
+        except queue.Full:
+            continue
+
+
+async def _put_with_backpressure(results: "queue.Queue", item, stop: threading.Event) -> None:
+    while not stop.is_set():
+        try:
+            results.put_nowait(item)
+            return
+        except queue.Full:
+            await asyncio.sleep(QUEUE_POLL_SECONDS)
+
+
+async def _produce_concurrent(
+    settings: Settings,
+    usernames: List[str],
+    known_last_online: Dict[str, str],
+    results: "queue.Queue",
+    stop: threading.Event,
+    budget: _RunBudget,
+    metrics: Optional[RunMetrics],
+    archive: Optional[RawArchive],
+) -> None:
+    pending = iter(usernames)
+
+    async def worker(client: AsyncChessComClient) -> None:
+        for username in pending:
+            if stop.is_set() or budget.exhausted():
+                return
+            result = await _process_username_async(client, username, known_last_online.get(username))
+            await _put_with_backpressure(results, (username, result), stop)
+
+    async with AsyncChessComClient(settings, metrics=metrics, archive=archive) as client:
+        await asyncio.gather(*(worker(client) for _ in range(max(1, settings.max_concurrency))))
+
+
+def _start_producer(
+    settings: Settings,
+    client: ChessComClient,
+    usernames: List[str],
+    known_last_online: Dict[str, str],
+    results: "queue.Queue",
+    stop: threading.Event,
+    budget: _RunBudget,
+) -> threading.Thread:
+    def run() -> None:
+        error: Optional[BaseException] = None
+        try:
+            if settings.pipeline_mode == "concurrent":
+                asyncio.run(
+                    _produce_concurrent(
+                        settings, usernames, known_last_online, results, stop, budget, client.metrics, client.archive
+                    )
+                )
+            else:
+                _produce_sequential(client, usernames, known_last_online, results, stop, budget)
+        except BaseException as exc:
+            error = exc
+        _put_until_stopped(results, _ProducerDone(error), stop)
+
+    producer = threading.Thread(target=run, daemon=True, name="chesske-fetch")
+    producer.start()
+    return producer
+
+
+class _Lease:
+    def __init__(self, owner: str, run_id: int, holds_run_lock: bool):
+        self.owner = owner
+        self.run_id = run_id
+        self.holds_run_lock = holds_run_lock
+        self.renewed_at = time.monotonic()
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _renew_lease(conn, settings: Settings, lease: _Lease, phase: str) -> None:
+    renew_work_item_leases(conn, lease.run_id, phase, lease.owner, settings.lease_seconds, commit=False)
+    if lease.holds_run_lock:
+        renew_lock(conn, RUN_LOCK_NAME, lease.owner, settings.run_lock_seconds, commit=False)
+    conn.commit()
+    lease.renewed_at = time.monotonic()
+
+
+def _lease_due(settings: Settings, lease: _Lease) -> bool:
+    return time.monotonic() - lease.renewed_at >= settings.lease_seconds / 3
+
+
+def _write_batch(
+    conn,
+    settings: Settings,
+    run_id: int,
+    batch: List[Tuple[str, Tuple[str, Optional[Dict], Optional[str]]]],
+    phase: str,
+    seen_in_active: bool,
+    counts: Dict[str, int],
+    metrics: RunMetrics,
+) -> None:
+    upserts: List[Tuple[str, Dict, bool]] = []
+    skipped: List[Tuple[str, bool]] = []
+    done: List[str] = []
+    failed: List[Tuple[str, str]] = []
+    deltas = {field: 0 for field in RUN_COUNT_FIELDS}
+    errors = _RunErrorBuffer(run_id)
+    with metrics.timer("db"):
+        conn.execute("BEGIN")
+        for username, result in batch:
+            if _apply_result(
+                conn, run_id, username, result, phase, seen_in_active, deltas, upserts, skipped, errors
+            ):
+                done.append(username)
+            else:
+                failed.append((username, str(result[2])))
+        changed, unchanged = upsert_users_and_stats_many(conn, upserts, commit=False)
+        deltas["updated_count"] += changed
+        deltas["unchanged_count"] += unchanged
+        reschedule_unchanged_users(conn, skipped, commit=False)
+        errors.flush(conn, metrics)
+        complete_work_items(conn, run_id, phase, done, commit=False)
+        fail_work_items(conn, run_id, phase, failed, settings.max_item_attempts, commit=False)
+        # Counters and metrics are saved with the batch so a resumed run carries them forward.
+        increment_run_counts(conn, run_id, deltas, commit=False)
+        metrics.add("users", value=len(batch))
+        add_run_metrics(conn, run_id, metrics.drain(), commit=False)
+        conn.commit()
+    for field, value in deltas.items():
+        counts[field] += value
 
 
-def run_ingestion_pipeline(settings: Settings) -> Dict[str, int]:
+def _ingest_usernames(
+    conn,
+    settings: Settings,
+    client: ChessComClient,
+    lease: _Lease,
+    usernames: List[str],
+    phase: str,
+    seen_in_active: bool,
+    counts: Dict[str, int],
+    budget: _RunBudget,
+) -> None:
+    # Fetch workers run on a background thread and hand finished users to this
+    # (the only DB-owning) thread through a bounded queue; a full queue stalls
+    # the fetchers instead of growing memory when commits are slow.
+    if not usernames:
+        return
+    results: "queue.Queue" = queue.Queue(maxsize=max(1, settings.write_queue_size))
+    stop = threading.Event()
+    with client.metrics.timer("db"):
+        known_last_online = get_known_last_online(conn, usernames)
+    producer = _start_producer(settings, client, usernames, known_last_online, results, stop, budget)
+    batch_size = max(1, settings.write_batch_size)
+    batch: List[Tuple[str, Tuple[str, Optional[Dict], Optional[str]]]] = []
+    written = 0
+    label = phase.capitalize()
+    try:
+        while True:
+            try:
+                item = results.get(timeout=WRITE_FLUSH_SECONDS)
+            except queue.Empty:
+                item = None
+            if isinstance(item, _ProducerDone):
+                if item.error is not None:
+                    raise item.error
+                break
+            if item is not None:
+                batch.append(item)
+            if batch and (len(batch) >= batch_size or item is None):
+                _write_batch(conn, settings, lease.run_id, batch, phase, seen_in_active, counts, client.metrics)
+                written += len(batch)
+                batch = []
+                print(f"{label} progress: {written}/{len(usernames)}")
+            if _lease_due(settings, lease):
+                _renew_lease(conn, settings, lease, phase)
+        if batch:
+            _write_batch(conn, settings, lease.run_id, batch, phase, seen_in_active, counts, client.metrics)
+            written += len(batch)
+            print(f"{label} progress: {written}/{len(usernames)}")
+    finally:
+        stop.set()
+        producer.join(timeout=QUEUE_POLL_SECONDS * 10)
+
+
+def _drain_work_items(
+    conn,
+    settings: Settings,
+    client: ChessComClient,
+    lease: _Lease,
+    phase: str,
+    seen_in_active: bool,
+    counts: Dict[str, int],
+    wait_for_others: bool,
+    budget: _RunBudget,
+) -> bool:
+    # Each claimed item is either completed or spends one of its attempts, so
+    # the loop ends once everything is done or has hit max_item_attempts. With
+    # wait_for_others the caller also waits out items leased by other workers,
+    # reclaiming them if a worker dies and its lease lapses. Once the budget
+    # is spent, unfinished claims go back to pending for the next run.
+    claimed_any = False
+    metrics = client.metrics
+    metrics.set_phase(phase)
+    started = time.monotonic()
+    try:
+        while True:
+            if budget.exhausted():
+                release_work_item_leases(conn, lease.run_id, lease.owner)
+                if claimed_any:
+                    metrics.add("wall_seconds", value=time.monotonic() - started)
+                add_run_metrics(conn, lease.run_id, metrics.drain())
+                return claimed_any
+            with metrics.timer("db"):
+                usernames = claim_work_items(
+                    conn,
+                    lease.run_id,
+                    phase,
+                    lease.owner,
+                    limit=max(1, settings.claim_size),
+                    lease_seconds=settings.lease_seconds,
+                    max_attempts=settings.max_item_attempts,
+                )
+            if usernames:
+                claimed_any = True
+                _ingest_usernames(conn, settings, client, lease, usernames, phase, seen_in_active, counts, budget)
+                continue
+            if not (wait_for_others and has_leased_work_items(conn, lease.run_id, phase)):
+                if claimed_any or wait_for_others:
+                    metrics.add("wall_seconds", value=time.monotonic() - started)
+                add_run_metrics(conn, lease.run_id, metrics.drain())
+                return claimed_any
+            time.sleep(WORKER_POLL_SECONDS)
+            if _lease_due(settings, lease):
+                _renew_lease(conn, settings, lease, phase)
+    except BaseException:
+        conn.rollback()
+        release_work_item_leases(conn, lease.run_id, lease.owner)
+        raise
+
+
+def _start_or_resume_run(conn, settings: Settings) -> Tuple[int, Dict[str, int]]:
+    resumable = None
+    if settings.pipeline_resume:
+        started_after = (datetime.now(timezone.utc) - timedelta(hours=settings.resume_max_age_hours)).isoformat()
+        resumable = find_resumable_run(conn, settings.max_item_attempts, started_after)
+    if resumable is None:
+        run_id = start_run(conn, notes=f"rolling discovery + refresh ({settings.pipeline_mode})")
+        return run_id, {field: 0 for field in RUN_COUNT_FIELDS}
+    run_id = int(resumable["id"])
+    reopen_run(conn, run_id)
+    print(f"Resuming run {run_id} (status was {resumable['status']})")
+    return run_id, {field: int(resumable[field] or 0) for field in RUN_COUNT_FIELDS}
+
+
+def _plan_active_phase(
+    conn,
+    settings: Settings,
+    client: ChessComClient,
+    run_id: int,
+    counts: Dict[str, int],
+) -> None:
+    active_usernames = client.fetch_active_country_players(settings.country_code)
+    counts["active_count"] = len(active_usernames)
+    snapshot_date = datetime.now(timezone.utc).date().isoformat()
+    upsert_active_snapshot(conn, snapshot_date, active_usernames)
+    if settings.active_sweep == "diff":
+        mark_snapshot_users_seen(conn, snapshot_date)
+        to_fetch = get_new_active_usernames(conn, snapshot_date)
+        print(
+            f"Active snapshot: {len(active_usernames)} users for {settings.country_code}, "
+            f"{len(to_fetch)} new since the previous snapshot"
+        )
+    else:
+        to_fetch = active_usernames
+        print(f"Active snapshot: {len(active_usernames)} users for {settings.country_code}")
+    enqueue_work_items(conn, run_id, "active", to_fetch)
+    set_run_active_count(conn, run_id, len(active_usernames))
+
+
+def _plan_sweep_phase(conn, settings: Settings, run_id: int) -> None:
+    # Walks users in username order from the stored cursor, taking as many as
+    # today's remaining request budget allows. The cursor is saved once the
+    # users are enqueued, so a crashed run resumes from its work items and the
+    # next run continues after them.
+    # A new pass counts from the start of this run, so users its active and
+    # refresh phases already fetched are not fetched again.
+    run_started_at = get_run_started_at(conn, run_id)
+    state = get_sweep_state(conn, SWEEP_NAME, run_started_at)
+    today = datetime.now(timezone.utc).date().isoformat()
+    budget_used = int(state["budget_used"] or 0) if state["budget_date"] == today else 0
+    allowed = max(0, settings.sweep_daily_requests - budget_used) // SWEEP_REQUESTS_PER_USER
+    if allowed <= 0:
+        print(f"Full sweep: daily budget of {settings.sweep_daily_requests} requests already spent")
+        return
+
+    pass_number = int(state["pass_number"])
+    pass_started_at = state["pass_started_at"]
+    if pass_started_at is None:
+        # The previous pass finished in an earlier run; start the next one now.
+        pass_number += 1
+        pass_started_at = run_started_at
+    cursor = state["cursor_username"]
+    chunk_size = max(1, settings.sweep_chunk_size)
+    usernames: List[str] = []
+    pass_done = False
+    while len(usernames) < allowed and not pass_done:
+        page = get_sweep_page(conn, cursor, chunk_size)
+        pass_done = len(page) < chunk_size
+        for row in page:
+            cursor = str(row["username"])
+            # Deleted accounts stay deleted, and users already fetched since the
+            # pass started (active list, refresh queue) are passed over.
+            if row["status"] != "active" or (row["last_fetched_at"] and row["last_fetched_at"] >= pass_started_at):
+                continue
+            usernames.append(cursor)
+            if len(usernames) >= allowed:
+                pass_done = False
+                break
+
+    enqueue_work_items(conn, run_id, "sweep", usernames)
+    save_sweep_state(
+        conn,
+        SWEEP_NAME,
+        pass_number=pass_number,
+        pass_started_at=None if pass_done else pass_started_at,
+        cursor_username=None if pass_done else cursor,
+        budget_date=today,
+        budget_used=budget_used + len(usernames) * SWEEP_REQUESTS_PER_USER,
+        last_run_id=run_id,
+        last_completed_at=utc_now_iso() if pass_done else state["last_completed_at"],
+    )
+    print(f"Full sweep pass {pass_number}: {len(usernames)} users queued" + (", pass complete" if pass_done else ""))
+
+
+def _sweep_progress(conn, settings: Settings) -> Optional[Dict[str, object]]:
+    return get_sweep_progress(conn, SWEEP_NAME, settings.sweep_daily_requests, SWEEP_REQUESTS_PER_USER)
+
+
+def _print_sweep_progress(progress: Optional[Dict[str, object]]) -> None:
+    if progress is None:
+        return
+    print(
+        f"Full sweep pass {progress['pass_number']}: {progress['percent_done']}% done, "
+        f"{progress['users_remaining']}/{progress['users_total']} users left, "
+        f"~{progress['days_remaining']} days at {progress['daily_requests']} requests/day"
+    )
+
+
+def _validate_settings(settings: Settings) -> None:
+    if settings.pipeline_mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode {settings.pipeline_mode!r}; expected one of {PIPELINE_MODES}")
+    if settings.active_sweep not in ACTIVE_SWEEP_MODES:
+        raise ValueError(f"Unknown active sweep {settings.active_sweep!r}; expected one of {ACTIVE_SWEEP_MODES}")
+
+
+def run_ingestion_pipeline(settings: Settings, metrics: Optional[RunMetrics] = None) -> Dict[str, object]:
+    _validate_settings(settings)
     init_db(settings)
-    client = ChessComClient(settings)
+    client = ChessComClient(settings, metrics=metrics or RunMetrics(), archive=open_raw_archive(settings))
+    owner = _worker_id()
 
     with get_conn(settings) as conn:
-        run_id = start_run(conn, notes="rolling discovery + refresh")
-        active_count = 0
-        updated_count = 0
-        deleted_count = 0
-        refresh_count = 0
-        error_count = 0
-
+        if not acquire_lock(conn, RUN_LOCK_NAME, owner, settings.run_lock_seconds):
+            holder = get_lock_holder(conn, RUN_LOCK_NAME)
+            detail = f"{holder['owner']} (run {holder['run_id']})" if holder else "another process"
+            raise RuntimeError(f"Ingestion is already running: lock held by {detail}")
         try:
-            active_usernames = client.fetch_active_country_players(settings.country_code)
-            active_count = len(active_usernames)
-            snapshot_date = datetime.now(timezone.utc).date().isoformat()
-            upsert_active_snapshot(conn, snapshot_date, active_usernames)
-            print(f"Active snapshot: {active_count} users for {settings.country_code}")
-
-            conn.execute("BEGIN")
-            for idx, username in enumerate(active_usernames, start=1):
-                state, record, error_detail = _process_username(client, username)
-                if state == "deleted":
-                    mark_user_deleted(conn, username, commit=False)
-                    deleted_count += 1
-                elif state == "ok" and record:
-                    upsert_user_and_stats(conn, username, record, seen_in_active=True, commit=False)
-                    updated_count += 1
-                else:
-                    log_run_error(conn, run_id, "active_fetch", str(error_detail), username)
-                    error_count += 1
-
-                if idx % 200 == 0:
-                    conn.commit()
-                    conn.execute("BEGIN")
-                if idx % 100 == 0:
-                    print(f"Active progress: {idx}/{active_count}")
-                time.sleep(settings.request_delay_seconds)
-            conn.commit()
-
-            refresh_candidates = get_refresh_candidates(
-                conn,
-                snapshot_date=snapshot_date,
-                limit=settings.refresh_limit,
-            )
-            if refresh_candidates:
-                print(f"Refresh queue: {len(refresh_candidates)} users")
-
-            conn.execute("BEGIN")
-            for idx, username in enumerate(refresh_candidates, start=1):
-                state, record, error_detail = _process_username(client, username)
-                if state == "deleted":
-                    mark_user_deleted(conn, username, commit=False)
-                    deleted_count += 1
-                    refresh_count += 1
-                elif state == "ok" and record:
-                    upsert_user_and_stats(conn, username, record, seen_in_active=False, commit=False)
-                    updated_count += 1
-                    refresh_count += 1
-                else:
-                    log_run_error(conn, run_id, "refresh_fetch", str(error_detail), username)
-                    error_count += 1
-
-                if idx % 200 == 0:
-                    conn.commit()
-                    conn.execute("BEGIN")
-                if idx % 100 == 0:
-                    print(f"Refresh progress: {idx}/{len(refresh_candidates)}")
-                time.sleep(settings.request_delay_seconds)
-            conn.commit()
-
-            finish_run(
-                conn,
-                run_id=run_id,
-                status="success",
-                active_count=active_count,
-                updated_count=updated_count,
-                deleted_count=deleted_count,
-                refresh_count=refresh_count,
-                error_count=error_count,
-            )
-            refresh_cached_analytics(settings, source=f"pipeline-run:{run_id}")
-            return {
-                "run_id": run_id,
-                "active_count": active_count,
-                "updated_count": updated_count,
-                "deleted_count": deleted_count,
-                "refresh_count": refresh_count,
-                "error_count": error_count,
-            }
-        except KeyboardInterrupt:
-            finish_run(
-                conn,
-                run_id=run_id,
-                status="interrupted",
-                active_count=active_count,
-                updated_count=updated_count,
-                deleted_count=deleted_count,
-                refresh_count=refresh_count,
-                error_count=error_count,
-            )
-            raise
-        except Exception as exc:
-            logger.exception("Pipeline failed")
-            conn.rollback()
-            log_run_error(conn, run_id, "pipeline", str(exc))
-            finish_run(
-                conn,
-                run_id=run_id,
-                status="failed",
-                active_count=active_count,
-                updated_count=updated_count,
-                deleted_count=deleted_count,
-                refresh_count=refresh_count,
-                error_count=error_count + 1,
+            return _run_locked(conn, settings, client, owner)
+        finally:
+            release_lock(conn, RUN_LOCK_NAME, owner)
+            if client.archive:
+                client.archive.close()
+
+
+def _run_locked(conn, settings: Settings, client: ChessComClient, owner: str) -> Dict[str, object]:
+    # Holding the run lock means any run still marked 'running' was abandoned,
+    # so it is safe to resume.
+    run_id, counts = _start_or_resume_run(conn, settings)
+    renew_lock(conn, RUN_LOCK_NAME, owner, settings.run_lock_seconds, run_id=run_id)
+    lease = _Lease(owner, run_id, holds_run_lock=True)
+    budget = _RunBudget(settings, client.metrics)
+
+    try:
+        if not has_work_items(conn, run_id, "active"):
+            client.metrics.set_phase("active")
+            _plan_active_phase(conn, settings, client, run_id, counts)
+
+        _drain_work_items(conn, settings, client, lease, "active", True, counts, wait_for_others=True, budget=budget)
+
+        if not budget.exhausted():
+            if not has_work_items(conn, run_id, "refresh"):
+                refresh_candidates = get_refresh_candidates(conn, limit=settings.refresh_limit)
+                enqueue_work_items(conn, run_id, "refresh", refresh_candidates)
+                if refresh_candidates:
+                    print(f"Refresh queue: {len(refresh_candidates)} users")
+
+            _drain_work_items(
+                conn, settings, client, lease, "refresh", False, counts, wait_for_others=True, budget=budget
             )
-            raise
+
+        summary: Dict[str, object] = {}
+        if settings.full_sweep:
+            if not budget.exhausted():
+                if not has_work_items(conn, run_id, "sweep"):
+                    _plan_sweep_phase(conn, settings, run_id)
+                _drain_work_items(
+                    conn, settings, client, lease, "sweep", False, counts, wait_for_others=True, budget=budget
+                )
+            summary["sweep"] = _sweep_progress(conn, settings)
+            _print_sweep_progress(summary["sweep"])
+
+        result = _close_run(conn, settings, run_id, budget)
+        refresh_cached_analytics(settings, source=f"pipeline-run:{run_id}")
+        return {"run_id": run_id, **result, **summary}
+    except (KeyboardInterrupt, Exception) as exc:
+        _abort_run(conn, run_id, exc)
+        raise
+
+
+def _close_run(conn, settings: Settings, run_id: int, budget: _RunBudget) -> Dict[str, object]:
+    totals: Dict[str, object] = dict(get_run_counts(conn, run_id))
+    if budget.exhausted():
+        # Pending work items stay behind for the next run to resume.
+        pending = count_pending_work_items(conn, run_id, settings.max_item_attempts)
+        stop_reason = budget.reason + "".join(f"; {phase} pending={n}" for phase, n in sorted(pending.items()))
+        finish_run(conn, run_id=run_id, status="partial", stop_reason=stop_reason, **totals)
+        print(f"Run {run_id} stopped early ({stop_reason})")
+        totals["stop_reason"] = stop_reason
+    else:
+        finish_run(conn, run_id=run_id, status="success", **totals)
+    clear_done_work_items(conn, run_id)
+    return totals
+
+
+def _abort_run(conn, run_id: int, exc: BaseException) -> None:
+    conn.rollback()
+    if isinstance(exc, KeyboardInterrupt):
+        finish_run(conn, run_id=run_id, status="interrupted", **get_run_counts(conn, run_id))
+        return
+    logger.exception("Pipeline failed")
+    log_run_error(conn, run_id, "pipeline", str(exc))
+    increment_run_counts(conn, run_id, {"error_count": 1})
+    finish_run(conn, run_id=run_id, status="failed", **get_run_counts(conn, run_id))
+
+
+class _AnalyticsTrigger:
+    # Daemon runs never end with a full rebuild; cached analytics are rebuilt
+    # once enough rows changed, or once some did and the last rebuild is older
+    # than daemon_analytics_max_seconds.
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.pending = 0
+        self.rebuilt_at = time.monotonic()
+        self.run_id: Optional[int] = None
+        self._run_changed = 0
+
+    def observe(self, run_id: int, counts: Dict[str, int]) -> None:
+        # counts are running totals for the run, so only the growth is new.
+        changed = counts["updated_count"] + counts["deleted_count"]
+        self.pending += changed - (self._run_changed if run_id == self.run_id else 0)
+        self.run_id = run_id
+        self._run_changed = changed
+        stale = time.monotonic() - self.rebuilt_at >= self.settings.daemon_analytics_max_seconds
+        if self.pending >= self.settings.daemon_analytics_min_changes or (self.pending and stale):
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        print(f"Rebuilding analytics after {self.pending} changed rows")
+        refresh_cached_analytics(self.settings, source=f"pipeline-daemon:{self.run_id}")
+        self.pending = 0
+        self.rebuilt_at = time.monotonic()
+
+
+def run_pipeline_daemon(settings: Settings, stop: Optional[threading.Event] = None) -> None:
+    # Trickle ingestion: one run per active-snapshot interval, fed small batches
+    # of due refresh candidates at a fixed request rate. Yields to any other
+    # process holding the run lock (e.g. a manual run) and resumes afterwards.
+    _validate_settings(settings)
+    rate = settings.daemon_rate_per_second
+    settings = replace(
+        settings,
+        rate_limit_per_second=rate,
+        rate_limit_max_per_second=rate,
+        rate_limit_min_per_second=min(settings.rate_limit_min_per_second, rate),
+        refresh_limit=max(1, settings.daemon_batch_size),
+    )
+    init_db(settings)
+    stop = stop or threading.Event()
+    client = ChessComClient(settings, metrics=RunMetrics(), archive=open_raw_archive(settings))
+    owner = _worker_id()
+    analytics = _AnalyticsTrigger(settings)
+    print(
+        f"Pipeline daemon {owner}: {rate:g} requests/s, batches of {settings.refresh_limit}, "
+        f"active snapshot every {settings.daemon_snapshot_seconds}s"
+    )
+
+    with get_conn(settings) as conn:
+        try:
+            while not stop.is_set():
+                if not acquire_lock(conn, RUN_LOCK_NAME, owner, settings.run_lock_seconds):
+                    stop.wait(settings.daemon_idle_seconds)
+                    continue
+                try:
+                    _run_daemon_cycle(conn, settings, client, owner, stop, analytics)
+                except Exception:
+                    # Already recorded on the run; back off and start a new one.
+                    stop.wait(settings.daemon_idle_seconds)
+                finally:
+                    release_lock(conn, RUN_LOCK_NAME, owner)
+        finally:
+            analytics.flush()
+            if client.archive:
+                client.archive.close()
+
+
+def _run_daemon_cycle(
+    conn,
+    settings: Settings,
+    client: ChessComClient,
+    owner: str,
+    stop: threading.Event,
+    analytics: _AnalyticsTrigger,
+) -> None:
+    run_id, counts = _start_or_resume_run(conn, settings)
+    renew_lock(conn, RUN_LOCK_NAME, owner, settings.run_lock_seconds, run_id=run_id)
+    lease = _Lease(owner, run_id, holds_run_lock=True)
+    budget = _RunBudget(settings, client.metrics, stop)
+    next_snapshot = time.monotonic() + settings.daemon_snapshot_seconds
+
+    try:
+        if not has_work_items(conn, run_id, "active"):
+            client.metrics.set_phase("active")
+            _plan_active_phase(conn, settings, client, run_id, counts)
+        _drain_work_items(conn, settings, client, lease, "active", True, counts, wait_for_others=True, budget=budget)
+        analytics.observe(run_id, counts)
+
+        while not budget.exhausted() and time.monotonic() < next_snapshot:
+            candidates = get_refresh_candidates(conn, limit=settings.refresh_limit, exclude_run_id=run_id)
+            if candidates:
+                enqueue_work_items(conn, run_id, "refresh", candidates)
+                _drain_work_items(
+                    conn, settings, client, lease, "refresh", False, counts, wait_for_others=True, budget=budget
+                )
+            else:
+                # Nothing is due yet; keep the run lock alive while waiting.
+                stop.wait(max(0.0, min(settings.daemon_idle_seconds, next_snapshot - time.monotonic())))
+                _renew_lease(conn, settings, lease, "refresh")
+            analytics.observe(run_id, counts)
+
+        _close_run(conn, settings, run_id, budget)
+    except (KeyboardInterrupt, Exception) as exc:
+        _abort_run(conn, run_id, exc)
+        raise
+
+
+def run_pipeline_worker(settings: Settings) -> Dict[str, int]:
+    # Helps drain whichever run currently holds the run lock and exits once no
+    # run is in progress. Counters go to the shared run row; the returned
+    # summary only covers this worker's share.
+    _validate_settings(settings)
+    init_db(settings)
+    client = ChessComClient(settings, metrics=RunMetrics(), archive=open_raw_archive(settings))
+    owner = _worker_id()
+    counts = {field: 0 for field in RUN_COUNT_FIELDS}
+    run_ids: List[int] = []
+    budget = _RunBudget(settings, client.metrics)
+
+    with get_conn(settings) as conn:
+        try:
+            while not budget.exhausted():
+                holder = get_lock_holder(conn, RUN_LOCK_NAME)
+                if holder is None:
+                    break
+                if holder["run_id"] is None:
+                    # The coordinator has the lock but has not picked its run yet.
+                    time.sleep(WORKER_POLL_SECONDS)
+                    continue
+                lease = _Lease(owner, int(holder["run_id"]), holds_run_lock=False)
+                if lease.run_id not in run_ids:
+                    run_ids.append(lease.run_id)
+                    print(f"Worker {owner} joined run {lease.run_id}")
+                worked = False
+                for phase, seen_in_active in PHASES:
+                    if _drain_work_items(
+                        conn,
+                        settings,
+                        client,
+                        lease,
+                        phase,
+                        seen_in_active,
+                        counts,
+                        wait_for_others=False,
+                        budget=budget,
+                    ):
+                        worked = True
+                if not worked:
+                    time.sleep(WORKER_POLL_SECONDS)
+        finally:
+            if client.archive:
+                client.archive.close()
+    return {"run_ids": run_ids, **counts}
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from .config import Settings
+
+
+# Additive increase per healthy response, multiplicative decrease per throttle signal.
+AIMD_INCREASE_PER_SUCCESS = 0.05
+AIMD_DECREASE_FACTOR = 0.5
+# Concurrent requests tend to hit a 429 together; treat one burst as one signal.
+AIMD_DECREASE_COOLDOWN_SECONDS = 1.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_seconds(attempt: int) -> float:
+    return (2**attempt) * 0.25
+
+
+class AdaptiveRateLimiter:
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        min_rate: float,
+        max_rate: float,
+    ):
+        self._lock = threading.Lock()
+        self._tokens = float(max(1, burst))
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self.configure(rate, burst, min_rate, max_rate)
+
+    def configure(self, rate: float, burst: int, min_rate: float, max_rate: float) -> None:
+        # Also used to retune a shared limiter in place, so callers holding it
+        # (and its pending Retry-After block) keep working against one budget.
+        with self._lock:
+            self.config = (rate, burst, min_rate, max_rate)
+            self.min_rate = max(0.01, min_rate)
+            self.max_rate = max(self.min_rate, max_rate)
+            self.rate = min(self.max_rate, max(self.min_rate, rate))
+            self.burst = max(1, burst)
+            self._tokens = min(self._tokens, float(self.burst))
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            wait = max(0.0, self._blocked_until - now)
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.rate)
+            return wait
+
+    def acquire(self) -> float:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + AIMD_INCREASE_PER_SUCCESS)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease >= AIMD_DECREASE_COOLDOWN_SECONDS:
+                self.rate = max(self.min_rate, self.rate * AIMD_DECREASE_FACTOR)
+                self._last_decrease = now
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+                self._tokens = min(self._tokens, 0.0)
+
+
+_shared_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_rate_limiter(settings: Settings, key: str = "api.chess.com") -> AdaptiveRateLimiter:
+    # The limiter is shared per process; a caller asking for different limits
+    # (e.g. the daemon's fixed rate) retunes it rather than being ignored.
+    config = (
+        settings.rate_limit_per_second,
+        settings.rate_limit_burst,
+        settings.rate_limit_min_per_second,
+        settings.rate_limit_max_per_second,
+    )
+    with _shared_lock:
+        limiter = _shared_limiters.get(key)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(*config)
+            _shared_limiters[key] = limiter
+        elif limiter.config != config:
+            limiter.configure(*config)
+        return limiter
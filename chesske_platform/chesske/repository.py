@@ -1,14 +1,48 @@
 from datetime import datetime, timedelta, timezone
+import hashlib
 import json
+import math
+import time
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
-from .db import utc_now_iso
+from .db import ACTIVE_PLAYER_STATS_COLUMNS, ACTIVE_PLAYER_STATS_SELECT_SQL, utc_now_iso
 
 
-def _iso_after(days: int) -> str:
+# Refresh intervals adapt per user: halved when a refresh found changes,
+# doubled when it did not, within [REFRESH_MIN_DAYS, REFRESH_MAX_DAYS].
+REFRESH_ACTIVE_DAYS = 7.0
+REFRESH_DEFAULT_DAYS = 30.0
+REFRESH_MIN_DAYS = 1.0
+REFRESH_MAX_DAYS = 90.0
+CHANGE_RATE_ALPHA = 0.3
+
+
+def _iso_after(days: float) -> str:
     return (datetime.now(timezone.utc) + timedelta(days=days)).isoformat()
 
 
+def _iso_after_seconds(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+def _schedule_refresh(
+    interval_days: Optional[float],
+    change_rate: Optional[float],
+    changed: bool,
+    seen_in_active: bool,
+) -> Tuple[float, float]:
+    if interval_days is None:
+        interval = REFRESH_ACTIVE_DAYS if seen_in_active else REFRESH_DEFAULT_DAYS
+    else:
+        interval = float(interval_days) * (0.5 if changed else 2.0)
+    interval = min(REFRESH_MAX_DAYS, max(REFRESH_MIN_DAYS, interval))
+    if seen_in_active:
+        interval = min(interval, REFRESH_ACTIVE_DAYS)
+    observed = 1.0 if changed else 0.0
+    rate = observed if change_rate is None else float(change_rate) + CHANGE_RATE_ALPHA * (observed - float(change_rate))
+    return interval, rate
+
+
 def start_run(conn: Any, notes: str = "") -> int:
     cur = conn.execute(
         """
@@ -34,12 +68,17 @@ def finish_run(
     deleted_count: int,
     refresh_count: int,
     error_count: int,
+    unchanged_count: int = 0,
+    stats_skipped_count: int = 0,
+    stop_reason: Optional[str] = None,
+    sweep_count: int = 0,
 ) -> None:
     conn.execute(
         """
         UPDATE pipeline_runs
         SET ended_at = ?, status = ?, active_count = ?, updated_count = ?,
-            deleted_count = ?, refresh_count = ?, error_count = ?
+            deleted_count = ?, refresh_count = ?, sweep_count = ?, error_count = ?, unchanged_count = ?,
+            stats_skipped_count = ?, stop_reason = ?
         WHERE id = ?
         """,
         (
@@ -49,24 +88,543 @@ def finish_run(
             updated_count,
             deleted_count,
             refresh_count,
+            sweep_count,
             error_count,
+            unchanged_count,
+            stats_skipped_count,
+            stop_reason,
             run_id,
         ),
     )
     conn.commit()
 
 
-def log_run_error(conn: Any, run_id: int, stage: str, error: str, username: Optional[str] = None) -> None:
+def increment_run_counts(conn: Any, run_id: int, deltas: Dict[str, int], commit: bool = True) -> None:
+    # Additive so several workers can report into the same run row.
+    conn.execute(
+        """
+        UPDATE pipeline_runs
+        SET updated_count = updated_count + ?,
+            deleted_count = deleted_count + ?,
+            refresh_count = refresh_count + ?,
+            sweep_count = sweep_count + ?,
+            error_count = error_count + ?,
+            unchanged_count = unchanged_count + ?,
+            stats_skipped_count = stats_skipped_count + ?
+        WHERE id = ?
+        """,
+        (
+            deltas.get("updated_count", 0),
+            deltas.get("deleted_count", 0),
+            deltas.get("refresh_count", 0),
+            deltas.get("sweep_count", 0),
+            deltas.get("error_count", 0),
+            deltas.get("unchanged_count", 0),
+            deltas.get("stats_skipped_count", 0),
+            run_id,
+        ),
+    )
+    if commit:
+        conn.commit()
+
+
+def set_run_active_count(conn: Any, run_id: int, active_count: int) -> None:
+    conn.execute("UPDATE pipeline_runs SET active_count = ? WHERE id = ?", (active_count, run_id))
+    conn.commit()
+
+
+def get_run_counts(conn: Any, run_id: int) -> Dict[str, int]:
+    row = conn.execute(
+        """
+        SELECT active_count, updated_count, deleted_count, refresh_count, sweep_count, error_count,
+               unchanged_count, stats_skipped_count
+        FROM pipeline_runs
+        WHERE id = ?
+        """,
+        (run_id,),
+    ).fetchone()
+    return {key: int(row[key] or 0) for key in row.keys()}
+
+
+def get_run_started_at(conn: Any, run_id: int) -> str:
+    row = conn.execute("SELECT started_at FROM pipeline_runs WHERE id = ?", (run_id,)).fetchone()
+    return str(row["started_at"])
+
+
+def acquire_lock(conn: Any, name: str, owner: str, ttl_seconds: float) -> bool:
+    now = utc_now_iso()
+    conn.execute(
+        """
+        INSERT INTO pipeline_locks (name, owner, run_id, acquired_at, expires_at)
+        VALUES (?, ?, NULL, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET
+            owner = excluded.owner,
+            run_id = NULL,
+            acquired_at = excluded.acquired_at,
+            expires_at = excluded.expires_at
+        WHERE pipeline_locks.expires_at < excluded.acquired_at
+           OR pipeline_locks.owner = excluded.owner
+        """,
+        (name, owner, now, _iso_after_seconds(ttl_seconds)),
+    )
+    row = conn.execute("SELECT owner FROM pipeline_locks WHERE name = ?", (name,)).fetchone()
+    conn.commit()
+    return row is not None and row["owner"] == owner
+
+
+def get_lock_holder(conn: Any, name: str) -> Optional[Any]:
+    return conn.execute(
+        "SELECT owner, run_id, expires_at FROM pipeline_locks WHERE name = ? AND expires_at >= ?",
+        (name, utc_now_iso()),
+    ).fetchone()
+
+
+def renew_lock(
+    conn: Any,
+    name: str,
+    owner: str,
+    ttl_seconds: float,
+    run_id: Optional[int] = None,
+    commit: bool = True,
+) -> bool:
+    cur = conn.execute(
+        """
+        UPDATE pipeline_locks
+        SET expires_at = ?, run_id = COALESCE(?, run_id)
+        WHERE name = ? AND owner = ?
+        """,
+        (_iso_after_seconds(ttl_seconds), run_id, name, owner),
+    )
+    if commit:
+        conn.commit()
+    return bool(cur.rowcount)
+
+
+def release_lock(conn: Any, name: str, owner: str) -> None:
+    conn.execute("DELETE FROM pipeline_locks WHERE name = ? AND owner = ?", (name, owner))
+    conn.commit()
+
+
+def find_resumable_run(conn: Any, max_attempts: int, started_after: str) -> Optional[Any]:
+    return conn.execute(
+        """
+        SELECT r.*
+        FROM pipeline_runs r
+        WHERE r.status IN ('running', 'interrupted', 'failed', 'partial')
+          AND r.started_at >= ?
+          AND EXISTS (
+              SELECT 1
+              FROM pipeline_work_items w
+              WHERE w.run_id = r.id
+                AND w.state = 'pending'
+                AND w.attempts < ?
+          )
+        ORDER BY r.id DESC
+        LIMIT 1
+        """,
+        (started_after, max_attempts),
+    ).fetchone()
+
+
+def reopen_run(conn: Any, run_id: int) -> None:
+    conn.execute(
+        "UPDATE pipeline_runs SET status = 'running', ended_at = NULL, stop_reason = NULL WHERE id = ?",
+        (run_id,),
+    )
+    conn.commit()
+
+
+def enqueue_work_items(conn: Any, run_id: int, phase: str, usernames: Sequence[str]) -> None:
+    now = utc_now_iso()
+    conn.executemany(
+        """
+        INSERT INTO pipeline_work_items (run_id, phase, username, position, state, attempts, updated_at)
+        VALUES (?, ?, ?, ?, 'pending', 0, ?)
+        ON CONFLICT (run_id, phase, username) DO NOTHING
+        """,
+        [(run_id, phase, username, position, now) for position, username in enumerate(usernames)],
+    )
+    conn.commit()
+
+
+def get_new_active_usernames(conn: Any, snapshot_date: str) -> List[str]:
+    # Usernames in today's snapshot that were not in the previous snapshot day
+    # as known active users (with no earlier snapshot every username is new),
+    # minus anyone an earlier run already fetched today, deleted ones included.
+    rows = conn.execute(
+        """
+        SELECT username
+        FROM country_active_snapshots
+        WHERE snapshot_date = ?
+        EXCEPT
+        SELECT s.username
+        FROM country_active_snapshots s
+        JOIN users u ON u.username = s.username
+        WHERE u.status = 'active'
+          AND s.snapshot_date = (
+              SELECT MAX(snapshot_date)
+              FROM country_active_snapshots
+              WHERE snapshot_date < ?
+          )
+        EXCEPT
+        SELECT username
+        FROM users
+        WHERE last_fetched_at >= ?
+        ORDER BY 1
+        """,
+        (snapshot_date, snapshot_date, snapshot_date),
+    ).fetchall()
+    return [str(row["username"]) for row in rows]
+
+
+def mark_snapshot_users_seen(conn: Any, snapshot_date: str, commit: bool = True) -> int:
+    # Users in the active list are not refetched here, so the active cap of the
+    # schedule is applied in place: no longer interval than REFRESH_ACTIVE_DAYS
+    # and a refresh due within that many days. NULLs (never scheduled, so due
+    # now) are left alone.
+    cap_at = _iso_after(REFRESH_ACTIVE_DAYS)
+    cur = conn.execute(
+        """
+        UPDATE users
+        SET last_seen_active_at = ?,
+            refresh_interval_days = CASE
+                WHEN refresh_interval_days > ? THEN ? ELSE refresh_interval_days
+            END,
+            next_refresh_at = CASE WHEN next_refresh_at > ? THEN ? ELSE next_refresh_at END
+        WHERE status = 'active'
+          AND username IN (
+              SELECT username
+              FROM country_active_snapshots
+              WHERE snapshot_date = ?
+          )
+        """,
+        (utc_now_iso(), REFRESH_ACTIVE_DAYS, REFRESH_ACTIVE_DAYS, cap_at, cap_at, snapshot_date),
+    )
+    if commit:
+        conn.commit()
+    return int(cur.rowcount or 0)
+
+
+def count_pending_work_items(conn: Any, run_id: int, max_attempts: int) -> Dict[str, int]:
+    rows = conn.execute(
+        """
+        SELECT phase, COUNT(*) AS pending
+        FROM pipeline_work_items
+        WHERE run_id = ? AND state = 'pending' AND attempts < ?
+        GROUP BY phase
+        """,
+        (run_id, max_attempts),
+    ).fetchall()
+    return {str(r["phase"]): int(r["pending"]) for r in rows}
+
+
+def has_work_items(conn: Any, run_id: int, phase: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM pipeline_work_items WHERE run_id = ? AND phase = ? LIMIT 1",
+        (run_id, phase),
+    ).fetchone()
+    return row is not None
+
+
+_CLAIMABLE_WORK_ITEMS_SQL = """
+SELECT {key}
+FROM pipeline_work_items
+WHERE run_id = ? AND phase = ? AND state = 'pending' AND attempts < ?
+  AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+ORDER BY position
+LIMIT ?
+"""
+
+
+def claim_work_items(
+    conn: Any,
+    run_id: int,
+    phase: str,
+    owner: str,
+    limit: int,
+    lease_seconds: float,
+    max_attempts: int,
+) -> List[str]:
+    # One statement picks and leases the items: SKIP LOCKED lets concurrent
+    # Postgres workers take disjoint sets, and SQLite serialises writers anyway.
+    now = utc_now_iso()
+    params = (owner, _iso_after_seconds(lease_seconds), run_id, phase, max_attempts, now, limit)
+    if getattr(conn, "backend", "sqlite") == "postgres":
+        picked = _CLAIMABLE_WORK_ITEMS_SQL.format(key="run_id, phase, username") + "FOR UPDATE SKIP LOCKED"
+        sql = f"""
+        UPDATE pipeline_work_items w
+        SET lease_owner = ?, lease_expires_at = ?
+        FROM ({picked}) c
+        WHERE w.run_id = c.run_id AND w.phase = c.phase AND w.username = c.username
+        RETURNING w.username, w.position
+        """
+    else:
+        picked = _CLAIMABLE_WORK_ITEMS_SQL.format(key="rowid")
+        sql = f"""
+        UPDATE pipeline_work_items
+        SET lease_owner = ?, lease_expires_at = ?
+        WHERE rowid IN ({picked})
+        RETURNING username, position
+        """
+    rows = conn.execute(sql, params).fetchall()
+    conn.commit()
+    return [str(row["username"]) for row in sorted(rows, key=lambda row: row["position"])]
+
+
+def has_leased_work_items(conn: Any, run_id: int, phase: str) -> bool:
+    row = conn.execute(
+        """
+        SELECT 1
+        FROM pipeline_work_items
+        WHERE run_id = ? AND phase = ? AND state = 'pending' AND lease_expires_at >= ?
+        LIMIT 1
+        """,
+        (run_id, phase, utc_now_iso()),
+    ).fetchone()
+    return row is not None
+
+
+def renew_work_item_leases(
+    conn: Any,
+    run_id: int,
+    phase: str,
+    owner: str,
+    lease_seconds: float,
+    commit: bool = True,
+) -> None:
+    conn.execute(
+        """
+        UPDATE pipeline_work_items
+        SET lease_expires_at = ?
+        WHERE run_id = ? AND phase = ? AND lease_owner = ? AND state = 'pending'
+        """,
+        (_iso_after_seconds(lease_seconds), run_id, phase, owner),
+    )
+    if commit:
+        conn.commit()
+
+
+def release_work_item_leases(conn: Any, run_id: int, owner: str) -> None:
+    conn.execute(
+        """
+        UPDATE pipeline_work_items
+        SET lease_owner = NULL, lease_expires_at = NULL
+        WHERE run_id = ? AND lease_owner = ? AND state = 'pending'
+        """,
+        (run_id, owner),
+    )
+    conn.commit()
+
+
+def complete_work_items(
+    conn: Any,
+    run_id: int,
+    phase: str,
+    usernames: Sequence[str],
+    commit: bool = True,
+) -> None:
+    now = utc_now_iso()
+    conn.executemany(
+        """
+        UPDATE pipeline_work_items
+        SET state = 'done', attempts = attempts + 1, last_error = NULL,
+            lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+        WHERE run_id = ? AND phase = ? AND username = ?
+        """,
+        [(now, run_id, phase, username) for username in usernames],
+    )
+    if commit:
+        conn.commit()
+
+
+def fail_work_items(
+    conn: Any,
+    run_id: int,
+    phase: str,
+    failures: Sequence[Tuple[str, str]],
+    max_attempts: int,
+    commit: bool = True,
+) -> None:
+    now = utc_now_iso()
+    conn.executemany(
+        """
+        UPDATE pipeline_work_items
+        SET attempts = attempts + 1,
+            state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+            last_error = ?,
+            lease_owner = NULL,
+            lease_expires_at = NULL,
+            updated_at = ?
+        WHERE run_id = ? AND phase = ? AND username = ?
+        """,
+        [(max_attempts, error[:2000], now, run_id, phase, username) for username, error in failures],
+    )
+    if commit:
+        conn.commit()
+
+
+def clear_done_work_items(conn: Any, run_id: int) -> None:
+    conn.execute("DELETE FROM pipeline_work_items WHERE run_id = ? AND state = 'done'", (run_id,))
+    conn.commit()
+
+
+def get_sweep_state(conn: Any, name: str, pass_started_at: str) -> Any:
+    # pass_started_at only applies when this creates the first pass.
+    conn.execute(
+        """
+        INSERT INTO pipeline_sweeps (name, pass_number, pass_started_at, budget_used, updated_at)
+        VALUES (?, 1, ?, 0, ?)
+        ON CONFLICT (name) DO NOTHING
+        """,
+        (name, pass_started_at, utc_now_iso()),
+    )
+    row = conn.execute("SELECT * FROM pipeline_sweeps WHERE name = ?", (name,)).fetchone()
+    conn.commit()
+    return row
+
+
+def save_sweep_state(
+    conn: Any,
+    name: str,
+    pass_number: int,
+    pass_started_at: Optional[str],
+    cursor_username: Optional[str],
+    budget_date: str,
+    budget_used: int,
+    last_run_id: int,
+    last_completed_at: Optional[str],
+) -> None:
     conn.execute(
         """
-        INSERT INTO run_errors (run_id, username, stage, error, created_at)
-        VALUES (?, ?, ?, ?, ?)
+        UPDATE pipeline_sweeps
+        SET pass_number = ?,
+            pass_started_at = ?,
+            cursor_username = ?,
+            budget_date = ?,
+            budget_used = ?,
+            last_run_id = ?,
+            last_completed_at = ?,
+            updated_at = ?
+        WHERE name = ?
         """,
-        (run_id, username, stage, error[:2000], utc_now_iso()),
+        (
+            pass_number,
+            pass_started_at,
+            cursor_username,
+            budget_date,
+            budget_used,
+            last_run_id,
+            last_completed_at,
+            utc_now_iso(),
+            name,
+        ),
     )
     conn.commit()
 
 
+def get_sweep_page(conn: Any, after_username: Optional[str], limit: int) -> List[Any]:
+    # Keyset page over the users primary key. Filtering on status here would
+    # let SQLite pick idx_users_status and sort every active user per page, so
+    # the caller filters the page instead.
+    return conn.execute(
+        """
+        SELECT username, status, last_fetched_at
+        FROM users
+        WHERE username > ?
+        ORDER BY username
+        LIMIT ?
+        """,
+        (after_username or "", limit),
+    ).fetchall()
+
+
+def get_sweep_progress(conn: Any, name: str, daily_requests: int, requests_per_user: int) -> Optional[Dict[str, Any]]:
+    state = conn.execute("SELECT * FROM pipeline_sweeps WHERE name = ?", (name,)).fetchone()
+    if state is None:
+        return None
+    # Position of the cursor in the whole table, so users the sweep found
+    # deleted still count as done.
+    total = int(conn.execute("SELECT COUNT(*) AS n FROM users").fetchone()["n"] or 0)
+    if state["cursor_username"] is None:
+        remaining = 0 if state["pass_started_at"] is None else total
+    else:
+        remaining = int(
+            conn.execute(
+                "SELECT COUNT(*) AS n FROM users WHERE username > ?",
+                (state["cursor_username"],),
+            ).fetchone()["n"]
+            or 0
+        )
+    users_per_day = max(1, daily_requests // max(1, requests_per_user))
+    return {
+        "name": state["name"],
+        "pass_number": int(state["pass_number"]),
+        "pass_started_at": state["pass_started_at"],
+        "cursor_username": state["cursor_username"],
+        "users_total": total,
+        "users_remaining": remaining,
+        "percent_done": round(100.0 * (total - remaining) / total, 2) if total else 100.0,
+        "budget_date": state["budget_date"],
+        "budget_used": int(state["budget_used"] or 0),
+        "daily_requests": daily_requests,
+        "days_remaining": math.ceil(remaining / users_per_day),
+        "days_per_pass": math.ceil(total / users_per_day),
+        "last_run_id": state["last_run_id"],
+        "last_completed_at": state["last_completed_at"],
+        "updated_at": state["updated_at"],
+    }
+
+
+def add_run_metrics(conn: Any, run_id: int, rows: Sequence[Tuple[str, str, str, float]], commit: bool = True) -> None:
+    # Metrics are additive so several workers (and resumed attempts) can add
+    # their share to the same run.
+    if rows:
+        conn.executemany(
+            """
+            INSERT INTO pipeline_run_metrics (run_id, phase, metric, label, value)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (run_id, phase, metric, label) DO UPDATE SET
+                value = pipeline_run_metrics.value + excluded.value
+            """,
+            [(run_id, phase, metric, label, float(value)) for phase, metric, label, value in rows],
+        )
+    if commit:
+        conn.commit()
+
+
+def get_run_metrics(conn: Any, run_id: int) -> List[Any]:
+    return conn.execute(
+        """
+        SELECT phase, metric, label, value
+        FROM pipeline_run_metrics
+        WHERE run_id = ?
+        ORDER BY phase, metric, label
+        """,
+        (run_id,),
+    ).fetchall()
+
+
+def log_run_error(conn: Any, run_id: int, stage: str, error: str, username: Optional[str] = None) -> None:
+    log_run_errors(conn, [(run_id, username, stage, error, utc_now_iso())])
+
+
+def log_run_errors(
+    conn: Any,
+    rows: Sequence[Tuple[int, Optional[str], str, str, str]],
+    commit: bool = True,
+) -> None:
+    if rows:
+        conn.executemany(
+            """
+            INSERT INTO run_errors (run_id, username, stage, error, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [(run_id, username, stage, error[:2000], created_at) for run_id, username, stage, error, created_at in rows],
+        )
+    if commit:
+        conn.commit()
+
+
 def upsert_active_snapshot(conn: Any, snapshot_date: str, usernames: Sequence[str]) -> None:
     inserted_at = utc_now_iso()
     conn.executemany(
@@ -80,6 +638,360 @@ def upsert_active_snapshot(conn: Any, snapshot_date: str, usernames: Sequence[st
     conn.commit()
 
 
+def upsert_country_counts(conn: Any, snapshot_date: str, rows: Sequence[Dict[str, Any]], fetched_at: str) -> None:
+    conn.executemany(
+        """
+        INSERT INTO country_player_counts (snapshot_date, country_code, iso3, country_name, player_count, fetched_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (snapshot_date, country_code) DO UPDATE SET
+            iso3 = excluded.iso3,
+            country_name = excluded.country_name,
+            player_count = excluded.player_count,
+            fetched_at = excluded.fetched_at
+        """,
+        [
+            (snapshot_date, r["country_code"], r["iso3"], r["country_name"], int(r["player_count"]), fetched_at)
+            for r in rows
+        ],
+    )
+    conn.commit()
+
+
+def replace_country_members(conn: Any, snapshot_date: str, country_code: str, usernames: Sequence[str]) -> None:
+    conn.execute(
+        "DELETE FROM country_player_members WHERE snapshot_date = ? AND country_code = ?",
+        (snapshot_date, country_code),
+    )
+    conn.executemany(
+        """
+        INSERT INTO country_player_members (snapshot_date, country_code, username)
+        VALUES (?, ?, ?)
+        ON CONFLICT (snapshot_date, country_code, username) DO NOTHING
+        """,
+        [(snapshot_date, country_code, u) for u in usernames],
+    )
+    conn.commit()
+
+
+def get_country_count_history(conn: Any, since_date: str) -> List[Any]:
+    return conn.execute(
+        """
+        SELECT snapshot_date, country_code, iso3, country_name, player_count
+        FROM country_player_counts
+        WHERE snapshot_date >= ?
+        ORDER BY country_code, snapshot_date
+        """,
+        (since_date,),
+    ).fetchall()
+
+
+_USER_COLUMNS_SQL = """
+    username, joined_at, last_online, first_seen_at, last_seen_active_at,
+    next_refresh_at, refresh_interval_days, change_rate, last_fetched_at, updated_at
+"""
+
+_UPSERT_USER_SQL = """
+INSERT INTO users (
+    username, joined_at, last_online, status, first_seen_at, last_seen_active_at,
+    next_refresh_at, refresh_interval_days, change_rate, last_fetched_at, updated_at
+)
+VALUES (?, ?, ?, 'active', ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(username) DO UPDATE SET
+    joined_at = COALESCE(excluded.joined_at, users.joined_at),
+    last_online = COALESCE(excluded.last_online, users.last_online),
+    status = 'active',
+    last_seen_active_at = CASE WHEN ? THEN excluded.last_seen_active_at ELSE users.last_seen_active_at END,
+    next_refresh_at = excluded.next_refresh_at,
+    refresh_interval_days = excluded.refresh_interval_days,
+    change_rate = excluded.change_rate,
+    last_fetched_at = excluded.last_fetched_at,
+    updated_at = excluded.updated_at
+"""
+
+_STATS_COLUMNS_SQL = """
+    username, total_games, total_daily, total_rapid, total_bullet, total_blitz,
+    daily_rating, rapid_rating, bullet_rating, blitz_rating,
+    highest_puzzle_rating, highest_puzzle_date,
+    daily_wins, daily_losses, daily_draws,
+    rapid_wins, rapid_losses, rapid_draws,
+    bullet_wins, bullet_losses, bullet_draws,
+    blitz_wins, blitz_losses, blitz_draws, record_hash, updated_at
+"""
+
+_STATS_UPDATE_SQL = """
+ON CONFLICT(username) DO UPDATE SET
+    total_games = excluded.total_games,
+    total_daily = excluded.total_daily,
+    total_rapid = excluded.total_rapid,
+    total_bullet = excluded.total_bullet,
+    total_blitz = excluded.total_blitz,
+    daily_rating = excluded.daily_rating,
+    rapid_rating = excluded.rapid_rating,
+    bullet_rating = excluded.bullet_rating,
+    blitz_rating = excluded.blitz_rating,
+    highest_puzzle_rating = excluded.highest_puzzle_rating,
+    highest_puzzle_date = excluded.highest_puzzle_date,
+    daily_wins = excluded.daily_wins,
+    daily_losses = excluded.daily_losses,
+    daily_draws = excluded.daily_draws,
+    rapid_wins = excluded.rapid_wins,
+    rapid_losses = excluded.rapid_losses,
+    rapid_draws = excluded.rapid_draws,
+    bullet_wins = excluded.bullet_wins,
+    bullet_losses = excluded.bullet_losses,
+    bullet_draws = excluded.bullet_draws,
+    blitz_wins = excluded.blitz_wins,
+    blitz_losses = excluded.blitz_losses,
+    blitz_draws = excluded.blitz_draws,
+    record_hash = excluded.record_hash,
+    updated_at = excluded.updated_at
+"""
+
+_UPSERT_STATS_SQL = f"""
+INSERT INTO user_stats_latest ({_STATS_COLUMNS_SQL})
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+{_STATS_UPDATE_SQL}
+"""
+
+_INSERT_HISTORY_SQL = """
+INSERT INTO user_stats_history (
+    username, observed_at, total_games, rapid_rating, blitz_rating, bullet_rating, daily_rating,
+    highest_puzzle_rating
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (username, observed_at) DO UPDATE SET
+    total_games = excluded.total_games,
+    rapid_rating = excluded.rapid_rating,
+    blitz_rating = excluded.blitz_rating,
+    bullet_rating = excluded.bullet_rating,
+    daily_rating = excluded.daily_rating,
+    highest_puzzle_rating = excluded.highest_puzzle_rating
+"""
+
+_TOUCH_USER_SQL = """
+UPDATE users
+SET next_refresh_at = ?,
+    refresh_interval_days = ?,
+    change_rate = ?,
+    last_fetched_at = ?,
+    last_seen_active_at = CASE WHEN ? THEN ? ELSE last_seen_active_at END
+WHERE username = ? AND status = 'active'
+"""
+
+# Archive replays only fill in profile and stats columns; the refresh schedule
+# and history belong to live fetches. updated_at never moves backwards.
+_REPLAY_USER_SQL = """
+INSERT INTO users (username, joined_at, last_online, status, first_seen_at, updated_at)
+VALUES (?, ?, ?, 'active', ?, ?)
+ON CONFLICT(username) DO UPDATE SET
+    joined_at = COALESCE(excluded.joined_at, users.joined_at),
+    last_online = COALESCE(excluded.last_online, users.last_online),
+    updated_at = CASE WHEN users.updated_at > excluded.updated_at THEN users.updated_at ELSE excluded.updated_at END
+"""
+
+_REPLAY_STATS_SQL = _UPSERT_STATS_SQL.replace(
+    "updated_at = excluded.updated_at",
+    "updated_at = CASE WHEN user_stats_latest.updated_at > excluded.updated_at "
+    "THEN user_stats_latest.updated_at ELSE excluded.updated_at END",
+)
+
+# The pipeline stamps updated_at when a batch is written, shortly after the
+# archived fetch, so a replay of that same fetch is not treated as stale.
+REPLAY_WRITE_LAG_SECONDS = 600
+
+# SQLite's default bound-parameter limit is 999.
+_STATE_LOOKUP_CHUNK = 500
+
+_PG_STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS staging_users (
+    username TEXT,
+    joined_at TEXT,
+    last_online TEXT,
+    first_seen_at TEXT,
+    last_seen_active_at TEXT,
+    next_refresh_at TEXT,
+    refresh_interval_days DOUBLE PRECISION,
+    change_rate DOUBLE PRECISION,
+    last_fetched_at TEXT,
+    updated_at TEXT
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS staging_user_stats (LIKE user_stats_latest) ON COMMIT DELETE ROWS;
+DELETE FROM staging_users;
+DELETE FROM staging_user_stats
+"""
+
+# last_seen_active_at is only non-NULL in staging for users seen in the active
+# list, so COALESCE matches the CASE in _UPSERT_USER_SQL.
+_PG_MERGE_USERS_SQL = """
+INSERT INTO users (
+    username, joined_at, last_online, status, first_seen_at, last_seen_active_at,
+    next_refresh_at, refresh_interval_days, change_rate, last_fetched_at, updated_at
+)
+SELECT
+    username, joined_at, last_online, 'active', first_seen_at, last_seen_active_at,
+    next_refresh_at, refresh_interval_days, change_rate, last_fetched_at, updated_at
+FROM staging_users
+ON CONFLICT(username) DO UPDATE SET
+    joined_at = COALESCE(excluded.joined_at, users.joined_at),
+    last_online = COALESCE(excluded.last_online, users.last_online),
+    status = 'active',
+    last_seen_active_at = COALESCE(excluded.last_seen_active_at, users.last_seen_active_at),
+    next_refresh_at = excluded.next_refresh_at,
+    refresh_interval_days = excluded.refresh_interval_days,
+    change_rate = excluded.change_rate,
+    last_fetched_at = excluded.last_fetched_at,
+    updated_at = excluded.updated_at
+"""
+
+_PG_MERGE_STATS_SQL = f"""
+INSERT INTO user_stats_latest ({_STATS_COLUMNS_SQL})
+SELECT {_STATS_COLUMNS_SQL}
+FROM staging_user_stats
+{_STATS_UPDATE_SQL}
+"""
+
+
+# Re-derives active_player_stats rows from the base tables after they were
+# written, so COALESCEd profile fields match users exactly.
+_SYNC_ACTIVE_STATS_SQL = f"""
+INSERT INTO active_player_stats (username, {", ".join(ACTIVE_PLAYER_STATS_COLUMNS)})
+{ACTIVE_PLAYER_STATS_SELECT_SQL.strip()}
+  AND u.username IN ({{usernames}})
+ON CONFLICT(username) DO UPDATE SET
+    {", ".join(f"{column} = excluded.{column}" for column in ACTIVE_PLAYER_STATS_COLUMNS)}
+"""
+
+def _to_int(value: Any) -> int:
+    return int(value or 0)
+
+
+def _optional_int(value: Any) -> Optional[int]:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return int(value)
+
+
+def _user_params(
+    username: str,
+    record: Dict,
+    seen_in_active: bool,
+    schedule: Tuple[float, float],
+    now: str,
+) -> Tuple:
+    interval, rate = schedule
+    return (
+        username,
+        record.get("join_date"),
+        record.get("last_online"),
+        now,
+        now if seen_in_active else None,
+        _iso_after(interval),
+        interval,
+        rate,
+        now,
+        now,
+        seen_in_active,
+    )
+
+
+def _stats_values(record: Dict) -> Tuple:
+    return (
+        _to_int(record.get("total_games", 0)),
+        _to_int(record.get("total_daily", 0)),
+        _to_int(record.get("total_rapid", 0)),
+        _to_int(record.get("total_bullet", 0)),
+        _to_int(record.get("total_blitz", 0)),
+        _to_int(record.get("daily_rating", 0)),
+        _to_int(record.get("rapid_rating", 0)),
+        _to_int(record.get("bullet_rating", 0)),
+        _to_int(record.get("blitz_rating", 0)),
+        _optional_int(record.get("highest_puzzle_rating")),
+        record.get("highest_puzzle_date"),
+        _to_int(record.get("daily_wins", 0)),
+        _to_int(record.get("daily_losses", 0)),
+        _to_int(record.get("daily_draws", 0)),
+        _to_int(record.get("rapid_wins", 0)),
+        _to_int(record.get("rapid_losses", 0)),
+        _to_int(record.get("rapid_draws", 0)),
+        _to_int(record.get("bullet_wins", 0)),
+        _to_int(record.get("bullet_losses", 0)),
+        _to_int(record.get("bullet_draws", 0)),
+        _to_int(record.get("blitz_wins", 0)),
+        _to_int(record.get("blitz_losses", 0)),
+        _to_int(record.get("blitz_draws", 0)),
+    )
+
+
+def _record_hash(record: Dict, stats_values: Tuple) -> str:
+    # Fingerprint of everything the upsert writes, after normalisation, so a CSV
+    # float and an API int for the same value hash alike.
+    payload = [record.get("join_date"), record.get("last_online"), *stats_values]
+    return hashlib.sha1(json.dumps(payload, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def _stats_params(username: str, record: Dict, now: str) -> Tuple:
+    values = _stats_values(record)
+    return (username, *values, _record_hash(record, values), now)
+
+
+def _history_params(stats_row: Tuple, observed_at: int) -> Tuple:
+    # stats_row is _stats_params output: username, then _stats_values in column order.
+    username, total_games = stats_row[0], stats_row[1]
+    daily, rapid, bullet, blitz, puzzle = stats_row[6:11]
+    return (username, observed_at, total_games, rapid, blitz, bullet, daily, puzzle)
+
+
+def _history_changed(state: Any, history_row: Tuple) -> bool:
+    # The record hash also covers join_date and last_online, so a login without
+    # new games changes it; history only tracks games and ratings.
+    if state is None:
+        return True
+    stored = (
+        state["total_games"],
+        state["rapid_rating"],
+        state["blitz_rating"],
+        state["bullet_rating"],
+        state["daily_rating"],
+        state["highest_puzzle_rating"],
+    )
+    return stored != history_row[2:]
+
+
+def _touch_params(username: str, seen_in_active: bool, schedule: Tuple[float, float], now: str) -> Tuple:
+    interval, rate = schedule
+    return (_iso_after(interval), interval, rate, now, seen_in_active, now, username)
+
+
+def _sync_active_player_stats(conn: Any, usernames: Sequence[str]) -> None:
+    if getattr(conn, "backend", "sqlite") == "postgres":
+        conn.execute(_SYNC_ACTIVE_STATS_SQL.format(usernames="SELECT username FROM staging_users"))
+        return
+    for start in range(0, len(usernames), _STATE_LOOKUP_CHUNK):
+        chunk = usernames[start : start + _STATE_LOOKUP_CHUNK]
+        conn.execute(_SYNC_ACTIVE_STATS_SQL.format(usernames=", ".join("?" for _ in chunk)), tuple(chunk))
+
+
+def _stored_user_state(conn: Any, usernames: Sequence[str]) -> Dict[str, Any]:
+    states: Dict[str, Any] = {}
+    for start in range(0, len(usernames), _STATE_LOOKUP_CHUNK):
+        chunk = usernames[start : start + _STATE_LOOKUP_CHUNK]
+        placeholders = ", ".join("?" for _ in chunk)
+        rows = conn.execute(
+            f"""
+            SELECT u.username, u.status, u.refresh_interval_days, u.change_rate, s.record_hash,
+                   s.updated_at AS stats_updated_at, s.total_games, s.rapid_rating, s.blitz_rating,
+                   s.bullet_rating, s.daily_rating, s.highest_puzzle_rating
+            FROM users u
+            LEFT JOIN user_stats_latest s ON s.username = u.username
+            WHERE u.username IN ({placeholders})
+            """,
+            tuple(chunk),
+        ).fetchall()
+        for row in rows:
+            states[str(row["username"])] = row
+    return states
+
+
 def upsert_user_and_stats(
     conn: Any,
     username: str,
@@ -87,119 +999,215 @@ def upsert_user_and_stats(
     seen_in_active: bool,
     commit: bool = True,
 ) -> None:
+    upsert_users_and_stats_many(conn, [(username, record, seen_in_active)], commit=commit)
+
+
+def upsert_users_and_stats_many(
+    conn: Any,
+    records: Iterable[Tuple[str, Dict, bool]],
+    commit: bool = True,
+    record_history: bool = True,
+) -> Tuple[int, int]:
+    # Bulk loaders without a real observation time (the CSV bootstrap) pass
+    # record_history=False rather than stamping every row with the load time.
+    # A username may only appear once per merge statement; the last record wins,
+    # as it would with repeated single-row upserts.
+    latest: Dict[str, Tuple[Dict, bool]] = {}
+    for username, record, seen_in_active in records:
+        latest[username] = (record, seen_in_active)
+    if not latest:
+        return 0, 0
+
     now = utc_now_iso()
-    next_refresh_days = 7 if seen_in_active else 30
-    next_refresh_at = _iso_after(next_refresh_days)
+    observed_at = int(time.time())
+    stored = _stored_user_state(conn, list(latest))
+    user_rows: List[Tuple] = []
+    stats_rows: List[Tuple] = []
+    history_rows: List[Tuple] = []
+    touch_rows: List[Tuple] = []
+    for username, (record, seen_in_active) in latest.items():
+        stats_row = _stats_params(username, record, now)
+        state = stored.get(username)
+        if state is None:
+            schedule = _schedule_refresh(None, None, True, seen_in_active)
+        else:
+            unchanged = state["status"] == "active" and state["record_hash"] == stats_row[-2]
+            schedule = _schedule_refresh(
+                state["refresh_interval_days"],
+                state["change_rate"],
+                not unchanged,
+                seen_in_active,
+            )
+            if unchanged:
+                touch_rows.append(_touch_params(username, seen_in_active, schedule, now))
+                continue
+        user_rows.append(_user_params(username, record, seen_in_active, schedule, now))
+        stats_rows.append(stats_row)
+        history_row = _history_params(stats_row, observed_at)
+        if record_history and _history_changed(state, history_row):
+            history_rows.append(history_row)
 
-    conn.execute(
-        """
-        INSERT INTO users (username, joined_at, last_online, status, first_seen_at, last_seen_active_at, next_refresh_at, updated_at)
-        VALUES (?, ?, ?, 'active', ?, ?, ?, ?)
-        ON CONFLICT(username) DO UPDATE SET
-            joined_at = COALESCE(excluded.joined_at, users.joined_at),
-            last_online = COALESCE(excluded.last_online, users.last_online),
-            status = 'active',
-            last_seen_active_at = CASE WHEN ? THEN excluded.last_seen_active_at ELSE users.last_seen_active_at END,
-            next_refresh_at = excluded.next_refresh_at,
-            updated_at = excluded.updated_at
-        """,
-        (
-            username,
-            record.get("join_date"),
-            record.get("last_online"),
-            now,
-            now if seen_in_active else None,
-            next_refresh_at,
-            now,
-            seen_in_active,
-        ),
-    )
+    if touch_rows:
+        conn.executemany(_TOUCH_USER_SQL, touch_rows)
+    if not user_rows:
+        if commit:
+            conn.commit()
+        return 0, len(touch_rows)
 
-    conn.execute(
-        """
-        INSERT INTO user_stats_latest (
-            username, total_games, total_daily, total_rapid, total_bullet, total_blitz,
-            daily_rating, rapid_rating, bullet_rating, blitz_rating,
-            highest_puzzle_rating, highest_puzzle_date,
-            daily_wins, daily_losses, daily_draws,
-            rapid_wins, rapid_losses, rapid_draws,
-            bullet_wins, bullet_losses, bullet_draws,
-            blitz_wins, blitz_losses, blitz_draws, updated_at
-        ) VALUES (
-            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+    if history_rows:
+        conn.executemany(_INSERT_HISTORY_SQL, history_rows)
+    if getattr(conn, "backend", "sqlite") == "postgres":
+        conn.executescript(_PG_STAGING_SQL)
+        conn.copy_rows(
+            f"COPY staging_users ({_USER_COLUMNS_SQL}) FROM STDIN",
+            (row[:-1] for row in user_rows),
         )
-        ON CONFLICT(username) DO UPDATE SET
-            total_games = excluded.total_games,
-            total_daily = excluded.total_daily,
-            total_rapid = excluded.total_rapid,
-            total_bullet = excluded.total_bullet,
-            total_blitz = excluded.total_blitz,
-            daily_rating = excluded.daily_rating,
-            rapid_rating = excluded.rapid_rating,
-            bullet_rating = excluded.bullet_rating,
-            blitz_rating = excluded.blitz_rating,
-            highest_puzzle_rating = excluded.highest_puzzle_rating,
-            highest_puzzle_date = excluded.highest_puzzle_date,
-            daily_wins = excluded.daily_wins,
-            daily_losses = excluded.daily_losses,
-            daily_draws = excluded.daily_draws,
-            rapid_wins = excluded.rapid_wins,
-            rapid_losses = excluded.rapid_losses,
-            rapid_draws = excluded.rapid_draws,
-            bullet_wins = excluded.bullet_wins,
-            bullet_losses = excluded.bullet_losses,
-            bullet_draws = excluded.bullet_draws,
-            blitz_wins = excluded.blitz_wins,
-            blitz_losses = excluded.blitz_losses,
-            blitz_draws = excluded.blitz_draws,
-            updated_at = excluded.updated_at
-        """,
-        (
-            username,
-            int(record.get("total_games", 0) or 0),
-            int(record.get("total_daily", 0) or 0),
-            int(record.get("total_rapid", 0) or 0),
-            int(record.get("total_bullet", 0) or 0),
-            int(record.get("total_blitz", 0) or 0),
-            int(record.get("daily_rating", 0) or 0),
-            int(record.get("rapid_rating", 0) or 0),
-            int(record.get("bullet_rating", 0) or 0),
-            int(record.get("blitz_rating", 0) or 0),
-            record.get("highest_puzzle_rating"),
-            record.get("highest_puzzle_date"),
-            int(record.get("daily_wins", 0) or 0),
-            int(record.get("daily_losses", 0) or 0),
-            int(record.get("daily_draws", 0) or 0),
-            int(record.get("rapid_wins", 0) or 0),
-            int(record.get("rapid_losses", 0) or 0),
-            int(record.get("rapid_draws", 0) or 0),
-            int(record.get("bullet_wins", 0) or 0),
-            int(record.get("bullet_losses", 0) or 0),
-            int(record.get("bullet_draws", 0) or 0),
-            int(record.get("blitz_wins", 0) or 0),
-            int(record.get("blitz_losses", 0) or 0),
-            int(record.get("blitz_draws", 0) or 0),
-            now,
-        ),
-    )
+        conn.copy_rows(f"COPY staging_user_stats ({_STATS_COLUMNS_SQL}) FROM STDIN", stats_rows)
+        conn.execute(_PG_MERGE_USERS_SQL)
+        conn.execute(_PG_MERGE_STATS_SQL)
+    else:
+        conn.executemany(_UPSERT_USER_SQL, user_rows)
+        conn.executemany(_UPSERT_STATS_SQL, stats_rows)
+    _sync_active_player_stats(conn, [row[0] for row in user_rows])
+    if commit:
+        conn.commit()
+    return len(user_rows), len(touch_rows)
+
+
+def replay_users_and_stats_many(
+    conn: Any,
+    records: Iterable[Tuple[str, Dict, int]],
+    commit: bool = True,
+) -> Tuple[int, int]:
+    # records are (username, record, fetched_at epoch) rebuilt from archived
+    # payloads. Returns (rows changed, records skipped as stale).
+    latest: Dict[str, Tuple[Dict, int]] = {}
+    for username, record, fetched_at in records:
+        if username not in latest or fetched_at >= latest[username][1]:
+            latest[username] = (record, fetched_at)
+    if not latest:
+        return 0, 0
+
+    stored = _stored_user_state(conn, list(latest))
+    user_rows: List[Tuple] = []
+    stats_rows: List[Tuple] = []
+    stale = 0
+    for username, (record, fetched_at) in latest.items():
+        observed = datetime.fromtimestamp(fetched_at, tz=timezone.utc)
+        stats_row = _stats_params(username, record, observed.isoformat())
+        state = stored.get(username)
+        if state is not None:
+            # A replay must not bring back a deleted account.
+            if state["status"] != "active":
+                continue
+            if state["stats_updated_at"]:
+                stored_at = datetime.fromisoformat(str(state["stats_updated_at"]))
+                if observed < stored_at - timedelta(seconds=REPLAY_WRITE_LAG_SECONDS):
+                    stale += 1
+                    continue
+            if state["record_hash"] == stats_row[-2]:
+                continue
+        user_rows.append(
+            (username, record.get("join_date"), record.get("last_online"), observed.isoformat(), observed.isoformat())
+        )
+        stats_rows.append(stats_row)
+
+    if user_rows:
+        conn.executemany(_REPLAY_USER_SQL, user_rows)
+        conn.executemany(_REPLAY_STATS_SQL, stats_rows)
+        usernames = [row[0] for row in user_rows]
+        if getattr(conn, "backend", "sqlite") == "postgres":
+            conn.executescript(_PG_STAGING_SQL)
+            conn.copy_rows("COPY staging_users (username) FROM STDIN", ((u,) for u in usernames))
+        _sync_active_player_stats(conn, usernames)
+    if commit:
+        conn.commit()
+    return len(user_rows), stale
+
+
+def reschedule_unchanged_users(
+    conn: Any,
+    entries: Iterable[Tuple[str, bool]],
+    commit: bool = True,
+) -> int:
+    # For users known to be unchanged without a full record (e.g. stats not
+    # refetched), apply the "unchanged" step of the schedule only.
+    latest = dict(entries)
+    if not latest:
+        return 0
+    now = utc_now_iso()
+    stored = _stored_user_state(conn, list(latest))
+    touch_rows: List[Tuple] = []
+    for username, seen_in_active in latest.items():
+        state = stored.get(username)
+        if state is None or state["status"] != "active":
+            continue
+        schedule = _schedule_refresh(state["refresh_interval_days"], state["change_rate"], False, seen_in_active)
+        touch_rows.append(_touch_params(username, seen_in_active, schedule, now))
+    if touch_rows:
+        conn.executemany(_TOUCH_USER_SQL, touch_rows)
     if commit:
         conn.commit()
+    return len(touch_rows)
+
+
+def get_player_history(conn: Any, username: str, since_epoch: int) -> List[Any]:
+    return conn.execute(
+        """
+        SELECT observed_at, total_games, rapid_rating, blitz_rating, bullet_rating, daily_rating,
+               highest_puzzle_rating
+        FROM user_stats_history
+        WHERE username = ? AND observed_at >= ?
+        ORDER BY observed_at
+        """,
+        (username, since_epoch),
+    ).fetchall()
+
+
+def get_known_last_online(conn: Any, usernames: Sequence[str]) -> Dict[str, str]:
+    known: Dict[str, str] = {}
+    for start in range(0, len(usernames), _STATE_LOOKUP_CHUNK):
+        chunk = usernames[start : start + _STATE_LOOKUP_CHUNK]
+        placeholders = ", ".join("?" for _ in chunk)
+        rows = conn.execute(
+            f"""
+            SELECT username, last_online
+            FROM active_player_stats
+            WHERE last_online IS NOT NULL
+              AND username IN ({placeholders})
+            """,
+            tuple(chunk),
+        ).fetchall()
+        for row in rows:
+            known[str(row["username"])] = str(row["last_online"])
+    return known
 
 
 def mark_user_deleted(conn: Any, username: str, commit: bool = True) -> None:
+    # Usernames that 404 on their first fetch get a deleted row too, so the
+    # diff sweep knows they were already checked today.
+    now = utc_now_iso()
     conn.execute(
         """
-        UPDATE users
-        SET status = 'deleted', next_refresh_at = NULL, updated_at = ?
-        WHERE username = ?
+        INSERT INTO users (username, status, first_seen_at, last_fetched_at, updated_at)
+        VALUES (?, 'deleted', ?, ?, ?)
+        ON CONFLICT(username) DO UPDATE SET
+            status = 'deleted',
+            next_refresh_at = NULL,
+            last_fetched_at = excluded.last_fetched_at,
+            updated_at = excluded.updated_at
         """,
-        (utc_now_iso(), username),
+        (username, now, now, now),
     )
+    conn.execute("DELETE FROM active_player_stats WHERE username = ?", (username,))
     if commit:
         conn.commit()
 
 
-def get_refresh_candidates(conn: Any, snapshot_date: str, limit: int) -> List[str]:
+def get_refresh_candidates(conn: Any, limit: int, exclude_run_id: Optional[int] = None) -> List[str]:
+    # Users fetched earlier in the run were just rescheduled, so they are not due.
+    # exclude_run_id also skips users already queued in that run's refresh phase,
+    # e.g. ones whose fetch failed and so were not rescheduled.
     rows = conn.execute(
         """
         SELECT u.username
@@ -208,18 +1216,53 @@ def get_refresh_candidates(conn: Any, snapshot_date: str, limit: int) -> List[st
           AND (u.next_refresh_at IS NULL OR u.next_refresh_at <= ?)
           AND NOT EXISTS (
               SELECT 1
-              FROM country_active_snapshots s
-              WHERE s.snapshot_date = ?
-                AND s.username = u.username
+              FROM pipeline_work_items w
+              WHERE w.run_id = ? AND w.phase = 'refresh' AND w.username = u.username
           )
-        ORDER BY COALESCE(u.last_online, '1970-01-01T00:00:00+00:00') DESC
+        ORDER BY COALESCE(u.next_refresh_at, ''), COALESCE(u.change_rate, 1.0) DESC,
+                 COALESCE(u.last_online, '1970-01-01T00:00:00+00:00') DESC
         LIMIT ?
         """,
-        (utc_now_iso(), snapshot_date, limit),
+        (utc_now_iso(), exclude_run_id, limit),
     ).fetchall()
     return [str(row["username"]) for row in rows]
 
 
+# board -> (score column, min_games column) on active_player_stats.
+LEADERBOARD_COLUMNS = {
+    "rapid": ("rapid_rating", "total_rapid"),
+    "blitz": ("blitz_rating", "total_blitz"),
+    "bullet": ("bullet_rating", "total_bullet"),
+    "daily": ("daily_rating", "total_daily"),
+    "puzzle": ("highest_puzzle_rating", "total_games"),
+    "games": ("total_games", "total_games"),
+}
+
+
+def leaderboard_sql(board: str) -> str:
+    # "score > 0" must match the idx_board_* WHERE clause verbatim for SQLite to
+    # pick the partial index; the score columns are never negative, so it is
+    # the old COALESCE(score, 0) > 0 filter.
+    rating_col, games_col = LEADERBOARD_COLUMNS[board]
+    return f"""
+        SELECT
+            s.username,
+            s.{rating_col} AS score,
+            s.{games_col} AS games,
+            s.rapid_rating, s.blitz_rating, s.bullet_rating, s.daily_rating,
+            s.highest_puzzle_rating, s.total_games
+        FROM active_player_stats s
+        WHERE s.{rating_col} > 0
+          AND s.{games_col} >= ?
+        ORDER BY score DESC
+        LIMIT ?
+    """
+
+
+def get_leaderboard(conn: Any, board: str, min_games: int, limit: int) -> List[Any]:
+    return conn.execute(leaderboard_sql(board), (min_games, limit)).fetchall()
+
+
 def query_one(conn: Any, sql: str, params: Tuple = ()) -> Optional[Any]:
     row = conn.execute(sql, params).fetchone()
     return row
@@ -0,0 +1,189 @@
+import argparse
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from chesske_platform.chesske.config import Settings
+from chesske_platform.chesske.db import get_conn
+from chesske_platform.chesske.metrics import RunMetrics, summarize_run_metrics
+from chesske_platform.chesske.pipeline import run_ingestion_pipeline
+from chesske_platform.chesske.repository import get_run_metrics
+
+
+STUB_SCRIPT = Path(__file__).resolve().parent / "chesscom_stub_server.py"
+STUB_OPTIONS = ("players", "latency_ms", "latency_sigma", "not_found_rate", "throttle_rate", "throttle_burst", "etag")
+
+
+class SamplingMetrics(RunMetrics):
+    # Keeps every request latency so percentiles are exact instead of read off
+    # the histogram buckets stored in pipeline_run_metrics.
+    def __init__(self):
+        super().__init__()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def record_request(self, kind: str, seconds: float, status: str) -> None:
+        super().record_request(kind, seconds, status)
+        self.samples[kind].append(seconds)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if len(samples) < 2:
+        value = round(samples[0] * 1000, 1) if samples else None
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49] * 1000, 1),
+        "p95_ms": round(cuts[94] * 1000, 1),
+        "p99_ms": round(cuts[98] * 1000, 1),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def _start_stub(args: argparse.Namespace) -> subprocess.Popen:
+    command = [sys.executable, str(STUB_SCRIPT), "--port", str(args.stub_port)]
+    for option in STUB_OPTIONS:
+        command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    stub = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    print(stub.stdout.readline().strip())
+    return stub
+
+
+def run_benchmark(base_settings: Settings, concurrency: int) -> Dict[str, object]:
+    # Runs in a fresh process per setting so the shared rate limiter and
+    # response cache start cold every time.
+    with tempfile.TemporaryDirectory(prefix="chesske-bench-") as tmp:
+        settings = replace(
+            base_settings,
+            db_path=Path(tmp) / "bench.db",
+            http_cache_path=Path(tmp) / "http_cache.db",
+            pipeline_mode="sequential" if concurrency <= 1 else "concurrent",
+            max_concurrency=max(1, concurrency),
+        )
+        metrics = SamplingMetrics()
+        started = time.monotonic()
+        summary = run_ingestion_pipeline(settings, metrics=metrics)
+        elapsed = time.monotonic() - started
+        with get_conn(settings) as conn:
+            phases = summarize_run_metrics(get_run_metrics(conn, int(summary["run_id"])))
+
+    active = phases.get("active", {})
+    return {
+        "concurrency": concurrency,
+        "mode": settings.pipeline_mode,
+        "users": active.get("users", 0),
+        "users_per_second": active.get("users_per_second"),
+        "elapsed_seconds": round(elapsed, 2),
+        "requests": {
+            kind: {
+                "count": len(samples),
+                "retries": active.get("requests", {}).get(kind, {}).get("retries", 0),
+                **_percentiles(samples),
+            }
+            for kind, samples in sorted(metrics.samples.items())
+        },
+        "time_seconds": active.get("time_seconds", {}),
+    }
+
+
+def _print_report(results: List[Dict[str, object]]) -> None:
+    print()
+    print(f"{'conc':>5} {'mode':<11} {'users':>6} {'users/s':>8} {'kind':<8} {'reqs':>6} {'retry':>5} {'p50ms':>7} {'p95ms':>7} {'p99ms':>7}")
+    for result in results:
+        first = True
+        for kind, request in result["requests"].items():
+            prefix = (
+                f"{result['concurrency']:>5} {result['mode']:<11} {result['users']:>6} {result['users_per_second'] or 0:>8.1f}"
+                if first
+                else " " * 33
+            )
+            print(
+                f"{prefix} {kind:<8} {request['count']:>6} {request['retries']:>5} "
+                f"{request['p50_ms'] or 0:>7.1f} {request['p95_ms'] or 0:>7.1f} {request['p99_ms'] or 0:>7.1f}"
+            )
+            first = False
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion pipeline against a local Chess.com stub.")
+    parser.add_argument(
+        "--concurrency",
+        default="1,4,16,32",
+        help="Comma-separated concurrency levels; 1 runs the sequential pipeline.",
+    )
+    parser.add_argument(
+        "--api-base",
+        default=None,
+        help="Use an already running stub (e.g. http://127.0.0.1:8765/pub) instead of starting one.",
+    )
+    parser.add_argument("--stub-port", type=int, default=0, help="Port for the spawned stub (0 = any free port).")
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--not-found-rate", type=float, default=0.05)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-burst", type=int, default=5)
+    parser.add_argument("--etag", choices=("strong", "weak", "off"), default="strong")
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=1000.0,
+        help="Client token bucket rate; keep it high to measure the pipeline rather than the limiter.",
+    )
+    parser.add_argument("--http-cache", action="store_true", help="Keep the client response cache enabled.")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    stub: Optional[subprocess.Popen] = None
+    if args.api_base:
+        api_base = args.api_base.rstrip("/")
+    else:
+        args.stub_port = args.stub_port or _free_port()
+        stub = _start_stub(args)
+        api_base = f"http://127.0.0.1:{args.stub_port}/pub"
+
+    base_settings = replace(
+        Settings(),
+        chesscom_api_base=api_base,
+        http_cache_enabled=args.http_cache,
+        rate_limit_per_second=args.rate_limit,
+        rate_limit_max_per_second=args.rate_limit,
+        rate_limit_burst=max(1, int(args.rate_limit)),
+        active_sweep="full",
+        refresh_limit=0,
+        pipeline_resume=False,
+    )
+    results: List[Dict[str, object]] = []
+    try:
+        for level in levels:
+            print(f"Running concurrency {level}...")
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                results.append(pool.submit(run_benchmark, base_settings, level).result())
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.wait(timeout=10)
+
+    _print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ import pandas as pd
 from chesske_platform.chesske.analytics import refresh_cached_analytics
 from chesske_platform.chesske.config import Settings
 from chesske_platform.chesske.db import get_conn, init_db, utc_now_iso
-from chesske_platform.chesske.repository import upsert_user_and_stats
+from chesske_platform.chesske.repository import upsert_users_and_stats_many
 
 
 COLUMN_ALIASES = {
@@ -87,6 +87,15 @@ def _to_iso(value):
     return parsed.to_pydatetime().isoformat()
 
 
+def _to_iso_series(values: pd.Series) -> pd.Series:
+    parsed = pd.to_datetime(values, errors="coerce", utc=True, format="mixed")
+    return pd.Series(
+        [None if pd.isna(ts) else ts.to_pydatetime().isoformat() for ts in parsed],
+        index=values.index,
+        dtype=object,
+    )
+
+
 def _iter_clean_chunks(csv_path: str, limit: Optional[int], chunk_size: int = 5000) -> Iterable[pd.DataFrame]:
     yielded = 0
     for chunk in pd.read_csv(csv_path, low_memory=False, chunksize=chunk_size):
@@ -161,22 +170,26 @@ def bootstrap_from_csv(
             conn.executescript(
                 """
                 DELETE FROM run_errors;
+                DELETE FROM pipeline_work_items;
+                DELETE FROM pipeline_run_metrics;
+                DELETE FROM pipeline_sweeps;
                 DELETE FROM pipeline_runs;
                 DELETE FROM country_active_snapshots;
+                DELETE FROM active_player_stats;
                 DELETE FROM user_stats_latest;
+                DELETE FROM user_stats_history;
                 DELETE FROM users;
                 """
             )
             conn.commit()
-        if getattr(conn, "backend", "sqlite") == "sqlite":
-            conn.execute("PRAGMA journal_mode = WAL")
-            conn.execute("PRAGMA synchronous = NORMAL")
-        conn.execute("BEGIN")
         for df in _iter_clean_chunks(csv_path, limit):
+            for col in ("join_date", "last_online", "highest_puzzle_date"):
+                df[col] = _to_iso_series(df[col])
+            records = []
             for row in df.itertuples(index=False):
                 record = {
-                    "join_date": _to_iso(getattr(row, "join_date", None)),
-                    "last_online": _to_iso(getattr(row, "last_online", None)),
+                    "join_date": getattr(row, "join_date", None),
+                    "last_online": getattr(row, "last_online", None),
                     "total_games": getattr(row, "total_games", None),
                     "total_daily": getattr(row, "total_daily", None),
                     "total_rapid": getattr(row, "total_rapid", None),
@@ -187,7 +200,7 @@ def bootstrap_from_csv(
                     "bullet_rating": getattr(row, "bullet_rating", None),
                     "blitz_rating": getattr(row, "blitz_rating", None),
                     "highest_puzzle_rating": getattr(row, "highest_puzzle_rating", None),
-                    "highest_puzzle_date": _to_iso(getattr(row, "highest_puzzle_date", None)),
+                    "highest_puzzle_date": getattr(row, "highest_puzzle_date", None),
                     "daily_wins": getattr(row, "daily_wins", None),
                     "daily_losses": getattr(row, "daily_losses", None),
                     "daily_draws": getattr(row, "daily_draws", None),
@@ -201,13 +214,14 @@ def bootstrap_from_csv(
                     "blitz_losses": getattr(row, "blitz_losses", None),
                     "blitz_draws": getattr(row, "blitz_draws", None),
                 }
-                upsert_user_and_stats(conn, getattr(row, "username"), record, seen_in_active=False, commit=False)
-                loaded += 1
-                if loaded % 2000 == 0:
-                    conn.commit()
-                    conn.execute("BEGIN")
-                if loaded % 10000 == 0:
-                    print(f"Loaded {loaded} users...")
+                records.append((getattr(row, "username"), record, False))
+            conn.execute("BEGIN")
+            upsert_users_and_stats_many(conn, records, commit=False, record_history=False)
+            conn.commit()
+            previous = loaded
+            loaded += len(records)
+            if loaded // 10000 > previous // 10000:
+                print(f"Loaded {loaded} users...")
         snapshot_date = datetime.now(timezone.utc).date().isoformat()
         inserted_at = utc_now_iso()
         conn.execute(
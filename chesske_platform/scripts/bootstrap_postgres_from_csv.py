@@ -7,6 +7,7 @@ import psycopg
 
 from chesske_platform.chesske.analytics import refresh_cached_analytics
 from chesske_platform.chesske.config import Settings
+from chesske_platform.chesske.db import LEADERBOARD_INDEXES_SQL, DBConn, init_db, rebuild_active_player_stats
 from chesske_platform.scripts.bootstrap_from_master_csv import _iter_clean_chunks, _to_iso
 
 import pandas as pd
@@ -35,6 +36,41 @@ CREATE TABLE IF NOT EXISTS run_errors (
     created_at TEXT NOT NULL
 );
 
+CREATE TABLE IF NOT EXISTS pipeline_work_items (
+    run_id BIGINT NOT NULL REFERENCES pipeline_runs(id) ON DELETE CASCADE,
+    phase TEXT NOT NULL,
+    username TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    lease_owner TEXT,
+    lease_expires_at TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, phase, username)
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_run_metrics (
+    run_id BIGINT NOT NULL REFERENCES pipeline_runs(id) ON DELETE CASCADE,
+    phase TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    label TEXT NOT NULL DEFAULT '',
+    value DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, phase, metric, label)
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_sweeps (
+    name TEXT PRIMARY KEY,
+    pass_number INTEGER NOT NULL DEFAULT 1,
+    pass_started_at TEXT,
+    cursor_username TEXT,
+    budget_date TEXT,
+    budget_used INTEGER NOT NULL DEFAULT 0,
+    last_run_id BIGINT,
+    last_completed_at TEXT,
+    updated_at TEXT NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS users (
     username TEXT PRIMARY KEY,
     joined_at TEXT,
@@ -43,6 +79,9 @@ CREATE TABLE IF NOT EXISTS users (
     first_seen_at TEXT NOT NULL,
     last_seen_active_at TEXT,
     next_refresh_at TEXT,
+    refresh_interval_days DOUBLE PRECISION,
+    change_rate DOUBLE PRECISION,
+    last_fetched_at TEXT,
     updated_at TEXT NOT NULL
 );
 
@@ -71,6 +110,7 @@ CREATE TABLE IF NOT EXISTS user_stats_latest (
     blitz_wins INTEGER NOT NULL DEFAULT 0,
     blitz_losses INTEGER NOT NULL DEFAULT 0,
     blitz_draws INTEGER NOT NULL DEFAULT 0,
+    record_hash TEXT,
     updated_at TEXT NOT NULL
 );
 
@@ -85,7 +125,7 @@ CREATE INDEX IF NOT EXISTS idx_users_status ON users(status);
 CREATE INDEX IF NOT EXISTS idx_users_next_refresh ON users(next_refresh_at);
 CREATE INDEX IF NOT EXISTS idx_users_last_online ON users(last_online);
 CREATE INDEX IF NOT EXISTS idx_active_snapshot_date ON country_active_snapshots(snapshot_date);
-"""
+""" + LEADERBOARD_INDEXES_SQL
 
 
 def _utc_now_iso() -> str:
@@ -103,11 +143,14 @@ def _to_int(value: object) -> int:
 
 def bootstrap_postgres(database_url: str, csv_path: str, limit: Optional[int], reset: bool) -> int:
     loaded = 0
+    # init_db adds the generated time-key columns, their indexes and
+    # active_player_stats, which the analytics refresh at the end relies on.
+    init_db(Settings(database_url=database_url))
     with psycopg.connect(database_url, autocommit=False) as conn:
         with conn.cursor() as cur:
             cur.execute(SCHEMA_SQL)
             if reset:
-                cur.execute("TRUNCATE run_errors, pipeline_runs, country_active_snapshots, user_stats_latest, users")
+                cur.execute("TRUNCATE run_errors, pipeline_work_items, pipeline_run_metrics, pipeline_sweeps, pipeline_runs, country_active_snapshots, active_player_stats, user_stats_latest, users")
 
             now = _utc_now_iso()
             for idx, chunk in enumerate(_iter_clean_chunks(csv_path, limit, chunk_size=2000), start=1):
@@ -217,6 +260,8 @@ def bootstrap_postgres(database_url: str, csv_path: str, limit: Optional[int], r
                 if idx % 5 == 0:
                     print(f"Processed {loaded} rows")
 
+            # The loop above writes users and user_stats_latest directly.
+            rebuild_active_player_stats(DBConn(conn, "postgres"))
             snapshot_date = datetime.now(timezone.utc).date().isoformat()
             inserted_at = _utc_now_iso()
             cur.execute(
@@ -0,0 +1,76 @@
+import argparse
+from typing import Any, Dict, Iterator, List, Tuple
+
+from chesske_platform.chesske.config import Settings
+from chesske_platform.chesske.db import get_conn, init_db
+from chesske_platform.chesske.repository import LEADERBOARD_COLUMNS, leaderboard_sql
+
+
+# (min_games, limit) pairs covering the API defaults and bounds.
+VARIANTS = [(0, 20), (50, 20), (0, 200), (50, 200)]
+
+
+def _pg_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _pg_nodes(child)
+
+
+def _check_sqlite(conn, board: str, min_games: int, limit: int) -> Tuple[bool, str]:
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {leaderboard_sql(board)}", (min_games, limit)).fetchall()
+    details = [str(row["detail"]) for row in rows]
+    ok = (
+        any(f"USING COVERING INDEX idx_board_{board} " in f"{d} " for d in details)
+        and not any("TEMP B-TREE" in d for d in details)
+    )
+    return ok, "; ".join(details)
+
+
+def _check_postgres(conn, board: str, min_games: int, limit: int) -> Tuple[bool, str]:
+    row = conn.execute(f"EXPLAIN (FORMAT JSON) {leaderboard_sql(board)}", (min_games, limit)).fetchone()
+    plan = row["QUERY PLAN"][0]["Plan"]
+    nodes = list(_pg_nodes(plan))
+    scan = plan["Plans"][0] if plan["Node Type"] == "Limit" and plan.get("Plans") else plan
+    ok = (
+        plan["Node Type"] == "Limit"
+        and scan["Node Type"] in ("Index Only Scan", "Index Scan")
+        and scan.get("Index Name") == f"idx_board_{board}"
+        and not any(node["Node Type"] in ("Sort", "Incremental Sort") for node in nodes)
+    )
+    return ok, " -> ".join(
+        f"{node['Node Type']}" + (f" using {node['Index Name']}" if node.get("Index Name") else "") for node in nodes
+    )
+
+
+def check_leaderboard_plans(settings: Settings) -> List[Tuple[str, int, int, bool, str]]:
+    # Every board must be an index-ordered walk of its idx_board_* index with
+    # no sort step, so LIMIT ends the scan after the first qualifying rows.
+    results = []
+    with get_conn(settings, read_only=True) as conn:
+        check = _check_postgres if conn.backend == "postgres" else _check_sqlite
+        for board in LEADERBOARD_COLUMNS:
+            for min_games, limit in VARIANTS:
+                ok, plan = check(conn, board, min_games, limit)
+                results.append((board, min_games, limit, ok, plan))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Check that every /leaderboards/{board} query is served by its partial board index."
+    )
+    parser.parse_args()
+
+    settings = Settings()
+    init_db(settings)
+    results = check_leaderboard_plans(settings)
+    for board, min_games, limit, ok, plan in results:
+        print(f"{'ok  ' if ok else 'FAIL'} {board:<7} min_games={min_games:<3} limit={limit:<4} {plan}")
+    failed = sum(1 for result in results if not result[3])
+    if failed:
+        raise SystemExit(f"{failed} of {len(results)} leaderboard plans do not use an index-ordered scan")
+    print(f"All {len(results)} leaderboard plans use an index-ordered scan")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+ETAG_MODES = ("strong", "weak", "off")
+STATS_CATEGORIES = ("chess_daily", "chess_rapid", "chess_bullet", "chess_blitz")
+
+
+def _synthetic_player(rng: random.Random, username: str, country_code: str) -> Dict[str, Dict]:
+    joined = rng.randint(1_262_304_000, 1_704_067_200)
+    profile = {
+        "username": username,
+        "player_id": rng.randint(1, 400_000_000),
+        "joined": joined,
+        "last_online": rng.randint(joined, 1_735_689_600),
+        "country": f"https://api.chess.com/pub/country/{country_code}",
+        "status": "basic",
+    }
+    stats: Dict[str, Dict] = {}
+    for category in STATS_CATEGORIES:
+        if rng.random() < 0.35:
+            continue
+        stats[category] = {
+            "last": {"rating": rng.randint(400, 2400), "date": profile["last_online"]},
+            "record": {"win": rng.randint(0, 3000), "loss": rng.randint(0, 3000), "draw": rng.randint(0, 300)},
+        }
+    if rng.random() < 0.6:
+        stats["tactics"] = {"highest": {"rating": rng.randint(400, 3200), "date": profile["last_online"]}}
+    return {"profile": profile, "stats": stats}
+
+
+def build_corpus(
+    players: int,
+    country_code: str,
+    not_found_rate: float,
+    seed: int,
+    corpus_path: Optional[str] = None,
+) -> Tuple[list, Dict[str, Dict]]:
+    # A recorded corpus maps usernames to {"profile": ..., "stats": ...}; anything
+    # in the country list without an entry answers 404, like a closed account.
+    rng = random.Random(seed)
+    if corpus_path:
+        with open(corpus_path, encoding="utf-8") as f:
+            recorded = json.load(f)
+        entries = {str(u).lower(): body for u, body in recorded.get("players", {}).items()}
+        usernames = sorted(set(recorded.get("country_players", [])) | set(entries))
+        return usernames, entries
+
+    usernames = [f"player{i:06d}" for i in range(players)]
+    entries = {
+        username: _synthetic_player(rng, username, country_code)
+        for username in usernames
+        if rng.random() >= not_found_rate
+    }
+    return usernames, entries
+
+
+class StubState:
+    def __init__(self, args: argparse.Namespace):
+        self.country_code = args.country.upper()
+        self.usernames, self.players = build_corpus(
+            args.players,
+            self.country_code,
+            args.not_found_rate,
+            args.seed,
+            args.corpus,
+        )
+        self.latency_median = max(0.0, args.latency_ms / 1000.0)
+        self.latency_sigma = max(0.0, args.latency_sigma)
+        self.throttle_rate = max(0.0, args.throttle_rate)
+        self.throttle_burst = max(1, args.throttle_burst)
+        self.retry_after = args.retry_after
+        self.etag_mode = args.etag
+        self._rng = random.Random(args.seed + 1)
+        self._lock = threading.Lock()
+        self._throttle_remaining = 0
+
+    def latency(self) -> float:
+        if self.latency_median <= 0:
+            return 0.0
+        if self.latency_sigma <= 0:
+            return self.latency_median
+        with self._lock:
+            return self._rng.lognormvariate(math.log(self.latency_median), self.latency_sigma)
+
+    def throttled(self) -> bool:
+        # A burst answers the next throttle_burst requests with 429, the way a
+        # real rate limiter trips for everyone in flight at once.
+        with self._lock:
+            if self._throttle_remaining > 0:
+                self._throttle_remaining -= 1
+                return True
+            if self.throttle_rate and self._rng.random() < self.throttle_rate:
+                self._throttle_remaining = self.throttle_burst - 1
+                return True
+            return False
+
+    def etag(self, body: bytes) -> Optional[str]:
+        if self.etag_mode == "off":
+            return None
+        digest = f'"{hashlib.sha1(body).hexdigest()}"'
+        return f"W/{digest}" if self.etag_mode == "weak" else digest
+
+    def resolve(self, path: str) -> Optional[Dict]:
+        parts = [part for part in path.split("?")[0].split("/") if part]
+        if len(parts) == 4 and parts[:2] == ["pub", "country"] and parts[3] == "players":
+            if parts[2].upper() != self.country_code:
+                return {"players": []}
+            return {"players": self.usernames}
+        if len(parts) in (3, 4) and parts[:2] == ["pub", "player"]:
+            entry = self.players.get(parts[2].lower())
+            if entry is None:
+                return None
+            if len(parts) == 3:
+                return entry["profile"]
+            if parts[3] == "stats":
+                return entry["stats"]
+        return None
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out as separate writes; without this, delayed
+        # ACKs add ~40ms to every keep-alive response.
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args) -> None:
+            return
+
+        def _send(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> None:
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            time.sleep(state.latency())
+            if state.throttled():
+                self._send(429, headers={"Retry-After": str(state.retry_after)})
+                return
+            payload = state.resolve(self.path)
+            if payload is None:
+                self._send(404, b'{"code":0,"message":"not found"}', {"Content-Type": "application/json"})
+                return
+            body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+            etag = state.etag(body)
+            headers = {"Content-Type": "application/json"}
+            if etag:
+                headers["ETag"] = etag
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, headers={"ETag": etag})
+                    return
+            self._send(200, body, headers)
+
+    return Handler
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Chess.com public API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--country", default="KE", help="Country code whose player list is served.")
+    parser.add_argument("--players", type=int, default=2000, help="Synthetic corpus size.")
+    parser.add_argument(
+        "--corpus",
+        default=None,
+        help='Recorded corpus JSON: {"country_players": [...], "players": {username: {"profile", "stats"}}}.',
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Median response latency.")
+    parser.add_argument(
+        "--latency-sigma",
+        type=float,
+        default=0.5,
+        help="Log-normal spread of the latency (0 = fixed latency).",
+    )
+    parser.add_argument("--not-found-rate", type=float, default=0.05, help="Share of listed players that 404.")
+    parser.add_argument(
+        "--throttle-rate",
+        type=float,
+        default=0.0,
+        help="Per-request probability of starting a burst of 429 responses.",
+    )
+    parser.add_argument("--throttle-burst", type=int, default=5, help="Requests answered 429 per burst.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s.")
+    parser.add_argument("--etag", choices=ETAG_MODES, default="strong", help="ETag/If-None-Match behaviour.")
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    state = StubState(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    server.daemon_threads = True
+    print(
+        f"Chess.com stub serving {len(state.usernames)} {state.country_code} players "
+        f"({len(state.players)} with profiles) at http://{args.host}:{server.server_port}/pub",
+        flush=True,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
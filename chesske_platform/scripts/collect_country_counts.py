@@ -0,0 +1,35 @@
+import argparse
+
+from chesske_platform.chesske.config import Settings
+from chesske_platform.chesske.countries import AFRICAN_COUNTRIES, collect_country_counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Snapshot Chess.com player counts for African countries.")
+    parser.add_argument(
+        "--countries",
+        default="",
+        help="Comma-separated ISO alpha-2 codes to collect (default: all African countries).",
+    )
+    parser.add_argument(
+        "--members",
+        action="store_true",
+        help="Also store each country's username list for the day in country_player_members.",
+    )
+    args = parser.parse_args()
+
+    countries = AFRICAN_COUNTRIES
+    if args.countries:
+        wanted = {code.strip().upper() for code in args.countries.split(",") if code.strip()}
+        countries = [c for c in AFRICAN_COUNTRIES if c["alpha2"] in wanted]
+
+    results = collect_country_counts(Settings(), countries=countries, store_members=args.members)
+    failed = [r["country_code"] for r in results if r["player_count"] is None]
+    total = sum(r["player_count"] or 0 for r in results)
+    print(f"Country counts: {len(results) - len(failed)}/{len(results)} countries, {total} players")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,9 @@ from chesske_platform.chesske.db import DBConn, get_conn, init_db
 LEDGER_PATH = "cleaned_master_chess_players.csv"
 EXPORT_SQL = """
 SELECT
-    u.username AS "Username",
-    u.joined_at AS "Join Date",
-    u.last_online AS "Last Online",
+    s.username AS "Username",
+    s.joined_at AS "Join Date",
+    s.last_online AS "Last Online",
     s.total_games AS "Total Games Played",
     s.total_daily AS "Total Daily Games",
     s.total_rapid AS "Total Rapid Games",
@@ -33,10 +33,8 @@ SELECT
     s.blitz_wins AS "Blitz Wins",
     s.blitz_losses AS "Blitz Losses",
     s.blitz_draws AS "Blitz Draws"
-FROM users u
-JOIN user_stats_latest s ON s.username = u.username
-WHERE u.status = 'active'
-ORDER BY u.username
+FROM active_player_stats s
+ORDER BY s.username
 """
 
 
@@ -0,0 +1,143 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from chesske_platform.chesske.analytics import refresh_cached_analytics
+from chesske_platform.chesske.archive import iter_segment, list_segments
+from chesske_platform.chesske.config import Settings
+from chesske_platform.chesske.db import get_conn, init_db
+from chesske_platform.chesske.pipeline import _build_user_record
+from chesske_platform.chesske.repository import replay_users_and_stats_many
+
+
+PROFILE_FIELDS = ("join_date", "last_online")
+# username -> kind -> (fetched_at, partial record)
+Latest = Dict[str, Dict[str, Tuple[int, Dict]]]
+
+
+def _partial_record(kind: str, payload: Dict) -> Dict:
+    # Profiles and stats are archived as separate responses, so each half of
+    # the record is built on its own and merged per user afterwards.
+    if kind == "profile":
+        record = _build_user_record(payload, {})
+        return {field: record[field] for field in PROFILE_FIELDS}
+    record = _build_user_record({}, payload)
+    return {field: value for field, value in record.items() if field not in PROFILE_FIELDS}
+
+
+def _merge_latest(into: Latest, other: Latest) -> None:
+    for username, kinds in other.items():
+        current = into.setdefault(username, {})
+        for kind, entry in kinds.items():
+            if kind not in current or entry[0] >= current[kind][0]:
+                current[kind] = entry
+
+
+def scan_segment(path: str) -> Latest:
+    latest: Latest = {}
+    for line in iter_segment(Path(path)):
+        kind = line.get("kind")
+        if kind not in ("profile", "stats") or not line.get("payload"):
+            continue
+        fetched_at = int(line.get("fetched_at") or 0)
+        entry = latest.setdefault(str(line["username"]), {})
+        if kind not in entry or fetched_at >= entry[kind][0]:
+            entry[kind] = (fetched_at, _partial_record(kind, line["payload"]))
+    return latest
+
+
+def _scan(segments: List[Path], jobs: int) -> Latest:
+    latest: Latest = {}
+    if jobs <= 1:
+        for segment in segments:
+            _merge_latest(latest, scan_segment(str(segment)))
+        return latest
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for partial in pool.map(scan_segment, [str(s) for s in segments]):
+            _merge_latest(latest, partial)
+    return latest
+
+
+def _records(latest: Latest) -> Iterable[Tuple[str, Dict, int]]:
+    for username in sorted(latest):
+        kinds = latest[username]
+        if "profile" not in kinds or "stats" not in kinds:
+            continue
+        # Stats are what the stored row's updated_at tracks, so their fetch time
+        # decides whether the replayed record is stale.
+        yield username, {**kinds["stats"][1], **kinds["profile"][1]}, kinds["stats"][0]
+
+
+def reprocess_archive(
+    settings: Settings,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    jobs: int = 1,
+    batch_size: int = 5000,
+) -> Tuple[int, int, int, int]:
+    segments = list_segments(settings.resolved_raw_archive_dir, since=since, until=until)
+    print(f"Scanning {len(segments)} archive segments from {settings.resolved_raw_archive_dir}")
+    latest = _scan(segments, jobs)
+
+    init_db(settings)
+    loaded = changed = stale = 0
+    with get_conn(settings) as conn:
+        batch: List[Tuple[str, Dict, int]] = []
+        for record in _records(latest):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                batch_changed, batch_stale = _load(conn, batch)
+                changed += batch_changed
+                stale += batch_stale
+                loaded += len(batch)
+                batch = []
+                print(f"Reprocessed {loaded} users...")
+        if batch:
+            batch_changed, batch_stale = _load(conn, batch)
+            changed += batch_changed
+            stale += batch_stale
+            loaded += len(batch)
+    if changed:
+        refresh_cached_analytics(settings, source="reprocess-raw-archive")
+    return len(segments), loaded, changed, stale
+
+
+def _load(conn, batch: List[Tuple[str, Dict, int]]) -> Tuple[int, int]:
+    conn.execute("BEGIN")
+    result = replay_users_and_stats_many(conn, batch, commit=False)
+    conn.commit()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rebuild user rows from the raw payload archive without calling Chess.com."
+    )
+    parser.add_argument("--since", default=None, help="First archive day to read (YYYY-MM-DD).")
+    parser.add_argument("--until", default=None, help="Last archive day to read (YYYY-MM-DD).")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes used to decompress and parse segments.",
+    )
+    parser.add_argument("--batch-size", type=int, default=5000, help="Users per write transaction.")
+    args = parser.parse_args()
+
+    segments, loaded, changed, stale = reprocess_archive(
+        Settings(),
+        since=args.since,
+        until=args.until,
+        jobs=max(1, args.jobs),
+        batch_size=max(1, args.batch_size),
+    )
+    print(
+        f"Reprocess complete: {segments} segments, {loaded} users replayed, {changed} rows changed, "
+        f"{stale} older than the stored rows"
+    )
+
+
+if __name__ == "__main__":
+    main()
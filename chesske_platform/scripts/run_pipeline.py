@@ -1,12 +1,102 @@
+import argparse
+import signal
+import threading
+from dataclasses import replace
 from datetime import datetime
 
 from chesske_platform.chesske.config import Settings
-from chesske_platform.chesske.pipeline import run_ingestion_pipeline
+from chesske_platform.chesske.pipeline import (
+    ACTIVE_SWEEP_MODES,
+    PIPELINE_MODES,
+    run_ingestion_pipeline,
+    run_pipeline_daemon,
+    run_pipeline_worker,
+)
 from chesske_platform.chesske.quality import compute_quality_report
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the ChessKE ingestion pipeline.")
+    parser.add_argument(
+        "--mode",
+        choices=PIPELINE_MODES,
+        default=None,
+        help="Fetch strategy (default: CHESSKE_PIPELINE_MODE or sequential).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=0,
+        help="Maximum in-flight Chess.com requests in concurrent mode (0 = CHESSKE_MAX_CONCURRENCY).",
+    )
+    parser.add_argument(
+        "--active-sweep",
+        choices=ACTIVE_SWEEP_MODES,
+        default=None,
+        help="Fetch only usernames new since the previous snapshot (diff) or the whole active list (full).",
+    )
+    parser.add_argument(
+        "--full-sweep",
+        action="store_true",
+        help="After the refresh queue, continue the budgeted pass over every tracked user (CHESSKE_FULL_SWEEP).",
+    )
+    parser.add_argument(
+        "--max-duration",
+        type=int,
+        default=0,
+        help="Stop taking new users after this many seconds and end the run as partial (0 = CHESSKE_MAX_RUN_SECONDS).",
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=0,
+        help="Stop after this many Chess.com requests and end the run as partial (0 = CHESSKE_MAX_RUN_REQUESTS).",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Start a fresh run even if an interrupted run still has pending work items.",
+    )
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="Help drain the run currently in progress instead of starting one; exits when it finishes.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Run continuously: small refresh batches at CHESSKE_DAEMON_RATE_PER_SECOND and a periodic active snapshot.",
+    )
+    args = parser.parse_args()
+
     settings = Settings()
+    if args.mode:
+        settings = replace(settings, pipeline_mode=args.mode)
+    if args.concurrency > 0:
+        settings = replace(settings, max_concurrency=args.concurrency)
+    if args.active_sweep:
+        settings = replace(settings, active_sweep=args.active_sweep)
+    if args.full_sweep:
+        settings = replace(settings, full_sweep=True)
+    if args.max_duration > 0:
+        settings = replace(settings, max_run_seconds=args.max_duration)
+    if args.max_requests > 0:
+        settings = replace(settings, max_run_requests=args.max_requests)
+    if args.no_resume:
+        settings = replace(settings, pipeline_resume=False)
+
+    if args.daemon:
+        # SIGTERM (systemctl stop) lets in-flight users finish and ends the
+        # current run as partial.
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        run_pipeline_daemon(settings, stop=stop)
+        return
+
+    if args.worker:
+        print("Worker summary:", run_pipeline_worker(settings))
+        return
+
     result = run_ingestion_pipeline(settings)
     report = compute_quality_report(settings)
     with open("last_update.txt", "w", encoding="utf-8") as f: